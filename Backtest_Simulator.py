@@ -1,20 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from termcolor import colored
-from tqdm import tqdm
-
-import plotly.graph_objects as go
-import streamlit as st
-import sqlite3 as db
-import pandas as pd
-import yfinance as yf
+
 import numpy as np
 
+import kernels
+import rules
+
+# sqlite3, pandas, ccxt, ta, tqdm, termcolor, plotly, streamlit and the
+# basis, metrics and resample modules are imported where they are used, so
+# headless runs (backtest.py) start with NumPy and the kernels only.
+
 # import pandas_ta
-import ccxt
-import ta
 
 
 def fetch_data(symbol, timeframe, interval, since):
+    import sqlite3 as db
+
+    import ccxt
+    import pandas as pd
+    from tqdm import tqdm
+
     exchange = ccxt.binance()
     all_ohlcv = []
     fetch_limit = 500
@@ -66,196 +71,289 @@ def fetch_data(symbol, timeframe, interval, since):
     return data
 
 
+# The recursive indicators come from the kernels (compiled when Numba is
+# available), which give the same values as ta's pandas implementation.
+# `data` is a DataFrame or a dict of NumPy columns.
+
+
 def calculate_rsi(data, period=14):
-    data["rsi"] = ta.momentum.RSIIndicator(data["close"], window=period).rsi()
+    data["rsi"] = kernels.rsi(data["close"], period)
     return data
 
 
 def calculate_stochastic_rsi(data, period=14):
+    import pandas as pd
+    import ta
+
+    close = pd.Series(np.asarray(data["close"], dtype=np.float64))
     data["stochastic_rsi"] = (
-        ta.momentum.StochRSIIndicator(data["close"], window=period).stochrsi()
+        ta.momentum.StochRSIIndicator(close, window=period)
+        .stochrsi()
+        .to_numpy()
         * 100
     )
     return data
 
 
 def calculate_price_oscillator(data):
-    data["price_oscillator"] = ta.momentum.PercentagePriceOscillator(
-        data["close"]
-    ).ppo()
+    data["price_oscillator"] = kernels.ppo(data["close"])
     return data
 
 
 def calculate_ema(data, period=14):
-    data["ema"] = ta.trend.EMAIndicator(
-        data["close"], window=period
-    ).ema_indicator()
+    data["ema"] = kernels.ema(data["close"], period)
     return data
 
 
 def calculate_double_ema(data, period=14):
-    EMA = ta.trend.EMAIndicator(data["close"], window=period).ema_indicator()
-    data["double_ema"] = (
-        2 * EMA - ta.trend.EMAIndicator(EMA, window=period).ema_indicator()
-    )
+    data["double_ema"] = kernels.double_ema(data["close"], period)
     return data
 
 
-def calculate_supertrend(data):
-    # data["supertrend_len12_mult3"] = pandas_ta.supertrend(
-    #     data["high"], data["low"], data["close"], length=12, multiplier=3
-    # )["SUPERTd_12_3.0"]
-    # data["supertrend_len11_mult2"] = pandas_ta.supertrend(
-    #     data["high"], data["low"], data["close"], length=11, multiplier=2
-    # )["SUPERTd_11_2.0"]
-    # data["supertrend_len10_mult1"] = pandas_ta.supertrend(
-    #     data["high"], data["low"], data["close"], length=10, multiplier=1
-    # )["SUPERTd_10_1.0"]
+def calculate_supertrend(data, length=12, multiplier=3):
+    # Direction column of pandas_ta.supertrend, following its band rules;
+    # ATR is the RMA (ewm with alpha 1 / length) of the true range
+    import pandas as pd
+
+    high = np.asarray(data["high"], dtype=np.float64)
+    low = np.asarray(data["low"], dtype=np.float64)
+    close = np.asarray(data["close"], dtype=np.float64)
+    previous_close = np.r_[np.nan, close[:-1]]
+    true_range = np.maximum(
+        high - low,
+        np.maximum(
+            np.abs(high - previous_close), np.abs(low - previous_close)
+        ),
+    )
+    atr = (
+        pd.Series(true_range)
+        .ewm(alpha=1 / length, min_periods=length)
+        .mean()
+        .to_numpy()
+    )
+    hl2 = (high + low) / 2
+    band = multiplier * atr
+    name = f"supertrend_len{length}_mult{multiplier:g}"
+    data[name] = kernels.supertrend_direction(close, hl2 + band, hl2 - band)
     return data
 
 
-# Function to get the spot price from YFinance
-def get_spot_price(symbol):
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=20)
-
-    # Pulling minute-level data
-    data = yf.download(
-        symbol,
-        start=start_date.strftime("%Y-%m-%d"),
-        end=end_date.strftime("%Y-%m-%d"),
-        interval="5m",
-        progress=False,
+def backtest(data, initial_balance, fee, strategy):
+    # Entry and exit conditions are rule expressions over indicator columns
+    # (see rules.py), e.g. "stochastic_rsi <= stochastic_rsi_entry",
+    # "supertrend_len12_mult3 == 1" or "double_ema < close"; without an
+    # entry_rule the RSI / price oscillator entry is used. Each rule is one
+    # vectorized mask over all bars; only the position state machine runs
+    # bar by bar, in kernels.backtest_kernel (JIT-compiled when Numba is
+    # installed). `data` is a DataFrame or a dict of NumPy columns
+    entry_rule, exit_rule = rules.strategy_rules(strategy)
+    data = rules.ensure_columns(data, rules.strategy_columns([strategy]))
+    close = np.asarray(data["close"], dtype=np.float64)
+    entry = entry_rule.mask(data, strategy)
+    if exit_rule is None:
+        exit = np.zeros(len(close), dtype=np.bool_)
+    else:
+        exit = exit_rule.mask(data, strategy)
+    # Exits on the exit rule, take profit or, if the strategy sets one, the
+    # stop loss
+    stop_loss = strategy.get("stop_loss")
+    (
+        final_balance,
+        gain_count,
+        loss_count,
+        total_fees,
+        entries,
+        exits,
+        balance_deltas,
+        equity_curve,
+        in_market,
+    ) = kernels.backtest_kernel(
+        close,
+        entry,
+        exit,
+        float(initial_balance),
+        float(fee),
+        float(strategy["take_profit"]),
+        -np.inf if stop_loss is None else float(stop_loss),
     )
-
-    # Format the data
-    coin_data = (
-        data["Close"]
-        .reset_index()
-        .rename(
-            columns={"Datetime": "timestamp", "Close": "price"}
-        )  # Adjust column names
+    percentage_return = (
+        (final_balance - initial_balance) / initial_balance * 100
     )
-    return coin_data
+    timestamps = data["timestamp"]
+    if hasattr(timestamps, "iloc"):
+        timestamps = timestamps.iloc
+    start_dates = list(timestamps[entries])  # entry point dates
+    end_dates = list(timestamps[exits])  # exit point dates
 
+    return (
+        final_balance,
+        percentage_return,
+        gain_count,
+        loss_count,
+        total_fees,
+        (start_dates, end_dates),
+        balance_deltas.tolist(),
+        (equity_curve, in_market),
+    )
 
-# Function to get the perpetual futures price from YFinance
-def get_perpetual_price(symbol):
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=20)
 
-    data = yf.download(
-        symbol,
-        start=start_date.strftime("%Y-%m-%d"),
-        end=end_date.strftime("%Y-%m-%d"),
-        interval="5m",
-        progress=False,
+# Resolves every completed trade to bar indices with a binary search on the
+# sorted timestamps. Returns the entry and exit bar indices plus one flat
+# index array covering all holding periods, with -1 separating trades so a
+# single line trace can draw them all.
+def trade_segments(timestamps, start_dates, end_dates):
+    timestamps = timestamps.to_numpy()
+    n_trades = min(len(start_dates), len(end_dates))
+    starts = np.searchsorted(
+        timestamps,
+        np.asarray(start_dates[:n_trades], dtype=timestamps.dtype),
+        side="left",
     )
-    coin_data = (
-        data["Close"]
-        .reset_index()
-        .rename(columns={"Datetime": "timestamp", "Close": "price"})
+    ends = np.searchsorted(
+        timestamps,
+        np.asarray(end_dates[:n_trades], dtype=timestamps.dtype),
+        side="right",
     )
-    coin_data["timestamp"] = coin_data["timestamp"].dt.tz_convert("UTC")
-    return coin_data
-
-
-# Function to calculate the basis
-def calculate_basis(spot_symbol, perpetual_symbol):
-    spot_price = get_spot_price(spot_symbol)
-    perpetual_price = get_perpetual_price(perpetual_symbol)
-    merged_data = pd.merge_asof(
-        perpetual_price.sort_values("timestamp"),
-        spot_price.sort_values("timestamp"),
-        on="timestamp",
-        direction="backward",
-        suffixes=("_perpetual", "_spot"),
+    lengths = ends - starts + 1  # one extra slot per trade for the gap
+    offsets = np.cumsum(lengths) - lengths
+    segment_idx = np.arange(lengths.sum()) - np.repeat(
+        offsets - starts, lengths
     )
-    merged_data["basis"] = (
-        (merged_data["price_perpetual"] - merged_data["price_spot"])
-        / merged_data["price_spot"]
-    ) * 100
-    return merged_data
+    segment_idx[offsets + lengths - 1] = -1
+    return starts, ends - 1, segment_idx
+
+
+# Runs the fetch + indicator stage for one symbol. Only base 5m bars are
+# downloaded, once in full and then from the last base bar onwards; the
+# requested timeframe is aggregated locally from them.
+def prepare_data(bars, symbol, timeframe, since, columns=None):
+    import pandas as pd
+
+    from resample import TIMEFRAME_MINUTES
+
+    with bars.lock:
+        # Start on a day boundary so the first bar of every timeframe is full
+        base_since = since - since % (TIMEFRAME_MINUTES["1d"] * 60 * 1000)
+        first = bars.first_timestamp()
+        if first is None or first > pd.Timestamp(base_since, unit="ms"):
+            bars.append(fetch_data(symbol, "5m", 5, base_since))
+        else:
+            # Refetch the last base bar too, it may still have been forming
+            last = int(bars.last_timestamp().value // 1_000_000)
+            bars.append(fetch_data(symbol, "5m", 5, last))
+        data = bars.get(timeframe)
+        data = data[data["timestamp"] >= pd.Timestamp(since, unit="ms")]
+        data = data.reset_index(drop=True)
+    return add_indicators(data, columns)
+
+
+# Adds indicator columns to a frame of bars: the given ones (resolved by
+# rules.ensure_columns), or by default every column the simulator shows
+def add_indicators(data, columns=None):
+    if columns is not None:
+        return rules.ensure_columns(data, columns)
+    data = calculate_rsi(data)
+    data = calculate_stochastic_rsi(data)
+    data = calculate_price_oscillator(data)
+    data = calculate_ema(data)
+    data = calculate_double_ema(data, 200)
+    return data
 
 
-def backtest(data, initial_balance, fee, strategy):
-    final_balance = 0
-    percentage_return = 0
-    previous_balance = initial_balance  # keeping track of the previous balance
-    balance = initial_balance
-    bitcoin_balance = 0
-    position = None
-    gain_count = 0  # number of gains
-    loss_count = 0  # number of losses
-    total_fees = 0
-    start_dates = []  # list of all entry point dates
-    end_dates = []  # list of all exit point dates
-    balance_deltas = []
-
-    for i in tqdm(range(1, len(data)), desc="backtest", leave=False):
-        if previous_balance <= 0:
-            return (
-                final_balance,
-                percentage_return,
-                gain_count,
-                loss_count,
-                total_fees,
-                (start_dates, end_dates),
-                balance_deltas,
-            )
-        updated_balance = bitcoin_balance * data["close"].iloc[i]
-        percent_change = (updated_balance - previous_balance) / previous_balance
+# Runs the backtest stage once the symbol's data stage has finished
+def run_backtest(data_future, initial_balance, fee, strategy):
+    data = data_future.result()
+    return data, backtest(data, initial_balance, fee, strategy)
+
+
+# Background backtest jobs. Every stage is a future keyed only by the inputs
+# it depends on, so a widget change resubmits just the stages whose key
+# changed and reuses the rest. Kept in Streamlit session state so the pool
+# and finished results survive reruns.
+class BacktestJobs:
+    def __init__(self, max_workers=5):
+        from basis import BasisService
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.data_jobs = {}  # (symbol, timeframe, since, bar) -> Future
+        self.bars = {}  # symbol -> BarResampler of base 5m bars
+        self.backtest_jobs = {}  # (data key, balance, fee, strategy) -> Future
+        # The basis does not depend on the symbol: one service, one refresh
+        # per 5m bar shared by every backtest
+        self.basis_service = BasisService("BTC-USD", "BTC=F")
+        self.basis_job = None  # (bar, Future)
+
+    def submit_basis(self, bar):
         if (
-            data["rsi"].iloc[i] <= strategy["rsi_entry"]
-            # data["stochastic_rsi"].iloc[i] <= strategy["stochastic_rsi_entry"]
-            and data["price_oscillator"].iloc[i]
-            <= strategy["price_oscillator_entry"]
-            # and data["supertrend_len12_mult3"].iloc[i] == 1
-            # data["supertrend_len11_mult2"].iloc[i] == 1
-            # and data["supertrend_len10_mult1"].iloc[i] == 1
-            # data["double_ema"].iloc[i] < data["close"].iloc[i]
-            and position is None
+            self.basis_job is None
+            or self.basis_job[0] != bar
+            or (self.basis_job[1].done() and self.basis_job[1].exception())
         ):
-            total_fees += balance * fee
-            balance *= 1 - fee
-            bitcoin_balance = balance / data["close"].iloc[i]
-            previous_balance = balance
-            balance = 0
-            position = "long"
-            start_dates.append(data["timestamp"].iloc[i])
-
-        elif (
-            (
-                False
-                # data["rsi"].iloc[i] >= strategy["rsi_exit"]
-                # data["stochastic_rsi"].iloc[i] >= strategy["stochastic_rsi_exit"]
-                # and data["price_oscillator"].iloc[i] >= strategy["price_oscillator_exit"]
-                # data["supertrend_len12_mult3"].iloc[i] == -1
-                # data["supertrend_len11_mult2"].iloc[i] == -1
-                # data["supertrend_len10_mult1"].iloc[i] == -1
-                and position == "long"
+            self.basis_job = (
+                bar,
+                self.executor.submit(self.basis_service.refresh),
             )
-            or percent_change >= strategy["take_profit"]
-            # or percent_change <= strategy["stop_loss"]
-        ):
-            total_fees += updated_balance * fee
-            updated_balance *= 1 - fee
-            if updated_balance > previous_balance:
-                gain_count += 1
-            else:
-                loss_count += 1
-            balance_deltas.append(percent_change)
-            balance = updated_balance
-            bitcoin_balance = 0
-            position = None
-            end_dates.append(data["timestamp"].iloc[i])
-
-    final_balance = balance + (bitcoin_balance * data["close"].iloc[-1])
-    percentage_return = (
-        (final_balance - initial_balance) / initial_balance * 100
-    )
+        return self.basis_job[1]
+
+    def submit_data(self, symbol, timeframe, since, bar):
+        key = (symbol, timeframe, since, bar)
+        future = self.data_jobs.get(key)
+        if future is None or (future.done() and future.exception()):
+            # A newer snapshot supersedes older ones of the same series
+            for old_key in list(self.data_jobs):
+                if old_key[:2] == key[:2]:
+                    del self.data_jobs[old_key]
+                    for job_key in list(self.backtest_jobs):
+                        if job_key[0] == old_key:
+                            del self.backtest_jobs[job_key]
+            if symbol not in self.bars:
+                from resample import BarResampler
+
+                self.bars[symbol] = BarResampler("5m")
+            self.data_jobs[key] = self.executor.submit(
+                prepare_data, self.bars[symbol], symbol, timeframe, since
+            )
+        return key, self.data_jobs[key]
 
-    return (
+    def submit(
+        self,
+        symbol,
+        timeframe,
+        since,
+        bar,
+        initial_balance,
+        fee,
+        strategy,
+    ):
+        data_key, data_future = self.submit_data(
+            symbol, timeframe, since, bar
+        )
+        key = (
+            data_key,
+            initial_balance,
+            fee,
+            tuple(sorted(strategy.items())),
+        )
+        future = self.backtest_jobs.get(key)
+        if future is None or (future.done() and future.exception()):
+            # The data future is always submitted first, so by the time this
+            # job is picked up its dependency is already running or done
+            future = self.executor.submit(
+                run_backtest, data_future, initial_balance, fee, strategy
+            )
+            self.backtest_jobs[key] = future
+        return future
+
+
+# Prints and displays the statistics and chart of one finished backtest
+def render_backtest(symbol, data, result, initial_balance, interval):
+    import plotly.graph_objects as go
+    import streamlit as st
+    from termcolor import colored
+
+    from metrics import performance_summary, periods_per_year
+
+    (
         final_balance,
         percentage_return,
         gain_count,
@@ -263,10 +361,218 @@ def backtest(data, initial_balance, fee, strategy):
         total_fees,
         (start_dates, end_dates),
         balance_deltas,
+        (equity_curve, in_market),
+    ) = result
+    stats = performance_summary(
+        equity_curve, in_market, periods_per_year(interval)
+    )
+    drawdown_duration = timedelta(
+        minutes=int(stats["max_drawdown_duration"]) * interval
     )
 
+    print(colored(symbol, "cyan"))
+    st.markdown(
+        f"<span style='color:cyan;'>{symbol}</span>",
+        unsafe_allow_html=True,
+    )
+    if len(end_dates) == 0:
+        print(colored("NO TRADES WERE MADE", "yellow"))
+        st.markdown(
+            f"<span style='color:yellow;'>NO TRADES WERE MADE</span>",
+            unsafe_allow_html=True,
+        )
+        return
+
+    deltas = [
+        end_date - start_date
+        for start_date, end_date in zip(start_dates, end_dates)
+    ]
+    print(
+        colored("Init. Bal.: ", "blue")
+        + f"{initial_balance}  "
+        + colored("Final Bal.: ", "blue")
+        + f"{final_balance:.2f}  "
+        + colored("Avg. Holding Period: ", "blue")
+        + f"{(sum(deltas, timedelta()) / len(deltas))}"
+    )
+    success_rate = gain_count / (gain_count + loss_count) * 100
+    print(
+        colored("Return: ", "magenta")
+        + f"{percentage_return:.2f}%  "
+        + colored("Avg. Return: ", "magenta")
+        + f"{sum(balance_deltas) / len(balance_deltas) * 100:.2f}%  "
+        + colored("Success Rate: ", "magenta")
+        + f"{success_rate:.2f}%"
+    )
+    print(
+        colored("Gains: ", "green")
+        + f"{gain_count}  "
+        + colored("Losses: ", "red")
+        + f"{loss_count}  "
+        + colored("Total Fees: ", "red")
+        + f"{total_fees:.2f}  "
+        + colored("Total: ", "blue")
+        + f"{gain_count + loss_count}"
+    )
+    print(
+        colored("Sharpe: ", "blue")
+        + f"{stats['sharpe']:.2f}  "
+        + colored("Sortino: ", "blue")
+        + f"{stats['sortino']:.2f}  "
+        + colored("Max Drawdown: ", "red")
+        + f"{stats['max_drawdown'] * 100:.2f}% ({drawdown_duration})  "
+        + colored("Exposure: ", "blue")
+        + f"{stats['exposure'] * 100:.2f}%  "
+        + colored("Turnover: ", "blue")
+        + f"{stats['turnover']:.1f}/yr"
+    )
+
+    # Displaying the key statistics in Streamlit
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(
+            f"<span style='color:blue;'>**Initial Balance:**</span> \
+            <span style='font-weight:bold;'>{initial_balance}</span>",
+            unsafe_allow_html=True,
+        )
+    with col2:
+        st.markdown(
+            f"<span style='color:magenta;'>**Final Balance:**</span> \
+            <span style='font-weight:bold;'>{final_balance}</span>",
+            unsafe_allow_html=True,
+        )
+    with col3:
+        st.markdown(
+            f"<span style='color:magenta;'>**Percentage Return:**</span> \
+            <span style='font-weight:bold;'>{percentage_return}%</span>",
+            unsafe_allow_html=True,
+        )
+    with col4:
+        st.markdown(
+            f"<span style='color:green;'>**Gains:**</span> \
+            <span style='font-weight:bold;'>{gain_count}</span> &nbsp; &nbsp; &nbsp;"
+            f"<span style='color:red;'>**Losses:**</span> \
+            <span style='font-weight:bold;'>{loss_count}</span>",
+            unsafe_allow_html=True,
+        )
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(
+            f"<span style='color:blue;'>**Sharpe:**</span> \
+            <span style='font-weight:bold;'>{stats['sharpe']:.2f}</span> &nbsp; &nbsp; &nbsp;"
+            f"<span style='color:blue;'>**Sortino:**</span> \
+            <span style='font-weight:bold;'>{stats['sortino']:.2f}</span>",
+            unsafe_allow_html=True,
+        )
+    with col2:
+        st.markdown(
+            f"<span style='color:red;'>**Max Drawdown:**</span> \
+            <span style='font-weight:bold;'>{stats['max_drawdown'] * 100:.2f}%</span>",
+            unsafe_allow_html=True,
+        )
+    with col3:
+        st.markdown(
+            f"<span style='color:red;'>**Longest Drawdown:**</span> \
+            <span style='font-weight:bold;'>{drawdown_duration}</span>",
+            unsafe_allow_html=True,
+        )
+    with col4:
+        st.markdown(
+            f"<span style='color:blue;'>**Exposure:**</span> \
+            <span style='font-weight:bold;'>{stats['exposure'] * 100:.2f}%</span> &nbsp; &nbsp; &nbsp;"
+            f"<span style='color:blue;'>**Turnover:**</span> \
+            <span style='font-weight:bold;'>{stats['turnover']:.1f}/yr</span>",
+            unsafe_allow_html=True,
+        )
+
+    # Display everything as a Plotly chart in Streamlit
+    # fig = make_subplots(rows=2, cols=1, shared_xaxes=True)
+    fig = go.Figure()
+    fig.add_trace(
+        go.Scattergl(
+            x=data["timestamp"],
+            y=data["close"],
+            mode="lines",
+            name=symbol + " Price",
+            yaxis="y",
+        )
+    )
+    entry_idx, exit_idx, segment_idx = trade_segments(
+        data["timestamp"], start_dates, end_dates
+    )
+    timestamps = data["timestamp"].to_numpy()
+    closes = data["close"].to_numpy()
+    fig.add_trace(
+        go.Scattergl(
+            # NaN at the -1 separators breaks the line between trades
+            x=timestamps[segment_idx],
+            y=np.where(segment_idx < 0, np.nan, closes[segment_idx]),
+            mode="lines",
+            connectgaps=False,
+            name="Holding Periods",
+            yaxis="y",
+            visible="legendonly",
+        )
+    )
+    fig.add_trace(
+        go.Scattergl(
+            x=timestamps[entry_idx],
+            y=closes[entry_idx],
+            mode="markers",
+            marker=dict(symbol="triangle-up", color="green", size=8),
+            name="Entries",
+            yaxis="y",
+        )
+    )
+    fig.add_trace(
+        go.Scattergl(
+            x=timestamps[exit_idx],
+            y=closes[exit_idx],
+            mode="markers",
+            marker=dict(symbol="triangle-down", color="red", size=8),
+            name="Exits",
+            text=[f"{delta * 100:.2f}%" for delta in balance_deltas],
+            yaxis="y",
+        )
+    )
+    fig.add_trace(
+        go.Scattergl(
+            x=timestamps,
+            y=equity_curve,
+            mode="lines",
+            name="Equity",
+            yaxis="y2",
+            visible="legendonly",
+        )
+    )
+
+    fig.update_layout(
+        xaxis=dict(title="Timestamp"),
+        yaxis=dict(
+            title=symbol + " Price",
+            side="left",
+            showgrid=False,
+            zeroline=False,
+        ),
+        yaxis2=dict(
+            title="Equity",
+            side="right",
+            overlaying="y",
+            showgrid=False,
+            zeroline=False,
+        ),
+        legend=dict(x=0.01, y=0.99),
+        height=700,
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
 
 if __name__ == "__main__":
+    import streamlit as st
+
+    from resample import TIMEFRAME_MINUTES
+
     st.set_page_config(layout="wide")
     st.title("Backtest Simulator")
 
@@ -327,19 +633,22 @@ if __name__ == "__main__":
             step=0.001,
             format="%.3f",
         )
+        use_stop_loss = st.checkbox("Stop Loss", value=False)
         stop_loss = st.number_input(
-            "Stop Loss",
+            "Stop Loss Level",
             min_value=-1.0,
             max_value=0.0,
             value=-0.005,
             step=0.001,
             format="%.3f",
+            disabled=not use_stop_loss,
         )
 
     symbols = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "DOGE/USDT", "LTC/USDT"]
-    intervals = {"5m": 5, "15m": 15, "1h": 60, "1d": 1440}
-    interval = intervals[timeframe]  # the time interval in numerical format
+    interval = TIMEFRAME_MINUTES[timeframe]  # the time interval in minutes
     since = int((datetime.now() - timedelta(days=lookback)).timestamp() * 1000)
+    # Align to the bar boundary so reruns within one bar reuse fetched data
+    since -= since % (interval * 60 * 1000)
     fee = 0.001
 
     # BUILD A STRATEGY
@@ -351,171 +660,56 @@ if __name__ == "__main__":
         "price_oscillator_entry": price_oscillator_entry,
         "price_oscillator_exit": price_oscillator_exit,
         "take_profit": take_profit,
-        "stop_loss": stop_loss,
     }
+    # Off by default: without the key the backtest never stops out
+    if use_stop_loss:
+        strategy["stop_loss"] = stop_loss
 
     launch_backtesting = st.button("Launch Backtesting")
-
     if launch_backtesting:
+        st.session_state["launched"] = True
+
+    if st.session_state.get("launched"):
+        if "backtest_jobs" not in st.session_state:
+            st.session_state["backtest_jobs"] = BacktestJobs(len(symbols))
+        jobs = st.session_state["backtest_jobs"]
+
+        # Index of the current 5m base bar: data and basis refresh once per bar
+        bar = int(datetime.now().timestamp()) // (5 * 60)
+        basis_future = jobs.submit_basis(bar)
+        futures = {
+            jobs.submit(
+                symbol,
+                timeframe,
+                since,
+                bar,
+                initial_balance,
+                fee,
+                strategy,
+            ): symbol
+            for symbol in symbols
+        }
+        # One placeholder per symbol keeps the page order stable while
+        # results arrive in completion order
+        slots = {symbol: st.empty() for symbol in symbols}
         for symbol in symbols:
-            data = fetch_data(symbol, timeframe, interval, since)
-            data = calculate_rsi(data)
-            data = calculate_stochastic_rsi(data)
-            data = calculate_price_oscillator(data)
-            data = calculate_supertrend(data)
-            data = calculate_ema(data)
-            data = calculate_double_ema(data, 200)
-
-            spot_symbol = "BTC-USD"
-            perpetual_symbol = "BTC=F"
-            basis = calculate_basis(spot_symbol, perpetual_symbol)
-
-            start_time = pd.Timestamp.now(tz="UTC") - datetime.timedelta(
-                hours=23
-            )
-            basis_interval = basis[(basis["timestamp"] >= start_time)]
-
-            x_timestamps = np.array(
-                (
-                    basis_interval["timestamp"]
-                    - basis_interval["timestamp"].min()
-                ).dt.total_seconds()
-            )
-            y_basis = basis_interval["basis"].values
-
-            coefficients_basis = np.polyfit(x_timestamps, y_basis, 1)
-            regression_line_basis = np.polyval(coefficients_basis, x_timestamps)
-
-            (
-                final_balance,
-                percentage_return,
-                gain_count,
-                loss_count,
-                total_fees,
-                (start_dates, end_dates),
-                balance_deltas,
-            ) = backtest(data, initial_balance, fee, strategy)
-
-            print(colored(symbol, "cyan"))
-            st.markdown(
-                f"<span style='color:cyan;'>{symbol}</span>",
-                unsafe_allow_html=True,
-            )
-            if len(end_dates) == 0:
-                print(colored("NO TRADES WERE MADE", "yellow"))
-                st.markdown(
-                    f"<span style='color:yellow;'>NO TRADES WERE MADE</span>",
-                    unsafe_allow_html=True,
+            slots[symbol].caption(f"{symbol}: running...")
+
+        for future in as_completed(futures):
+            symbol = futures[future]
+            with slots[symbol].container():
+                if future.exception() is not None:
+                    st.error(f"{symbol}: {future.exception()}")
+                    continue
+                data, result = future.result()
+                render_backtest(
+                    symbol, data, result, initial_balance, interval
                 )
-                continue
-
-            deltas = [
-                end_date - start_date
-                for start_date, end_date in zip(start_dates, end_dates)
-            ]
-            print(
-                colored("Init. Bal.: ", "blue")
-                + f"{initial_balance}  "
-                + colored("Final Bal.: ", "blue")
-                + f"{final_balance:.2f}  "
-                + colored("Avg. Holding Period: ", "blue")
-                + f"{(sum(deltas, timedelta()) / len(deltas))}"
-            )
-            success_rate = gain_count / (gain_count + loss_count) * 100
-            print(
-                colored("Return: ", "magenta")
-                + f"{percentage_return:.2f}%  "
-                + colored("Avg. Return: ", "magenta")
-                + f"{sum(balance_deltas) / len(balance_deltas) * 100:.2f}%  "
-                + colored("Success Rate: ", "magenta")
-                + f"{success_rate:.2f}%"
-            )
-            print(
-                colored("Gains: ", "green")
-                + f"{gain_count}  "
-                + colored("Losses: ", "red")
-                + f"{loss_count}  "
-                + colored("Total Fees: ", "red")
-                + f"{total_fees:.2f}  "
-                + colored("Total: ", "blue")
-                + f"{gain_count + loss_count}"
-            )
 
-            # Displaying the key statistics in Streamlit
-            # TODO: Add more key statistics
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.markdown(
-                    f"<span style='color:blue;'>**Initial Balance:**</span> \
-                    <span style='font-weight:bold;'>{initial_balance}</span>",
-                    unsafe_allow_html=True,
-                )
-            with col2:
-                st.markdown(
-                    f"<span style='color:magenta;'>**Final Balance:**</span> \
-                    <span style='font-weight:bold;'>{final_balance}</span>",
-                    unsafe_allow_html=True,
-                )
-            with col3:
-                st.markdown(
-                    f"<span style='color:magenta;'>**Percentage Return:**</span> \
-                    <span style='font-weight:bold;'>{percentage_return}%</span>",
-                    unsafe_allow_html=True,
-                )
-            with col4:
-                st.markdown(
-                    f"<span style='color:green;'>**Gains:**</span> \
-                    <span style='font-weight:bold;'>{gain_count}</span> &nbsp; &nbsp; &nbsp;"
-                    f"<span style='color:red;'>**Losses:**</span> \
-                    <span style='font-weight:bold;'>{loss_count}</span>",
-                    unsafe_allow_html=True,
-                )
-
-            # Display everything as a Plotly chart in Streamlit
-            # fig = make_subplots(rows=2, cols=1, shared_xaxes=True)
-            fig = go.Figure()
-            fig.add_trace(
-                go.Scatter(
-                    x=data["timestamp"],
-                    y=data["close"],
-                    mode="lines",
-                    name=symbol + " Price",
-                    yaxis="y",
-                )
+        try:
+            slope, intercept = basis_future.result().fit()
+            st.caption(
+                f"BTC-USD / BTC=F basis trend (23h): {slope * 3600:+.4f}%/h"
             )
-            count = 0
-            for i, (start_date, end_date) in enumerate(
-                zip(start_dates, end_dates), start=1
-            ):
-                filtered_df = data[
-                    (data["timestamp"] >= start_date)
-                    & (data["timestamp"] <= end_date)
-                ]
-                fig.add_trace(
-                    go.Scatter(
-                        x=filtered_df["timestamp"],
-                        y=filtered_df["close"],
-                        mode="markers",
-                        name=(
-                            f'{start_date.strftime("%Y-%m-%d")} --'
-                            f'{end_date.strftime("%Y-%m-%d")}'
-                        ),
-                        yaxis="y",
-                        visible=True if count < 0 else "legendonly",
-                    )
-                )
-                count += 1
-
-            fig.update_layout(
-                xaxis=dict(title="Timestamp"),
-                yaxis=dict(
-                    title=symbol + " Price",
-                    side="left",
-                    showgrid=False,
-                    zeroline=False,
-                ),
-                legend=dict(x=0.01, y=0.99),
-                height=700,
-            )
-
-            st.plotly_chart(fig, use_container_width=True)
+        except Exception as e:
+            st.caption(f"Basis unavailable: {e}")
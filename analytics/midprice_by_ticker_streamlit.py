@@ -1,4 +1,6 @@
+import hashlib
 import json
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
@@ -8,68 +10,145 @@ import ta
 def parse_midprice_by_ticker(file_content):
     # Convert bytes content into string and load as JSON
     json_data = json.loads(file_content)
-    
-    data_list = []
-    
-    if json_data.get('status') == 'success':
-        results = json_data['data']['result']
-        for result in results:
-            metric = result['metric']
-            ticker = metric.get('ticker', 'UNKNOWN')
-            values = result['values']
-            for value_pair in values:
-                timestamp = int(value_pair[0])
-                midprice = float(value_pair[1])
-                data_list.append({
-                    'ticker': ticker,
-                    'timestamp': timestamp,
-                    'midprice': midprice
-                })
-    else:
-        st.error('Failed to retrieve data.')
+
+    if json_data.get('status') != 'success':
         return None
-    
+
+    frames = []
+    for result in json_data['data']['result']:
+        metric = result['metric']
+        ticker = metric.get('ticker', 'UNKNOWN')
+        values = np.asarray(result['values'])
+        if len(values) == 0:
+            continue
+        # Build each ticker's columns in one shot instead of a dict per point
+        frames.append(pd.DataFrame({
+            'ticker': ticker,
+            # Timestamps may be fractional ("1700000000.5"), as int() did
+            'timestamp': values[:, 0].astype(np.float64).astype(np.int64),
+            'midprice': values[:, 1].astype(np.float64)
+        }))
+
     # Create a DataFrame
-    df = pd.DataFrame(data_list)
-    
+    if not frames:
+        df = pd.DataFrame({
+            'ticker': pd.Series(dtype=object),
+            'timestamp': pd.Series(dtype=np.int64),
+            'midprice': pd.Series(dtype=np.float64)
+        })
+    else:
+        df = pd.concat(frames, ignore_index=True)
+
     # Convert timestamp to datetime
     df['datetime'] = pd.to_datetime(df['timestamp'], unit='s')
-    
+
     # Set the datetime as the index
     df.set_index('datetime', inplace=True)
-    
+
     # Drop the timestamp column
     df.drop('timestamp', axis=1, inplace=True)
-    
+
     return df
 
-# Function to plot midprice and RSI using Plotly
-def plot_midprice_with_rsi(df):
+# Parse the upload and compute RSI once per distinct file. The digest is the
+# cache key; the raw bytes are passed unhashed (leading underscore).
+@st.cache_data(show_spinner="Parsing upload...")
+def load_midprice_with_rsi(digest, _file_content):
+    df = parse_midprice_by_ticker(_file_content)
+    if df is None:
+        return None, None
+
     # Calculate RSI for each ticker
-    df['RSI'] = df.groupby('ticker')['midprice'].apply(lambda x: ta.momentum.RSIIndicator(x, window=14).rsi()).reset_index(level=0, drop=True)
+    df['RSI'] = df.groupby('ticker')['midprice'].transform(
+        lambda x: ta.momentum.RSIIndicator(x, window=14).rsi()
+    )
 
-    tickers = df['ticker'].unique()
+    # Sorted per-ticker arrays so a visible range is two searchsorted calls
+    series = {}
+    for ticker, ticker_df in df.groupby('ticker', sort=False):
+        ticker_df = ticker_df.sort_index()
+        series[ticker] = (
+            ticker_df.index.values.astype('datetime64[ns]').astype(np.int64),
+            ticker_df['midprice'].to_numpy(),
+            ticker_df['RSI'].to_numpy()
+        )
+    return df, series
+
+# Largest-Triangle-Three-Buckets downsampling: keeps the first and last point
+# and, per bucket, the point forming the largest triangle with the previously
+# kept point and the next bucket's average. Preserves peaks and troughs.
+def lttb(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # NaNs (RSI warm-up) would poison the triangle areas
+    valid = ~np.isnan(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+        n = len(x)
+        if n_out >= n:
+            return x, y
+
+    xf = x.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Average point of every bucket, used as the third triangle vertex
+    sums_x = np.add.reduceat(xf[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, xf[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (xf[a] - avg_x[i + 1]) * (y[lo:hi] - y[a])
+            - (xf[a] - xf[lo:hi]) * (avg_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+# Slice a ticker's full-resolution arrays to the visible window and
+# downsample each series to the target point count
+def visible_points(series, x_min, x_max, max_points):
+    x, midprice, rsi = series
+    lo, hi = np.searchsorted(x, [x_min, x_max], side='left')
+    hi = min(hi + 1, len(x))
+    x, midprice, rsi = x[lo:hi], midprice[lo:hi], rsi[lo:hi]
+    mid_x, mid_y = lttb(x, midprice, max_points)
+    rsi_x, rsi_y = lttb(x, rsi, max_points)
+    return (
+        pd.to_datetime(mid_x), mid_y,
+        pd.to_datetime(rsi_x), rsi_y
+    )
+
+# Function to plot midprice and RSI using Plotly
+def plot_midprice_with_rsi(series, x_range, max_points):
+    x_min, x_max = (pd.Timestamp(t).value for t in x_range)
 
     # Create Plotly figure with subplots
     fig = go.Figure()
 
-    # Plot Midprice
-    for ticker in tickers:
-        ticker_df = df[df['ticker'] == ticker]
-        fig.add_trace(go.Scatter(
-            x=ticker_df.index, 
-            y=ticker_df['midprice'], 
-            mode='lines', 
+    # WebGL traces: one midprice and one RSI trace per ticker
+    for ticker, ticker_series in series.items():
+        mid_x, mid_y, rsi_x, rsi_y = visible_points(
+            ticker_series, x_min, x_max, max_points
+        )
+        fig.add_trace(go.Scattergl(
+            x=mid_x,
+            y=mid_y,
+            mode='lines',
             name=f'Midprice - {ticker}'
         ))
-
-    # Add RSI plot in the same graph (secondary y-axis)
-    for ticker in tickers:
-        ticker_df = df[df['ticker'] == ticker]
-        fig.add_trace(go.Scatter(
-            x=ticker_df.index, 
-            y=ticker_df['RSI'], 
-            mode='lines', 
+        fig.add_trace(go.Scattergl(
+            x=rsi_x,
+            y=rsi_y,
+            mode='lines',
             name=f'RSI - {ticker}',
             yaxis="y2"
         ))
@@ -78,6 +157,7 @@ def plot_midprice_with_rsi(df):
     fig.update_layout(
         title="Midprice and RSI for Different Tickers",
         xaxis_title="Time",
+        xaxis=dict(range=list(x_range)),
         yaxis_title="Midprice",
         yaxis2=dict(
             title="RSI",
@@ -85,16 +165,17 @@ def plot_midprice_with_rsi(df):
             side="right"
         ),
         legend=dict(orientation="h"),
-        template="plotly_dark"
+        template="plotly_dark",
+        uirevision="midprice"
     )
 
     # Add horizontal lines for overbought/oversold levels
-    fig.add_shape(type="line", x0=df.index.min(), y0=70, x1=df.index.max(), y1=70,
+    fig.add_shape(type="line", x0=x_range[0], y0=70, x1=x_range[1], y1=70,
                   line=dict(color="red", dash="dash"), xref='x', yref='y2')
-    fig.add_shape(type="line", x0=df.index.min(), y0=30, x1=df.index.max(), y1=30,
+    fig.add_shape(type="line", x0=x_range[0], y0=30, x1=x_range[1], y1=30,
                   line=dict(color="green", dash="dash"), xref='x', yref='y2')
 
-    st.plotly_chart(fig)
+    st.plotly_chart(fig, use_container_width=True)
 
 # Streamlit App Code
 st.title("Midprice and RSI Analysis")
@@ -103,9 +184,29 @@ st.title("Midprice and RSI Analysis")
 uploaded_file = st.file_uploader("Choose a JSON file", type="json")
 
 if uploaded_file is not None:
-    df_midprice = parse_midprice_by_ticker(uploaded_file)
+    file_content = uploaded_file.getvalue()
+    digest = hashlib.sha1(file_content).hexdigest()
+    df_midprice, midprice_series = load_midprice_with_rsi(digest, file_content)
 
-    if df_midprice is not None:
+    if df_midprice is None:
+        st.error('Failed to retrieve data.')
+    elif df_midprice.empty:
+        st.warning('The file contains no midprice series.')
+    else:
         st.write("Data Preview", df_midprice.head())
+
+        start = df_midprice.index.min().to_pydatetime()
+        end = df_midprice.index.max().to_pydatetime()
+        # Points per trace roughly match the chart's pixel width; narrowing
+        # the visible range re-slices the full-resolution data
+        max_points = st.slider(
+            "Points per trace (≈ chart width in px)",
+            min_value=200, max_value=5000, value=1500, step=100
+        )
+        x_range = st.slider(
+            "Visible range", min_value=start, max_value=end,
+            value=(start, end), format="MM-DD HH:mm:ss"
+        )
+
         # Plot Midprice and RSI using Plotly
-        plot_midprice_with_rsi(df_midprice)
+        plot_midprice_with_rsi(midprice_series, x_range, max_points)
@@ -1,396 +1,326 @@
-from datetime import datetime, timedelta
-
-import plotly.graph_objects as go
-import sqlite3 as db
-import pandas as pd
-import numpy as np
-
-# import pandas_ta
-import ta
-
-def calculate_rsi(data, period=14):
-    data["rsi"] = ta.momentum.RSIIndicator(data["close"], window=period).rsi()
-    return data
-
-
-def calculate_stochastic_rsi(data, period=14):
-    data["stochastic_rsi"] = (
-        ta.momentum.StochRSIIndicator(data["close"], window=period).stochrsi()
-        * 100
-    )
-    return data
-
-
-def calculate_price_oscillator(data):
-    data["price_oscillator"] = ta.momentum.PercentagePriceOscillator(
-        data["close"]
-    ).ppo()
-    return data
-
-
-def calculate_ema(data, period=14):
-    data["ema"] = ta.trend.EMAIndicator(
-        data["close"], window=period
-    ).ema_indicator()
-    return data
-
-
-def calculate_double_ema(data, period=14):
-    EMA = ta.trend.EMAIndicator(data["close"], window=period).ema_indicator()
-    data["double_ema"] = (
-        2 * EMA - ta.trend.EMAIndicator(EMA, window=period).ema_indicator()
-    )
-    return data
-
-
-def calculate_supertrend(data):
-    # data["supertrend_len12_mult3"] = pandas_ta.supertrend(
-    #     data["high"], data["low"], data["close"], length=12, multiplier=3
-    # )["SUPERTd_12_3.0"]
-    # data["supertrend_len11_mult2"] = pandas_ta.supertrend(
-    #     data["high"], data["low"], data["close"], length=11, multiplier=2
-    # )["SUPERTd_11_2.0"]
-    # data["supertrend_len10_mult1"] = pandas_ta.supertrend(
-    #     data["high"], data["low"], data["close"], length=10, multiplier=1
-    # )["SUPERTd_10_1.0"]
-    return data
-
-def backtest(data, initial_balance, fee, strategy):
-    final_balance = 0
-    percentage_return = 0
-    previous_balance = initial_balance  # keeping track of the previous balance
-    balance = initial_balance
-    bitcoin_balance = 0
-    position = None
-    gain_count = 0  # number of gains
-    loss_count = 0  # number of losses
-    total_fees = 0
-    start_dates = []  # list of all entry point dates
-    end_dates = []  # list of all exit point dates
-    balance_deltas = []
-
-    for i in range(1, len(data), desc="backtest", leave=False):
-        if previous_balance <= 0:
-            return (
-                final_balance,
-                percentage_return,
-                gain_count,
-                loss_count,
-                total_fees,
-                (start_dates, end_dates),
-                balance_deltas,
-            )
-        updated_balance = bitcoin_balance * data["close"].iloc[i]
-        percent_change = (updated_balance - previous_balance) / previous_balance
-        if (
-            data["rsi"].iloc[i] <= strategy["rsi_entry"]
-            # data["stochastic_rsi"].iloc[i] <= strategy["stochastic_rsi_entry"]
-            and data["price_oscillator"].iloc[i]
-            <= strategy["price_oscillator_entry"]
-            # and data["supertrend_len12_mult3"].iloc[i] == 1
-            # data["supertrend_len11_mult2"].iloc[i] == 1
-            # and data["supertrend_len10_mult1"].iloc[i] == 1
-            # data["double_ema"].iloc[i] < data["close"].iloc[i]
-            and position is None
-        ):
-            total_fees += balance * fee
-            balance *= 1 - fee
-            bitcoin_balance = balance / data["close"].iloc[i]
-            previous_balance = balance
-            balance = 0
-            position = "long"
-            start_dates.append(data["timestamp"].iloc[i])
-
-        elif (
-            (
-                False
-                # data["rsi"].iloc[i] >= strategy["rsi_exit"]
-                # data["stochastic_rsi"].iloc[i] >= strategy["stochastic_rsi_exit"]
-                # and data["price_oscillator"].iloc[i] >= strategy["price_oscillator_exit"]
-                # data["supertrend_len12_mult3"].iloc[i] == -1
-                # data["supertrend_len11_mult2"].iloc[i] == -1
-                # data["supertrend_len10_mult1"].iloc[i] == -1
-                and position == "long"
-            )
-            or percent_change >= strategy["take_profit"]
-            # or percent_change <= strategy["stop_loss"]
-        ):
-            total_fees += updated_balance * fee
-            updated_balance *= 1 - fee
-            if updated_balance > previous_balance:
-                gain_count += 1
-            else:
-                loss_count += 1
-            balance_deltas.append(percent_change)
-            balance = updated_balance
-            bitcoin_balance = 0
-            position = None
-            end_dates.append(data["timestamp"].iloc[i])
-
-    final_balance = balance + (bitcoin_balance * data["close"].iloc[-1])
-    percentage_return = (
-        (final_balance - initial_balance) / initial_balance * 100
-    )
-
-    return (
-        final_balance,
-        percentage_return,
-        gain_count,
-        loss_count,
-        total_fees,
-        (start_dates, end_dates),
-        balance_deltas,
-    )
-
-
-if __name__ == "__main__":
+"""Headless backtest runner.
+
+Runs the Backtest_Simulator strategy for every symbol and parameter set of a
+JSON job spec and writes one JSON line per run:
+
+    python backtest.py job.json [--output results.jsonl] [--store runs.db]
+
+    {
+        "symbols": ["BTC/USDT", "ETH/USDT"],
+        "timeframe": "15m",
+        "lookback_days": 365,
+        "initial_balance": 10000,
+        "fee": 0.001,
+        "strategy": {"rsi_entry": 30, "price_oscillator_entry": -0.45,
+                     "take_profit": 0.015},
+        "sweep": {"rsi_entry": [25, 30, 35], "take_profit": [0.01, 0.02]},
+        "data": {"BTC/USDT": "btc_5m.csv"}
+    }
 
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        initial_balance = st.number_input(
-            "Initial Balance",
-            min_value=0,
-            max_value=1000000,
-            value=10000,
-            step=1000,
+`sweep` is expanded as a cartesian product over `strategy`, which may also
+set "entry_rule" and "exit_rule" expressions (see rules.py); only the
+indicators they read are computed. `data` maps symbols to local 5m OHLCV
+CSV files with ISO 8601 timestamps (lookback counted back from their last
+bar); other symbols are fetched from Binance. With `--store`, runs already
+in the result store (same bars, balance, fee and strategy) are not
+backtested again. Only the standard library is imported at startup and
+NumPy and the kernels once a job runs; bars are dicts of NumPy columns, so
+pandas is only loaded to fetch from Binance or for indicators the kernels
+do not compute.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+
+DEFAULT_JOB = {
+    "symbols": ["BTC/USDT", "ETH/USDT", "SOL/USDT", "DOGE/USDT", "LTC/USDT"],
+    "timeframe": "15m",
+    "lookback_days": 365,
+    "initial_balance": 10000,
+    "fee": 0.001,
+    "strategy": {
+        "rsi_entry": 30,
+        "rsi_exit": 70,
+        "price_oscillator_entry": -0.45,
+        "price_oscillator_exit": 0.5,
+        "take_profit": 0.015,
+    },
+    "sweep": {},
+    "data": {},
+}
+
+
+def load_job(path):
+    """Read a job spec ("-" for stdin) on top of the defaults."""
+    if path == "-":
+        spec = json.load(sys.stdin)
+    else:
+        with open(path) as f:
+            spec = json.load(f)
+    unknown = set(spec) - set(DEFAULT_JOB)
+    if unknown:
+        raise ValueError(f"unknown job keys: {sorted(unknown)}")
+    job = {**DEFAULT_JOB, **spec}
+    job["strategy"] = {**DEFAULT_JOB["strategy"], **spec.get("strategy", {})}
+    return job
+
+
+def expand_sweep(strategy, sweep):
+    """Every strategy dict of the cartesian product of the sweep values."""
+    names = list(sweep)
+    return [
+        {**strategy, **dict(zip(names, values))}
+        for values in itertools.product(*(sweep[name] for name in names))
+    ]
+
+
+def read_csv_bars(path, columns=None):
+    """The timestamps and OHLCV `columns` (default all) of a CSV file as a
+    dict of NumPy arrays, sorted by timestamp; of repeated timestamps the
+    last row is kept. Parsing the numbers is most of the cost, so only the
+    columns asked for are read."""
+    import numpy as np
+
+    from resample import OHLCV_COLUMNS
+
+    names = ["timestamp"] + [
+        name
+        for name in OHLCV_COLUMNS[1:]
+        if columns is None or name in columns
+    ]
+    with open(path) as f:
+        header = [name.strip() for name in f.readline().split(",")]
+        missing = [name for name in names if name not in header]
+        if missing:
+            raise ValueError(f"{path} has no {missing} columns")
+        table = np.loadtxt(
+            f,
+            delimiter=",",
+            usecols=[header.index(name) for name in names],
+            dtype=[("timestamp", "datetime64[ns]")]
+            + [(name, np.float64) for name in names[1:]],
+            ndmin=1,
         )
-        rsi_entry = st.number_input(
-            "RSI Entry", min_value=0, max_value=100, value=30, step=1
+    timestamps = table["timestamp"]
+    if not np.all(timestamps[1:] > timestamps[:-1]):
+        table = table[np.argsort(timestamps, kind="stable")]
+        timestamps = table["timestamp"]
+        table = table[np.r_[timestamps[1:] != timestamps[:-1], True]]
+    return {name: np.ascontiguousarray(table[name]) for name in names}
+
+
+def load_bars(job, symbol):
+    """Bars with indicators for one symbol, from a CSV or from Binance, as a
+    dict of NumPy columns."""
+    import numpy as np
+
+    from Backtest_Simulator import add_indicators
+    from resample import TIMEFRAME_MINUTES, resample_columns
+    from rules import bar_columns, strategy_columns
+
+    # Only the indicators the job's rules read
+    strategies = expand_sweep(job["strategy"], job["sweep"])
+    columns = strategy_columns(strategies)
+
+    timeframe = job["timeframe"]
+    lookback_ms = int(job["lookback_days"] * 24 * 60 * 60 * 1000)
+    path = job["data"].get(symbol)
+    if path is None:
+        from Backtest_Simulator import prepare_data
+        from resample import BarResampler
+
+        since = int(time.time() * 1000) - lookback_ms
+        since -= since % (TIMEFRAME_MINUTES[timeframe] * 60 * 1000)
+        data = prepare_data(
+            BarResampler("5m"), symbol, timeframe, since, columns
         )
-        # stochastic_rsi_entry = st.number_input(
-        #     "Stochastic RSI Entry", min_value=0, max_value=100, value=20, step=1
-        # )
-        price_oscillator_entry = st.number_input(
-            "Price Oscillator Entry",
-            min_value=-5.0,
-            max_value=5.0,
-            value=-0.45,
-            step=0.05,
-            format="%.2f",
+        return {name: data[name].to_numpy() for name in data.columns}
+
+    # Only the bar columns the rules and the backtest read
+    data = read_csv_bars(path, bar_columns(strategies) | {"close"})
+    if timeframe != "5m":
+        data = resample_columns(data, TIMEFRAME_MINUTES[timeframe])
+    timestamps = data["timestamp"]
+    if len(timestamps):
+        since = timestamps[-1] - np.timedelta64(lookback_ms, "ms")
+        first = np.searchsorted(timestamps, since, side="left")
+        data = {name: values[first:] for name, values in data.items()}
+    return add_indicators(data, columns)
+
+
+def bar_time(timestamp):
+    """A datetime64 bar timestamp formatted like `str(pandas.Timestamp)`."""
+    return str(timestamp.astype("datetime64[us]").item())
+
+
+def bars_digest(data):
+    """SHA-256 of the bars' OHLCV values (of the columns they hold), so run
+    keys tell revised bars over the same range apart."""
+    import hashlib
+
+    import numpy as np
+
+    from resample import OHLCV_COLUMNS
+
+    digest = hashlib.sha256()
+    for name in OHLCV_COLUMNS[1:]:
+        if name in data:
+            digest.update(name.encode())
+            digest.update(np.ascontiguousarray(data[name], dtype=np.float64))
+    return digest.hexdigest()
+
+
+def run_keys(job, symbol, data, strategies):
+    """First and last bar timestamps, the bars' digest and the result store
+    key of each run."""
+    from result_store import run_key
+
+    start = bar_time(data["timestamp"][0])
+    end = bar_time(data["timestamp"][-1])
+    digest = bars_digest(data)
+    keys = [
+        run_key(
+            symbol,
+            job["timeframe"],
+            start,
+            end,
+            len(data["close"]),
+            digest,
+            job["initial_balance"],
+            job["fee"],
+            strategy,
         )
-    with col2:
-        timeframe = st.selectbox(
-            "Timeframe", ["5m", "15m", "1h", "1d"], index=1
-        )
-        rsi_exit = st.number_input(
-            "RSI Exit", min_value=0, max_value=100, value=70, step=1
-        )
-        # stochastic_rsi_exit = st.number_input(
-        #     "Stochastic RSI Exit", min_value=0, max_value=100, value=80, step=1
-        # )
-        price_oscillator_exit = st.number_input(
-            "Price Oscillator Exit",
-            min_value=-5.0,
-            max_value=5.0,
-            value=0.5,
-            step=0.05,
-            format="%.2f",
-        )
-    with col3:
-        lookback = st.number_input(
-            "Lookback Period",
-            min_value=0,
-            max_value=365 * 3,
-            value=365,
-            step=1,
-        )
-        take_profit = st.number_input(
-            "Take Profit",
-            min_value=0.0,
-            max_value=1.0,
-            value=0.015,
-            step=0.001,
-            format="%.3f",
-        )
-        stop_loss = st.number_input(
-            "Stop Loss",
-            min_value=-1.0,
-            max_value=0.0,
-            value=-0.005,
-            step=0.001,
-            format="%.3f",
-        )
-
-    symbols = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "DOGE/USDT", "LTC/USDT"]
-    intervals = {"5m": 5, "15m": 15, "1h": 60, "1d": 1440}
-    interval = intervals[timeframe]  # the time interval in numerical format
-    since = int((datetime.now() - timedelta(days=lookback)).timestamp() * 1000)
-    fee = 0.001
-
-    # BUILD A STRATEGY
-    strategy = {
-        "rsi_entry": rsi_entry,
-        "rsi_exit": rsi_exit,
-        # "stochastic_rsi_entry": stochastic_rsi_entry,
-        # "stochastic_rsi_exit": stochastic_rsi_exit,
-        "price_oscillator_entry": price_oscillator_entry,
-        "price_oscillator_exit": price_oscillator_exit,
-        "take_profit": take_profit,
-        "stop_loss": stop_loss,
-    }
-
-    launch_backtesting = st.button("Launch Backtesting")
-
-    if launch_backtesting:
-        for symbol in symbols:
-            data = fetch_data(symbol, timeframe, interval, since)
-            data = calculate_rsi(data)
-            data = calculate_stochastic_rsi(data)
-            data = calculate_price_oscillator(data)
-            data = calculate_supertrend(data)
-            data = calculate_ema(data)
-            data = calculate_double_ema(data, 200)
-
-            spot_symbol = "BTC-USD"
-            perpetual_symbol = "BTC=F"
-            basis = calculate_basis(spot_symbol, perpetual_symbol)
-
-            start_time = pd.Timestamp.now(tz="UTC") - datetime.timedelta(
-                hours=23
+        for strategy in strategies
+    ]
+    return start, end, digest, keys
+
+
+def run_job(job, store=None, strategies=None, load=load_bars):
+    """Yield one result dict per (symbol, strategy) run.
+
+    With a `result_store.ResultStore`, runs it already holds are read back
+    instead of backtested again, and new ones are added to it. `strategies`
+    replaces the job's sweep; `load(job, symbol)` returns the bars as
+    `load_bars` does.
+    """
+    import numpy as np
+
+    from Backtest_Simulator import backtest
+    from metrics import performance_summary, periods_per_year
+    from resample import TIMEFRAME_MINUTES
+    from result_store import METRICS
+
+    if strategies is None:
+        strategies = expand_sweep(job["strategy"], job["sweep"])
+    periods = periods_per_year(TIMEFRAME_MINUTES[job["timeframe"]])
+    for symbol in job["symbols"]:
+        data = load(job, symbol)
+        start, end, digest, keys = run_keys(job, symbol, data, strategies)
+        stored = store.get_many(keys) if store is not None else {}
+        pending = [
+            (key, strategy)
+            for key, strategy in zip(keys, strategies)
+            if key not in stored
+        ]
+        results = [
+            backtest(data, job["initial_balance"], job["fee"], strategy)
+            for _, strategy in pending
+        ]
+        # All runs share the bars, so their metrics are one 2-D reduction
+        stats = {}
+        if results:
+            stats = performance_summary(
+                np.stack([result[7][0] for result in results]),
+                np.stack([result[7][1] for result in results]),
+                periods,
             )
-            basis_interval = basis[(basis["timestamp"] >= start_time)]
-
-            x_timestamps = np.array(
-                (
-                    basis_interval["timestamp"]
-                    - basis_interval["timestamp"].min()
-                ).dt.total_seconds()
-            )
-            y_basis = basis_interval["basis"].values
-
-            coefficients_basis = np.polyfit(x_timestamps, y_basis, 1)
-            regression_line_basis = np.polyval(coefficients_basis, x_timestamps)
-
+        new = {}
+        for i, ((key, strategy), result) in enumerate(zip(pending, results)):
             (
                 final_balance,
                 percentage_return,
                 gain_count,
                 loss_count,
                 total_fees,
-                (start_dates, end_dates),
+                _,
                 balance_deltas,
-            ) = backtest(data, initial_balance, fee, strategy)
-
-            print(colored(symbol, "cyan"))
-            st.markdown(
-                f"<span style='color:cyan;'>{symbol}</span>",
-                unsafe_allow_html=True,
-            )
-            if len(end_dates) == 0:
-                print(colored("NO TRADES WERE MADE", "yellow"))
-                st.markdown(
-                    f"<span style='color:yellow;'>NO TRADES WERE MADE</span>",
-                    unsafe_allow_html=True,
-                )
-                continue
-
-            deltas = [
-                end_date - start_date
-                for start_date, end_date in zip(start_dates, end_dates)
-            ]
-            print(
-                colored("Init. Bal.: ", "blue")
-                + f"{initial_balance}  "
-                + colored("Final Bal.: ", "blue")
-                + f"{final_balance:.2f}  "
-                + colored("Avg. Holding Period: ", "blue")
-                + f"{(sum(deltas, timedelta()) / len(deltas))}"
-            )
-            success_rate = gain_count / (gain_count + loss_count) * 100
-            print(
-                colored("Return: ", "magenta")
-                + f"{percentage_return:.2f}%  "
-                + colored("Avg. Return: ", "magenta")
-                + f"{sum(balance_deltas) / len(balance_deltas) * 100:.2f}%  "
-                + colored("Success Rate: ", "magenta")
-                + f"{success_rate:.2f}%"
-            )
-            print(
-                colored("Gains: ", "green")
-                + f"{gain_count}  "
-                + colored("Losses: ", "red")
-                + f"{loss_count}  "
-                + colored("Total Fees: ", "red")
-                + f"{total_fees:.2f}  "
-                + colored("Total: ", "blue")
-                + f"{gain_count + loss_count}"
-            )
-
-            # Displaying the key statistics in Streamlit
-            # TODO: Add more key statistics
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.markdown(
-                    f"<span style='color:blue;'>**Initial Balance:**</span> \
-                    <span style='font-weight:bold;'>{initial_balance}</span>",
-                    unsafe_allow_html=True,
-                )
-            with col2:
-                st.markdown(
-                    f"<span style='color:magenta;'>**Final Balance:**</span> \
-                    <span style='font-weight:bold;'>{final_balance}</span>",
-                    unsafe_allow_html=True,
-                )
-            with col3:
-                st.markdown(
-                    f"<span style='color:magenta;'>**Percentage Return:**</span> \
-                    <span style='font-weight:bold;'>{percentage_return}%</span>",
-                    unsafe_allow_html=True,
-                )
-            with col4:
-                st.markdown(
-                    f"<span style='color:green;'>**Gains:**</span> \
-                    <span style='font-weight:bold;'>{gain_count}</span> &nbsp; &nbsp; &nbsp;"
-                    f"<span style='color:red;'>**Losses:**</span> \
-                    <span style='font-weight:bold;'>{loss_count}</span>",
-                    unsafe_allow_html=True,
-                )
-
-            # Display everything as a Plotly chart in Streamlit
-            # fig = make_subplots(rows=2, cols=1, shared_xaxes=True)
-            fig = go.Figure()
-            fig.add_trace(
-                go.Scatter(
-                    x=data["timestamp"],
-                    y=data["close"],
-                    mode="lines",
-                    name=symbol + " Price",
-                    yaxis="y",
-                )
-            )
-            count = 0
-            for i, (start_date, end_date) in enumerate(
-                zip(start_dates, end_dates), start=1
-            ):
-                filtered_df = data[
-                    (data["timestamp"] >= start_date)
-                    & (data["timestamp"] <= end_date)
-                ]
-                fig.add_trace(
-                    go.Scatter(
-                        x=filtered_df["timestamp"],
-                        y=filtered_df["close"],
-                        mode="markers",
-                        name=(
-                            f'{start_date.strftime("%Y-%m-%d")} --'
-                            f'{end_date.strftime("%Y-%m-%d")}'
-                        ),
-                        yaxis="y",
-                        visible=True if count < 0 else "legendonly",
-                    )
-                )
-                count += 1
-
-            fig.update_layout(
-                xaxis=dict(title="Timestamp"),
-                yaxis=dict(
-                    title=symbol + " Price",
-                    side="left",
-                    showgrid=False,
-                    zeroline=False,
+                _,
+            ) = result
+            new[key] = {
+                "symbol": symbol,
+                "timeframe": job["timeframe"],
+                "strategy": strategy,
+                "start": start,
+                "end": end,
+                "bars": len(data["close"]),
+                "digest": digest,
+                "final_balance": float(final_balance),
+                "percentage_return": float(percentage_return),
+                "gains": gain_count,
+                "losses": loss_count,
+                "total_fees": float(total_fees),
+                "average_trade_return": (
+                    float(np.mean(balance_deltas)) if balance_deltas else None
                 ),
-                legend=dict(x=0.01, y=0.99),
-                height=700,
+                **{name: float(values[i]) for name, values in stats.items()},
+            }
+        if store is not None and new:
+            store.put_many(
+                (key, record, job["initial_balance"], job["fee"])
+                for key, record in new.items()
             )
+        for key, strategy in zip(keys, strategies):
+            if key in new:
+                yield new[key]
+            else:
+                record = stored[key]
+                yield {
+                    "symbol": symbol,
+                    "timeframe": job["timeframe"],
+                    # As the job spelled it, not as stored
+                    "strategy": strategy,
+                    "start": start,
+                    "end": end,
+                    "bars": record["bars"],
+                    "digest": digest,
+                    **{name: record[name] for name in METRICS},
+                }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run backtests and parameter sweeps from a JSON job spec."
+    )
+    parser.add_argument("job", help='job spec file, "-" for stdin')
+    parser.add_argument(
+        "-o", "--output", help="write JSON lines here instead of stdout"
+    )
+    parser.add_argument(
+        "--store",
+        help="SQLite result store: skip runs it holds, add the new ones",
+    )
+    args = parser.parse_args(argv)
+
+    job = load_job(args.job)
+    store = None
+    if args.store:
+        from result_store import ResultStore
+
+        store = ResultStore(args.store)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for record in run_job(job, store):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if store is not None:
+            store.close()
+
 
-            st.plotly_chart(fig, use_container_width=True)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import math
+from typing import Optional
+
+
+class Bar:
+    """One completed OHLCV bar."""
+
+    __slots__ = ("timestamp", "open", "high", "low", "close", "volume", "trades")
+
+    def __init__(self, timestamp: float, price: float, volume: float) -> None:
+        self.timestamp = timestamp  # start of the bar, seconds
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+        self.trades = 1
+
+    def add(self, price: float, volume: float) -> None:
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.trades += 1
+
+    def __repr__(self) -> str:
+        return f"Bar({self.timestamp}, o={self.open}, h={self.high}, l={self.low}, c={self.close}, v={self.volume}, n={self.trades})"
+
+
+class BarBuilder:
+    """Aggregates trades into bars as they arrive, O(1) per trade.
+
+    `mode` is "time" (`size` seconds, aligned to the epoch like the exchange
+    candles), "tick" (`size` trades) or "volume" (at least `size` traded
+    quantity; the trade crossing the threshold closes the bar, trades are
+    not split). `update` returns the bar it completed, if any.
+    """
+
+    MODES = ("time", "tick", "volume")
+
+    def __init__(self, mode: str = "time", size: float = 900) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        self.mode = mode
+        self.size = size
+        self.bar: Optional[Bar] = None  # the bar still forming
+        self.completed = 0
+
+    def update(self, price: float, quantity: float, timestamp: float) -> Optional[Bar]:
+        """Add one trade; returns the bar completed by it, if any."""
+        if self.mode == "time":
+            start = math.floor(timestamp / self.size) * self.size
+            if self.bar is None:
+                self.bar = Bar(start, price, quantity)
+                return None
+            if start > self.bar.timestamp:
+                # This trade opens the next bar, so the current one is done
+                done, self.bar = self.bar, Bar(start, price, quantity)
+                self.completed += 1
+                return done
+            self.bar.add(price, quantity)
+            return None
+
+        if self.bar is None:
+            self.bar = Bar(timestamp, price, quantity)
+        else:
+            self.bar.add(price, quantity)
+        full = self.bar.trades >= self.size if self.mode == "tick" else self.bar.volume >= self.size
+        if full:
+            done, self.bar = self.bar, None
+            self.completed += 1
+            return done
+        return None
+
+    def flush(self, timestamp: float) -> Optional[Bar]:
+        """Close a time bar whose period ended without a trade opening the next one."""
+        if self.mode == "time" and self.bar is not None and timestamp >= self.bar.timestamp + self.size:
+            done, self.bar = self.bar, None
+            self.completed += 1
+            return done
+        return None
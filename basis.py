@@ -0,0 +1,287 @@
+import re
+import sqlite3 as db
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+
+def _utc(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def _to_ns(timestamps: pd.Series) -> np.ndarray:
+    return pd.DatetimeIndex(timestamps).as_unit("ns").asi8
+
+
+class YFinanceSource:
+    """Downloads 5m close prices from Yahoo Finance."""
+
+    def fetch(
+        self, symbol: str, start: datetime, end: datetime
+    ) -> pd.DataFrame:
+        import yfinance as yf
+
+        data = yf.download(
+            symbol, start=start, end=end, interval="5m", progress=False
+        )
+        if data.empty:
+            return pd.DataFrame(
+                {"timestamp": pd.DatetimeIndex([], tz="UTC"), "price": []}
+            )
+        close = data["Close"]
+        if isinstance(close, pd.DataFrame):  # one column per symbol
+            close = close.iloc[:, 0]
+        timestamps = pd.DatetimeIndex(close.index)
+        if timestamps.tz is None:
+            timestamps = timestamps.tz_localize("UTC")
+        return pd.DataFrame(
+            {
+                "timestamp": timestamps.tz_convert("UTC"),
+                "price": close.to_numpy(dtype=np.float64),
+            }
+        )
+
+
+class LocalPriceSource:
+    """Offline stand-in for YFinanceSource backed by in-memory frames.
+
+    `frames` maps a symbol to a DataFrame with UTC `timestamp` and `price`
+    columns; `fetch` returns the rows inside [start, end) and records the
+    call so tests can assert what would have been downloaded.
+    """
+
+    def __init__(self, frames: dict) -> None:
+        self.frames = frames
+        self.calls: list = []
+
+    def fetch(
+        self, symbol: str, start: datetime, end: datetime
+    ) -> pd.DataFrame:
+        self.calls.append((symbol, start, end))
+        frame = self.frames[symbol]
+        mask = (frame["timestamp"] >= start) & (frame["timestamp"] < end)
+        return frame.loc[mask, ["timestamp", "price"]].reset_index(drop=True)
+
+
+class BasisService:
+    """Spot/perpetual basis kept up to date incrementally.
+
+    Each leg is cached in SQLite and `refresh` only downloads bars newer than
+    the cached tail. Only the perpetual rows those bars can affect are
+    re-aligned (`merge_asof`, backward), and the least-squares line over the
+    trailing `regression_window` is maintained from running sums instead of
+    refitting with `np.polyfit`.
+    """
+
+    def __init__(
+        self,
+        spot_symbol: str = "BTC-USD",
+        perpetual_symbol: str = "BTC=F",
+        source=None,
+        cache_path: str = "market_data.db",
+        lookback: timedelta = timedelta(days=20),
+        regression_window: timedelta = timedelta(hours=23),
+    ) -> None:
+        self.spot_symbol = spot_symbol
+        self.perpetual_symbol = perpetual_symbol
+        self.source = source if source is not None else YFinanceSource()
+        self.cache_path = cache_path
+        self.lookback = lookback
+        self.regression_window = regression_window
+        self.legs = {spot_symbol: None, perpetual_symbol: None}
+        self.aligned = pd.DataFrame(
+            {
+                "timestamp": pd.DatetimeIndex([], tz="UTC"),
+                "price_perpetual": pd.Series([], dtype=np.float64),
+                "price_spot": pd.Series([], dtype=np.float64),
+                "basis": pd.Series([], dtype=np.float64),
+            }
+        )
+        # Running sums (n, sum_x, sum_y, sum_xx, sum_xy) over the rows
+        # aligned[window_start:fit_end], with x in seconds since `origin`.
+        # The origin is re-based to the window start so the sums stay small.
+        self._origin = 0
+        self._window_start = 0
+        self._fit_end = 0
+        self._sums = np.zeros(5)
+        self._lock = threading.Lock()
+
+    def refresh(self, now: datetime = None) -> "BasisService":
+        """Fetch new bars for both legs and advance the series and fit."""
+        now = _utc(now if now is not None else datetime.now(timezone.utc))
+        with self._lock:
+            first_new = None
+            with db.connect(self.cache_path) as connection:
+                for symbol in self.legs:
+                    new_start = self._update_leg(connection, symbol, now)
+                    if new_start is not None and (
+                        first_new is None or new_start < first_new
+                    ):
+                        first_new = new_start
+            if first_new is not None:
+                self._realign(first_new)
+            self._advance_window(now)
+        return self
+
+    def basis(self) -> pd.DataFrame:
+        """Aligned perpetual/spot prices and basis in percent."""
+        return self.aligned
+
+    def window(self) -> pd.DataFrame:
+        """Rows currently inside the regression window."""
+        return self.aligned.iloc[self._window_start:]
+
+    def fit(self):
+        """Slope and intercept of the basis regression over the window.
+
+        Matches `np.polyfit(x, basis, 1)` with x in seconds since the first
+        timestamp inside the window.
+        """
+        n, sum_x, sum_y, sum_xx, sum_xy = self._sums
+        if n < 2:
+            return np.nan, np.nan
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+        intercept = (sum_y - slope * sum_x) / n
+        return slope, intercept
+
+    def _update_leg(self, connection, symbol: str, now: pd.Timestamp):
+        table_name = "basis_" + re.sub(r"\W", "_", symbol)
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} "
+            "(timestamp INTEGER PRIMARY KEY, price REAL NOT NULL)"
+        )
+        leg = self.legs[symbol]
+        first_new = None
+        if leg is None:
+            # First refresh in this process: start from what is on disk
+            leg = pd.read_sql_query(
+                f"SELECT timestamp, price FROM {table_name} "
+                "WHERE timestamp >= ? ORDER BY timestamp",
+                connection,
+                params=((now - self.lookback).value,),
+            )
+            leg["timestamp"] = pd.to_datetime(
+                leg["timestamp"], unit="ns", utc=True
+            )
+            if len(leg):
+                first_new = leg["timestamp"].iloc[0]
+
+        if len(leg):
+            start = leg["timestamp"].iloc[-1]
+            fetched = self.source.fetch(
+                symbol, start.to_pydatetime(), now.to_pydatetime()
+            )
+            fetched = fetched[fetched["timestamp"] > start]
+        else:
+            start = now - self.lookback
+            fetched = self.source.fetch(
+                symbol, start.to_pydatetime(), now.to_pydatetime()
+            )
+        fetched = (
+            fetched.dropna()
+            .sort_values("timestamp")
+            .drop_duplicates("timestamp")
+        )
+        if len(fetched):
+            connection.executemany(
+                f"INSERT OR IGNORE INTO {table_name} (timestamp, price) "
+                "VALUES (?, ?)",
+                zip(
+                    _to_ns(fetched["timestamp"]).tolist(),
+                    fetched["price"].tolist(),
+                ),
+            )
+            leg = pd.concat([leg, fetched], ignore_index=True)
+            if first_new is None:
+                first_new = fetched["timestamp"].iloc[0]
+        self.legs[symbol] = leg[
+            leg["timestamp"] >= now - self.lookback
+        ].reset_index(drop=True)
+        return first_new
+
+    def _realign(self, first_new: pd.Timestamp) -> None:
+        # A backward match can only change for perpetual rows at or after the
+        # earliest new bar of either leg; earlier rows are final
+        keep_end = int(
+            np.searchsorted(
+                _to_ns(self.aligned["timestamp"]), first_new.value, "left"
+            )
+        )
+        if keep_end < self._fit_end:
+            # Take the replaced rows back out of the running sums
+            replaced = slice(max(self._window_start, keep_end), self._fit_end)
+            self._accumulate(replaced, -1.0)
+            self._window_start = min(self._window_start, keep_end)
+            self._fit_end = keep_end
+
+        perpetual = self.legs[self.perpetual_symbol]
+        merged = pd.merge_asof(
+            perpetual[perpetual["timestamp"] >= first_new],
+            self.legs[self.spot_symbol],
+            on="timestamp",
+            direction="backward",
+            suffixes=("_perpetual", "_spot"),
+        ).dropna(subset=["price_spot"])
+        merged["basis"] = (
+            (merged["price_perpetual"] - merged["price_spot"])
+            / merged["price_spot"]
+        ) * 100
+        self.aligned = pd.concat(
+            [self.aligned.iloc[:keep_end], merged], ignore_index=True
+        )
+
+    def _advance_window(self, now: pd.Timestamp) -> None:
+        timestamps = _to_ns(self.aligned["timestamp"])
+        if self._window_start < len(timestamps):
+            self._rebase(timestamps[self._window_start])
+
+        # Add rows aligned since the last refresh
+        self._accumulate(slice(self._fit_end, len(timestamps)), 1.0)
+        self._fit_end = len(timestamps)
+
+        # Evict rows that fell out of the trailing window
+        cutoff = (now - self.regression_window).value
+        new_start = int(np.searchsorted(timestamps, cutoff, "left"))
+        if new_start > self._window_start:
+            self._accumulate(slice(self._window_start, new_start), -1.0)
+            self._window_start = new_start
+
+        if self._window_start < len(timestamps):
+            self._rebase(timestamps[self._window_start])
+
+        # Drop aligned rows that are older than both the window and lookback
+        stale = int(
+            np.searchsorted(timestamps, (now - self.lookback).value, "left")
+        )
+        stale = min(stale, self._window_start)
+        if stale:
+            self.aligned = self.aligned.iloc[stale:].reset_index(drop=True)
+            self._window_start -= stale
+            self._fit_end -= stale
+
+    def _accumulate(self, rows: slice, sign: float) -> None:
+        window = self.aligned.iloc[rows]
+        if not len(window):
+            return
+        x = (_to_ns(window["timestamp"]) - self._origin) / 1e9
+        y = window["basis"].to_numpy()
+        self._sums += sign * np.array(
+            [len(x), x.sum(), y.sum(), (x * x).sum(), (x * y).sum()]
+        )
+
+    def _rebase(self, origin: int) -> None:
+        shift = (origin - self._origin) / 1e9
+        n, sum_x, sum_y, sum_xx, sum_xy = self._sums
+        self._sums[:] = (
+            n,
+            sum_x - n * shift,
+            sum_y,
+            sum_xx - 2 * shift * sum_x + n * shift * shift,
+            sum_xy - shift * sum_y,
+        )
+        self._origin = origin
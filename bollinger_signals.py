@@ -0,0 +1,151 @@
+from typing import Dict, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tick_capture import TRADE
+
+# Parameters of bollingerbandsrsi.py, as its __init__ sets them
+BOLLINGER_RSI = {
+    "bb_window": 30,
+    "bb_std_dev": 2.0,
+    "minimum_band_width": 0.01,
+    "rsi_window": 21,
+    "max_position_size_percentage": 0.05,
+    "capital": 100000.0,
+}
+
+# Order reasons, in the order one evaluation can send them
+MEAN_REVERSION = 0
+BULLISH_DIVERGENCE = 1
+BEARISH_DIVERGENCE = 2
+
+ORDER_DTYPE = np.dtype(
+    [
+        ("event", np.int64),
+        ("ticker", np.int8),
+        ("side", np.int8),  # Side.value: 0 BUY, 1 SELL
+        ("reason", np.int8),
+        ("price", np.float64),
+        ("quantity", np.float64),
+    ]
+)
+
+
+def band_features(prices: np.ndarray, params: Dict):
+    """Bands and RSI for every trade count of one ticker.
+
+    Row `m` holds what the strategy computes once `m` trades have been
+    pushed (rows before `bb_window` are NaN). Windows are strided views
+    reduced along their last axis, which performs the same floating point
+    operations as the strategy's np.mean/np.std on each window, so the
+    values are bitwise identical.
+    """
+    w = params["bb_window"]
+    n = len(prices) + 1
+    sma = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    rsi = np.full(n, np.nan)
+    if len(prices) < w:
+        return sma, std, rsi
+    windows = sliding_window_view(prices, w)
+    sma[w:] = windows.mean(axis=1)
+    std[w:] = windows.std(axis=1)
+
+    r = params["rsi_window"]
+    if w < r:
+        rsi[w:] = 50  # calculate_rsi's neutral value for short windows
+        return sma, std, rsi
+    deltas = np.diff(prices)
+    # The last r deltas of each window (all w - 1 if it has fewer);
+    # deltas[k] = prices[k + 1] - prices[k]
+    r = min(r, w - 1)
+    gains = sliding_window_view(np.where(deltas > 0, deltas, 0), r)[w - 1 - r:]
+    losses = sliding_window_view(np.where(deltas < 0, -deltas, 0), r)[w - 1 - r:]
+    average_gain = gains.mean(axis=1)
+    average_loss = losses.mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi[w:] = np.where(average_loss == 0, 100, 100 - (100 / (1 + average_gain / average_loss)))
+    return sma, std, rsi
+
+
+def bollinger_signals(kind: np.ndarray, price: np.ndarray, params: Optional[Dict] = None, ticker: int = 0) -> np.ndarray:
+    """Orders bollingerbandsrsi.Strategy sends for one ticker's events.
+
+    `kind` and `price` are that ticker's events in arrival order: every
+    event is evaluated (mean reversion, then divergence) and trades also
+    push their price first. Orders carry the index of the event that sent
+    them. The quantity assumes the capital stays at `params["capital"]`.
+    The live strategy reads it from account updates, but the decisions do
+    not depend on it.
+    """
+    params = {**BOLLINGER_RSI, **(params or {})}
+    kind = np.asarray(kind)
+    price = np.asarray(price, dtype=np.float64)
+    trades = kind == TRADE
+    prices = price[trades]
+    sma, std, rsi = band_features(prices, params)
+
+    # Trades pushed so far at each event, and the features it sees
+    m = np.cumsum(trades)
+    ready = m >= params["bb_window"]
+    current = np.where(m > 0, prices[np.maximum(m - 1, 0)], np.nan) if len(prices) else np.full(len(m), np.nan)
+    previous = np.where(m > 1, prices[np.maximum(m - 2, 0)], np.nan) if len(prices) else np.full(len(m), np.nan)
+    event_sma = sma[m]
+    event_std = std[m]
+    event_rsi = rsi[m]
+    upper_band = event_sma + params["bb_std_dev"] * event_std
+    lower_band = event_sma - params["bb_std_dev"] * event_std
+    with np.errstate(divide="ignore", invalid="ignore"):
+        band_width = (upper_band - lower_band) / event_sma
+
+    # Evaluations that pass the band width filter append their RSI to the
+    # history; the others leave it as it was
+    appended = ready & (band_width >= params["minimum_band_width"])
+    history = event_rsi[appended]
+    rsi_count = np.cumsum(appended)
+    rsi_current = np.where(rsi_count >= 1, history[np.maximum(rsi_count - 1, 0)] if len(history) else np.nan, np.nan)
+    rsi_previous = np.where(rsi_count >= 2, history[np.maximum(rsi_count - 2, 0)] if len(history) else np.nan, np.nan)
+
+    mean_reversion_buy = appended & (current <= lower_band) & (event_rsi < 30)
+    mean_reversion_sell = appended & ~mean_reversion_buy & (current >= upper_band) & (event_rsi > 75)
+    divergence = ready & (rsi_count >= 2)
+    bullish = divergence & (current < previous) & (rsi_current > rsi_previous)
+    bearish = divergence & (current > previous) & (rsi_current < rsi_previous)
+
+    orders = []
+    for reason, side, mask in (
+        (MEAN_REVERSION, 0, mean_reversion_buy),
+        (MEAN_REVERSION, 1, mean_reversion_sell),
+        (BULLISH_DIVERGENCE, 0, bullish),
+        (BEARISH_DIVERGENCE, 1, bearish),
+    ):
+        events = np.flatnonzero(mask)
+        block = np.empty(len(events), dtype=ORDER_DTYPE)
+        block["event"] = events
+        block["ticker"] = ticker
+        block["side"] = side
+        block["reason"] = reason
+        block["price"] = current[events]
+        block["quantity"] = params["capital"] * params["max_position_size_percentage"] / current[events]
+        orders.append(block)
+    orders = np.concatenate(orders)
+    return orders[np.lexsort((orders["reason"], orders["event"]))]
+
+
+def capture_signals(events: np.ndarray, params: Optional[Dict] = None) -> np.ndarray:
+    """Orders for a whole capture (EVENT_DTYPE), in the order they are sent.
+
+    Each ticker only ever evaluates its own events, so tickers are processed
+    independently and merged by event index.
+    """
+    orders = []
+    for ticker in np.unique(events["ticker"]):
+        index = np.flatnonzero(events["ticker"] == ticker)
+        ticker_orders = bollinger_signals(events["kind"][index], events["price"][index], params, int(ticker))
+        ticker_orders["event"] = index[ticker_orders["event"]]
+        orders.append(ticker_orders)
+    if not orders:
+        return np.empty(0, dtype=ORDER_DTYPE)
+    orders = np.concatenate(orders)
+    return orders[np.lexsort((orders["reason"], orders["event"]))]
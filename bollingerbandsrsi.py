@@ -1,10 +1,14 @@
 from enum import Enum
 import time
-from collections import defaultdict
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 import pandas as pd
 
+from conflation import Conflator
+from fill_ledger import FillLedger
+from order_manager import OrderManager
+from ticker_state import TickerState
+
 class Side(Enum):
     BUY = 0
     SELL = 1
@@ -28,29 +32,53 @@ def cancel_order(ticker: Ticker, order_id: int) -> bool:
 
 class Strategy:
     def __init__(self) -> None:
-        self.order_ids: Dict[int, Dict] = {}
-        self.prices: Dict[Ticker, float] = {}
+        self.orders = OrderManager(place_limit_order, cancel_order)
         self.capital: float = 100000.0
-        self.positions: Dict[Ticker, List[Dict]] = defaultdict(list)
-        self.price_history: Dict[Ticker, List[float]] = defaultdict(list)
-        self.rsi_history: Dict[Ticker, List[float]] = defaultdict(list)
-        self.order_book: Dict[Ticker, Dict[str, Dict[float, float]]] = defaultdict(
-            lambda: {'buy': defaultdict(float), 'sell': defaultdict(float)}
-        )
+        self.ledger = FillLedger(len(Ticker))
+        self.order_book: List[Dict[str, Dict[float, float]]] = [{'buy': {}, 'sell': {}} for _ in Ticker]
         self.rsi_window: int = 21
         self.bb_window: int = 30
+        # Per-ticker state as arrays indexed by Ticker.value: the last bb_window
+        # prices, and the last two RSI values (only those are ever compared)
+        self.state = TickerState(len(Ticker), self.bb_window)
+        self.rsi_history = np.zeros((len(Ticker), 2))
+        self.rsi_count = np.zeros(len(Ticker), dtype=np.int64)
         self.bb_std_dev: float = 2.0
         self.minimum_band_width: float = 0.01
         self.max_position_size_percentage: float = 0.05  # Maximum 5% of capital per position
+        # Book updates are conflated per ticker: seconds between signal
+        # evaluations, 0 evaluates every update, None waits for the next trade
+        self.conflation_interval: Optional[float] = 0.05
+        # The module's clock, which replays (tournament.py) replace
+        self.conflator = Conflator(self.evaluate_signals, interval=self.conflation_interval, clock=time.monotonic)
+
+    def warm_start(self, ticker: Ticker, prices: np.ndarray, volumes: Optional[np.ndarray] = None) -> None:
+        """Load recorded trade prices (oldest first) and seed the RSI history
+        with the RSI of the last two full windows whose band is wide enough,
+        as live ticks would have, so both the band and the divergence checks
+        can fire on the first live tick."""
+        i = ticker.value
+        prices = np.asarray(prices, dtype=np.float64)
+        self.state.load(i, prices)
+        ends = []
+        for end in range(len(prices), self.bb_window - 1, -1):
+            if self.bands(prices[end - self.bb_window:end])[2] >= self.minimum_band_width:
+                ends.append(end)
+                if len(ends) == 2:
+                    break
+        for end in reversed(ends):
+            self.rsi_history[i, 0] = self.rsi_history[i, 1]
+            self.rsi_history[i, 1] = self.calculate_rsi(prices[end - self.bb_window:end])
+            self.rsi_count[i] += 1
 
     def on_trade_update(self, ticker: Ticker, side: Side, quantity: float, price: float) -> None:
-        self.price_history[ticker].append(price)
-        if len(self.price_history[ticker]) > self.bb_window:
-            self.price_history[ticker].pop(0)
-
-        self.prices[ticker] = price
-        self.execute_mean_reversion_on_orderbook(ticker)
-        self.check_divergence(ticker)
+        # Our IOC orders from earlier events have been filled or killed by now
+        self.orders.expire_ioc()
+        self.state.push(ticker.value, price)
+        self.ledger.mark(ticker, price)
+        # A trade closes the current book snapshot: evaluate now, covering any
+        # book updates still pending for this ticker
+        self.conflator.update(ticker, immediate=True)
 
     def on_orderbook_update(
         self, ticker: Ticker, side: Side, quantity: float, price: float
@@ -59,35 +87,37 @@ class Strategy:
         print(f"Orderbook update: {ticker.name} {side.name} {price} {quantity}")
 
         if quantity == 0:
-            if price in self.order_book[ticker][side.name.lower()]:
-                del self.order_book[ticker][side.name.lower()][price]
+            if price in self.order_book[ticker.value][side.name.lower()]:
+                del self.order_book[ticker.value][side.name.lower()][price]
                 print(f"Removed {side.name} order at {price} for {ticker.name} from local order book.")
         else:
-            self.order_book[ticker][side.name.lower()][price] = quantity
+            self.order_book[ticker.value][side.name.lower()][price] = quantity
             print(f"Updated {side.name} order at {price} for {ticker.name} with quantity {quantity} in local order book.")
 
+        self.conflator.update(ticker)
+
+    def evaluate_signals(self, ticker: Ticker) -> None:
+        """Runs the mean reversion and divergence checks for one ticker."""
         self.execute_mean_reversion_on_orderbook(ticker)
         self.check_divergence(ticker)
 
     def execute_mean_reversion_on_orderbook(self, ticker: Ticker) -> None:
         """Executes the mean reversion strategy based on the latest order book update."""
-        if len(self.price_history[ticker]) < self.bb_window:
+        i = ticker.value
+        if self.state.count[i] < self.bb_window:
             return
 
-        prices = np.array(self.price_history[ticker])
-        sma = np.mean(prices)
-        std_dev = np.std(prices)
+        prices = self.state.window(i, self.bb_window)
+        lower_band, upper_band, band_width = self.bands(prices)
+        current_price = self.state.last[i]
 
-        upper_band = sma + self.bb_std_dev * std_dev
-        lower_band = sma - self.bb_std_dev * std_dev
-        current_price = self.prices[ticker]
-
-        band_width = (upper_band - lower_band) / sma
         if band_width < self.minimum_band_width:
             return
 
         rsi = self.calculate_rsi(prices)
-        self.rsi_history[ticker].append(rsi)
+        self.rsi_history[i, 0] = self.rsi_history[i, 1]
+        self.rsi_history[i, 1] = rsi
+        self.rsi_count[i] += 1
 
         position_size = self.calculate_position_size(current_price)
 
@@ -95,31 +125,28 @@ class Strategy:
         if current_price <= lower_band and rsi < 30:
             order_id = self.place_limit_order(Side.BUY, ticker, position_size, current_price, ioc=True)
             if order_id:
-                self.positions[ticker].append({'order_id': order_id, 'side': Side.BUY, 'price': current_price, 'quantity': position_size})
                 print(f"Orderbook Mean Reversion: Placed BUY order for {ticker.name} at {current_price} with order ID {order_id}")
 
         # Short position criteria
         elif current_price >= upper_band and rsi > 75:
             order_id = self.place_limit_order(Side.SELL, ticker, position_size, current_price, ioc=True)
             if order_id:
-                self.positions[ticker].append({'order_id': order_id, 'side': Side.SELL, 'price': current_price, 'quantity': position_size})
                 print(f"Orderbook Mean Reversion: Placed SELL order for {ticker.name} at {current_price} with order ID {order_id}")
 
     def on_account_update(self, ticker: Ticker, side: Side, price: float, quantity: float, capital_remaining: float) -> None:
+        self.orders.on_fill(ticker, side, price, quantity)
         self.capital = capital_remaining
-        if side == Side.BUY:
-            self.positions[ticker].append({'price': price, 'quantity': quantity, 'side': side})
-        elif side == Side.SELL:
-            self.positions[ticker].append({'price': price, 'quantity': quantity, 'side': side})
+        self.ledger.on_fill(ticker, side, price, quantity)
 
     def check_divergence(self, ticker: Ticker) -> None:
         """Checks for divergence based on RSI and price movement patterns."""
-        if len(self.price_history[ticker]) < self.bb_window or len(self.rsi_history[ticker]) < 2:
+        i = ticker.value
+        if self.state.count[i] < self.bb_window or self.rsi_count[i] < 2:
             return
 
-        prices = np.array(self.price_history[ticker])
-        rsi_values = np.array(self.rsi_history[ticker])
-        current_price = self.prices[ticker]
+        prices = self.state.window(i, self.bb_window)
+        rsi_values = self.rsi_history[i]
+        current_price = self.state.last[i]
 
         # Bullish Divergence
         if len(prices) >= 2 and len(rsi_values) >= 2:
@@ -132,7 +159,6 @@ class Strategy:
                 position_size = self.calculate_position_size(current_price)
                 order_id = self.place_limit_order(Side.BUY, ticker, position_size, current_price, ioc=True)
                 if order_id:
-                    self.positions[ticker].append({'order_id': order_id, 'side': Side.BUY, 'price': current_price, 'quantity': position_size})
                     print(f"Divergence: Bullish - Placed BUY order for {ticker.name} at {current_price} with order ID {order_id}")
 
         # Bearish Divergence
@@ -146,9 +172,16 @@ class Strategy:
                 position_size = self.calculate_position_size(current_price)
                 order_id = self.place_limit_order(Side.SELL, ticker, position_size, current_price, ioc=True)
                 if order_id:
-                    self.positions[ticker].append({'order_id': order_id, 'side': Side.SELL, 'price': current_price, 'quantity': position_size})
                     print(f"Divergence: Bearish - Placed SELL order for {ticker.name} at {current_price} with order ID {order_id}")
 
+    def bands(self, prices: np.ndarray) -> Tuple[float, float, float]:
+        """Lower and upper Bollinger band of a window and their width relative to its mean."""
+        sma = np.mean(prices)
+        std_dev = np.std(prices)
+        upper_band = sma + self.bb_std_dev * std_dev
+        lower_band = sma - self.bb_std_dev * std_dev
+        return lower_band, upper_band, (upper_band - lower_band) / sma
+
     def calculate_rsi(self, prices: np.ndarray) -> float:
         if len(prices) < self.rsi_window:
             return 50  # Neutral if not enough data
@@ -175,9 +208,8 @@ class Strategy:
 
     def place_limit_order(self, side: Side, ticker: Ticker, quantity: float, price: float, ioc: bool = False) -> Optional[int]:
         try:
-            order_id = place_limit_order(side, ticker, quantity, price, ioc)
-            if order_id != 0:
-                self.order_ids[order_id] = {'ticker': ticker, 'side': side, 'ioc': ioc}
+            order_id = self.orders.place(side, ticker, quantity, price, ioc)
+            if order_id is not None:
                 print(f"Placed LIMIT order: {side.name} {ticker.name} {quantity} @ {price} with order ID {order_id}")
                 return order_id
             else:
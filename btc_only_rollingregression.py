@@ -1,9 +1,12 @@
 from enum import Enum
 import time
-from collections import defaultdict
-from typing import Dict, List, Optional
+from typing import List, Optional, Tuple
 import numpy as np
-from sklearn.linear_model import LinearRegression
+
+from conflation import Conflator
+from fill_ledger import FillLedger
+from ticker_state import TickerState
+from warm_start import TickerStateWarmStart
 
 
 class Side(Enum):
@@ -32,71 +35,71 @@ def cancel_order(ticker: Ticker, order_id: int) -> bool:
     return True
 
 
-class Strategy:
+class Strategy(TickerStateWarmStart):
     """Simplified trading strategy using rolling regression for BTC."""
 
     def __init__(self) -> None:
         """Initialize the strategy."""
         # Initialize variables
         self.capital: float = 100000.0  # Starting capital
-        self.position: Optional[str] = None  # 'long' or None
-        self.position_size: float = 0.0  # Quantity of BTC held
-        self.price_history: List[float] = []  # BTC price history
+        self.ledger = FillLedger(len(Ticker))  # Net position, average entry price and PnL per ticker
         self.window_size: int = 10  # Reduced window size
+        self.tickers: Tuple[Ticker, ...] = (Ticker.BTC,)  # Only consider BTC
+        self.state = TickerState(len(Ticker), self.window_size * 2)  # Price history, one row per Ticker.value
         self.max_position_fraction: float = 0.5  # Max fraction of capital to use
         self.entry_threshold: float = 0.0  # Lowered entry threshold
         self.exit_threshold: float = -0.001  # Negative exit threshold
         self.order_timestamps: List[float] = []  # For rate limiting
         self.max_orders_per_minute: int = 30  # Rate limit
-        self.best_bid: Optional[float] = None
-        self.best_ask: Optional[float] = None
+        self.best_bid = np.full(len(Ticker), np.nan)
+        self.best_ask = np.full(len(Ticker), np.nan)
+        # Book updates are conflated per ticker: seconds between evaluations,
+        # 0 evaluates every update, None waits for the next trade
+        self.conflation_interval: Optional[float] = 0.05
+        # The module's clock, which replays (tournament.py) replace
+        self.conflator = Conflator(self.execute_trade, interval=self.conflation_interval, clock=time.monotonic)
 
     def on_trade_update(self, ticker: Ticker, side: Side, price: float, quantity: float) -> None:
         """Called whenever two orders match."""
-        # Only consider BTC
-        if ticker != Ticker.BTC:
+        if ticker not in self.tickers:
             return
 
         print(f"Python Trade update: {ticker.name} {side.name} {price} {quantity}")
 
         # Update price history
-        self.price_history.append(price)
-        if len(self.price_history) > self.window_size * 2:
-            self.price_history = self.price_history[-self.window_size * 2:]
+        self.state.push(ticker.value, price)
 
-        # Attempt to execute trades
-        self.execute_trade()
+        # Attempt to execute trades; this also covers pending book updates
+        self.conflator.update(ticker, immediate=True)
 
     def on_orderbook_update(self, ticker: Ticker, side: Side, price: float, quantity: float) -> None:
         """Update price history based on orderbook updates."""
-        # Only consider BTC
-        if ticker != Ticker.BTC:
+        if ticker not in self.tickers:
             return
 
-        # Update the best bid and ask prices
+        # Update the best bid and ask prices (NaN = no level)
+        i = ticker.value
         if side == Side.BUY:
             if quantity == 0:
-                if self.best_bid == price:
-                    self.best_bid = None
+                if self.best_bid[i] == price:
+                    self.best_bid[i] = np.nan
             else:
-                if self.best_bid is None or price > self.best_bid:
-                    self.best_bid = price
+                if np.isnan(self.best_bid[i]) or price > self.best_bid[i]:
+                    self.best_bid[i] = price
         elif side == Side.SELL:
             if quantity == 0:
-                if self.best_ask == price:
-                    self.best_ask = None
+                if self.best_ask[i] == price:
+                    self.best_ask[i] = np.nan
             else:
-                if self.best_ask is None or price < self.best_ask:
-                    self.best_ask = price
+                if np.isnan(self.best_ask[i]) or price < self.best_ask[i]:
+                    self.best_ask[i] = price
 
-        if self.best_bid is not None and self.best_ask is not None:
-            mid_price = (self.best_bid + self.best_ask) / 2
-            self.price_history.append(mid_price)
-            if len(self.price_history) > self.window_size * 2:
-                self.price_history = self.price_history[-self.window_size * 2:]
+        if not np.isnan(self.best_bid[i]) and not np.isnan(self.best_ask[i]):
+            mid_price = (self.best_bid[i] + self.best_ask[i]) / 2
+            self.state.push(i, mid_price)
 
-            # Attempt to execute trades
-            self.execute_trade()
+            # Attempt to execute trades, at most once per conflation slice
+            self.conflator.update(ticker)
 
     def on_account_update(
         self,
@@ -107,54 +110,43 @@ class Strategy:
         capital_remaining: float,
     ) -> None:
         """Called whenever one of your orders is filled."""
-        # Only consider BTC
-        if ticker != Ticker.BTC:
+        if ticker not in self.tickers:
             return
 
         print(f"Python Account update: {ticker.name} {side.name} {price} {quantity} {capital_remaining}")
 
         # Update capital and position
         self.capital = capital_remaining
-        if side == Side.BUY:
-            self.position_size += quantity
-            self.position = 'long'
-        elif side == Side.SELL:
-            self.position_size -= quantity
-            if self.position_size <= 0:
-                self.position = None
+        self.ledger.on_fill(ticker, side, price, quantity)
 
-    def execute_trade(self) -> None:
+    def execute_trade(self, ticker: Ticker) -> None:
         """Execute trades based on rolling regression slope."""
-        if len(self.price_history) < self.window_size:
+        i = ticker.value
+        if self.state.count[i] < self.window_size:
             return  # Not enough data
 
-        # Calculate regression slope
-        prices = self.price_history[-self.window_size:]
-        x = np.arange(len(prices)).reshape(-1, 1)
-        y = np.array(prices).reshape(-1, 1)
-        model = LinearRegression()
-        model.fit(x, y)
-        slope = model.coef_[0][0]
+        # Calculate regression slope (all state rows in one vector pass)
+        slope = self.state.regression_slopes(self.window_size, normalize=False)[i]
 
         # Print the regression slope for debugging
         print(f"Regression slope: {slope}")
 
         # Decide whether to enter or exit position
-        current_price = prices[-1]
-        position = self.position
+        current_price = self.state.last[i]
+        position = float(self.ledger.position[i])
 
-        if position is None and slope > self.entry_threshold:
+        if position <= 0 and slope > self.entry_threshold:
             # Upward trend detected; enter long position
             # Use only a fraction of capital
             investment = self.capital * self.max_position_fraction
             quantity = investment / current_price
-            if self.place_market_order_with_rate_limit(Side.BUY, Ticker.BTC, quantity):
-                print(f"Entering long position: Bought {quantity} BTC at {current_price}")
-        elif position == 'long' and slope < self.exit_threshold:
+            if self.place_market_order_with_rate_limit(Side.BUY, ticker, quantity):
+                print(f"Entering long position: Bought {quantity} {ticker.name} at {current_price}")
+        elif position > 0 and slope < self.exit_threshold:
             # Downward trend detected; exit long position
-            quantity = self.position_size
-            if self.place_market_order_with_rate_limit(Side.SELL, Ticker.BTC, quantity):
-                print(f"Exiting long position: Sold {quantity} BTC at {current_price}")
+            quantity = position
+            if self.place_market_order_with_rate_limit(Side.SELL, ticker, quantity):
+                print(f"Exiting long position: Sold {quantity} {ticker.name} at {current_price}")
 
     def place_market_order_with_rate_limit(self, side: Side, ticker: Ticker, quantity: float) -> bool:
         """Place a market order accounting for the rate limit."""
@@ -0,0 +1,89 @@
+import time
+from typing import Callable, Dict, Optional
+
+
+class Conflator:
+    """Coalesces bursty per-ticker updates into fewer signal evaluations.
+
+    Callbacks call `update(ticker)` after applying a book change to their
+    state, and `evaluate(ticker)` runs at most once per `interval` seconds per
+    ticker. Updates arriving inside the slice are only marked pending and are
+    covered by the next evaluation. With `interval=None` nothing is evaluated
+    until `flush()`, so the caller decides where a book snapshot ends (e.g. on
+    the next trade). `interval=0` evaluates every update, i.e. no conflation.
+
+    Counters report how many evaluations were saved and how stale the
+    evaluations were: the time from the first update they cover to the moment
+    they ran.
+    """
+
+    def __init__(
+        self,
+        evaluate: Callable,
+        interval: Optional[float] = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.evaluate = evaluate
+        self.interval = interval
+        self.clock = clock
+        self.pending: Dict = {}  # ticker -> time of its first un-evaluated update
+        self.last_evaluation: Dict = {}  # ticker -> time of its last evaluation
+        self.updates: int = 0
+        self.evaluations: int = 0
+        self.total_staleness: float = 0.0
+        self.max_staleness: float = 0.0
+
+    @property
+    def saved(self) -> int:
+        """Evaluations skipped compared to evaluating every update."""
+        return self.updates - self.evaluations - len(self.pending)
+
+    def update(self, ticker, immediate: bool = False) -> bool:
+        """Record an update for `ticker`; returns True if it was evaluated."""
+        now = self.clock()
+        self.updates += 1
+        self.pending.setdefault(ticker, now)
+        if immediate or self._due(ticker, now):
+            self._run(ticker, now)
+            evaluated = True
+        else:
+            evaluated = False
+        # Don't leave other tickers pending past their slice just because
+        # their burst ended
+        if self.interval is not None and len(self.pending) > 0:
+            for other in [t for t in self.pending if self._due(t, now)]:
+                self._run(other, now)
+        return evaluated
+
+    def flush(self, ticker=None) -> None:
+        """Evaluate pending updates now (one ticker, or all of them)."""
+        now = self.clock()
+        tickers = [ticker] if ticker is not None else list(self.pending)
+        for pending_ticker in tickers:
+            if pending_ticker in self.pending:
+                self._run(pending_ticker, now)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "updates": self.updates,
+            "evaluations": self.evaluations,
+            "saved": self.saved,
+            "pending": len(self.pending),
+            "mean_staleness": self.total_staleness / self.evaluations if self.evaluations else 0.0,
+            "max_staleness": self.max_staleness,
+        }
+
+    def _due(self, ticker, now: float) -> bool:
+        if self.interval is None:
+            return False
+        last = self.last_evaluation.get(ticker)
+        return last is None or now - last >= self.interval
+
+    def _run(self, ticker, now: float) -> None:
+        staleness = now - self.pending.pop(ticker)
+        self.total_staleness += staleness
+        if staleness > self.max_staleness:
+            self.max_staleness = staleness
+        self.last_evaluation[ticker] = now
+        self.evaluations += 1
+        self.evaluate(ticker)
@@ -1,8 +1,11 @@
 from enum import Enum
-from collections import defaultdict
-from typing import List, Dict
+from typing import Optional
 import numpy as np
 
+from order_manager import OrderManager
+from risk_engine import RiskEngine
+from ticker_state import TickerState
+
 class Side(Enum):
     BUY = 0
     SELL = 1
@@ -24,64 +27,66 @@ def cancel_order(ticker: Ticker, order_id: int) -> bool:
 class Strategy:
     def __init__(self):
         self.capital = 100000.0
-        self.holdings: Dict[Ticker, float] = {Ticker.BTC: 0.0, Ticker.ETH: 0.0, Ticker.LTC: 0.0}
-        self.prices: Dict[Ticker, List[float]] = defaultdict(list)
-        self.volumes: Dict[Ticker, List[float]] = defaultdict(list)
-        self.open_orders: Dict[Ticker, Dict[int, float]] = defaultdict(dict)
+        self.btc_allocation = 0.5
+        # Share of capital each ticker may hold, counting resting buy orders
+        self.allocations = np.array([(1 - self.btc_allocation) / 2, self.btc_allocation, (1 - self.btc_allocation) / 2])
+        self.risk = RiskEngine(self.capital * self.allocations, total_limit=self.capital)
+        self.orders = OrderManager(place_limit_order, cancel_order, risk=self.risk)
         self.fee_rate = 0.004  # 40 bps fee
         self.window_size = 50
-        self.btc_allocation = 0.5
+        # Per-ticker arrays indexed by Ticker.value
+        self.holdings = np.zeros(len(Ticker))
+        self.state = TickerState(len(Ticker), self.window_size)  # last window_size trade prices/volumes
+
+    def warm_start(self, ticker: Ticker, prices: np.ndarray, volumes: Optional[np.ndarray] = None) -> None:
+        # Recorded trades (oldest first) fill the VWAP window at once instead
+        # of waiting for window_size live trades
+        self.state.load(ticker.value, prices, volumes)
 
     def on_trade_update(self, ticker: Ticker, side: Side, quantity: float, price: float) -> None:
-        self.prices[ticker].append(price)
-        self.volumes[ticker].append(quantity)
-        if len(self.prices[ticker]) > self.window_size:
-            self.prices[ticker].pop(0)
-            self.volumes[ticker].pop(0)
+        self.state.push(ticker.value, price, quantity)
 
     def on_orderbook_update(self, ticker: Ticker, side: Side, quantity: float, price: float) -> None:
-        if len(self.prices[ticker]) < self.window_size:
+        i = ticker.value
+        self.risk.mark(ticker, price)
+        if self.state.count[i] < self.window_size:
             return
 
-        vwap = np.average(self.prices[ticker], weights=self.volumes[ticker])
-        volatility = np.std(self.prices[ticker])
+        # VWAP and volatility of every ticker in one vector pass
+        vwap = self.state.vwap(self.window_size)[i]
+        volatility = self.state.std(self.window_size)[i]
 
-        if ticker == Ticker.BTC:
-            allocation = self.btc_allocation
+        # Quotes are only cancelled/replaced when the target moves beyond the
+        # order manager's tolerance, or pulled when the signal goes away. The
+        # risk engine shrinks the buy to the allocation left after holdings
+        # and open orders, and drops it when none is left.
+        if price < vwap - volatility:
+            self.orders.quote(Side.BUY, ticker, 1.0, price * 0.999)
         else:
-            allocation = (1 - self.btc_allocation) / 2
+            self.orders.cancel_quote(ticker, Side.BUY)
 
-        available_capital = self.capital * allocation
-        position_value = self.holdings[ticker] * price
-
-        if price < vwap - volatility and position_value < available_capital:
-            quantity = min((available_capital - position_value) / price, 1.0)
-            order_id = place_limit_order(Side.BUY, ticker, quantity, price * 0.999)
-            self.open_orders[ticker][order_id] = quantity
-        elif price > vwap + volatility and self.holdings[ticker] > 0:
-            quantity = min(self.holdings[ticker], 1.0)
-            order_id = place_limit_order(Side.SELL, ticker, quantity, price * 1.001)
-            self.open_orders[ticker][order_id] = quantity
-
-        # Cancel old orders
-        for order_id in list(self.open_orders[ticker].keys()):
-            if cancel_order(ticker, order_id):
-                del self.open_orders[ticker][order_id]
+        if price > vwap + volatility and self.holdings[i] > 0:
+            quantity = min(self.holdings[i], 1.0)
+            self.orders.quote(Side.SELL, ticker, quantity, price * 1.001)
+        else:
+            self.orders.cancel_quote(ticker, Side.SELL)
 
     def on_account_update(self, ticker: Ticker, side: Side, price: float, quantity: float, capital_remaining: float) -> None:
+        self.orders.on_fill(ticker, side, price, quantity)
         fee = price * quantity * self.fee_rate
         if side == Side.BUY:
-            self.holdings[ticker] += quantity
+            self.holdings[ticker.value] += quantity
             self.capital -= price * quantity + fee
         else:
-            self.holdings[ticker] -= quantity
+            self.holdings[ticker.value] -= quantity
             self.capital += price * quantity - fee
 
         self.capital = capital_remaining
+        self.risk.set_limits(self.capital * self.allocations, self.capital)
 
     def calculate_vwap(self, ticker: Ticker) -> float:
-        return np.average(self.prices[ticker], weights=self.volumes[ticker])
+        return self.state.vwap(self.window_size)[ticker.value]
 
     def calculate_volatility(self, ticker: Ticker) -> float:
-        return np.std(self.prices[ticker])
+        return self.state.std(self.window_size)[ticker.value]
     
\ No newline at end of file
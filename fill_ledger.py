@@ -0,0 +1,97 @@
+from typing import Dict
+
+import numpy as np
+
+FILL_DTYPE = np.dtype(
+    [
+        ("ticker", np.int8),
+        ("side", np.int8),
+        ("price", np.float64),
+        ("quantity", np.float64),
+        ("fee", np.float64),
+    ]
+)
+
+
+class FillLedger:
+    """Per-ticker position and PnL kept in preallocated arrays.
+
+    Arrays are indexed by `Ticker.value`, and `Side.value` is 0 for BUY and 1
+    for SELL, matching every strategy file. Each fill updates net position,
+    average cost, fees and realized PnL in O(1). The most recent `capacity`
+    fills are kept in a ring buffer for export, so memory stays bounded over
+    a session.
+    """
+
+    def __init__(self, n_tickers: int = 3, fee_rate: float = 0.004, capacity: int = 4096) -> None:
+        self.fee_rate = fee_rate
+        self.position = np.zeros(n_tickers)  # signed quantity, short < 0
+        self.avg_cost = np.zeros(n_tickers)  # average entry price of the open position
+        self.fees = np.zeros(n_tickers)
+        self.realized = np.zeros(n_tickers)  # before fees
+        self.last_price = np.zeros(n_tickers)
+        self.fill_count = np.zeros(n_tickers, dtype=np.int64)
+        self._fills = np.zeros(capacity, dtype=FILL_DTYPE)
+        self._total_fills = 0
+
+    def on_fill(self, ticker, side, price: float, quantity: float) -> None:
+        """Apply one fill from `on_account_update`."""
+        i = ticker.value
+        signed = quantity if side.value == 0 else -quantity
+        position = float(self.position[i])
+        fee = price * quantity * self.fee_rate
+
+        if position == 0 or (position > 0) == (signed > 0):
+            # Opening or adding: blend the average cost
+            new_position = position + signed
+            self.avg_cost[i] = (self.avg_cost[i] * abs(position) + price * quantity) / abs(new_position)
+        else:
+            # Reducing, closing or flipping
+            closed = min(quantity, abs(position))
+            direction = 1.0 if position > 0 else -1.0
+            self.realized[i] += closed * (price - self.avg_cost[i]) * direction
+            new_position = position + signed
+            if abs(new_position) < 1e-12:
+                new_position = 0.0
+                self.avg_cost[i] = 0.0
+            elif (new_position > 0) != (position > 0):
+                self.avg_cost[i] = price  # the remainder opened at this price
+
+        self.position[i] = new_position
+        self.fees[i] += fee
+        self.last_price[i] = price
+        self.fill_count[i] += 1
+
+        slot = self._total_fills % len(self._fills)
+        self._fills[slot] = (i, side.value, price, quantity, fee)
+        self._total_fills += 1
+
+    def mark(self, ticker, price: float) -> None:
+        """Update the price used for unrealized PnL."""
+        self.last_price[ticker.value] = price
+
+    def unrealized(self) -> np.ndarray:
+        return self.position * (self.last_price - self.avg_cost)
+
+    def net_pnl(self) -> np.ndarray:
+        return self.realized + self.unrealized() - self.fees
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copies of all per-ticker columns, ready for a DataFrame."""
+        return {
+            "position": self.position.copy(),
+            "avg_cost": self.avg_cost.copy(),
+            "fees": self.fees.copy(),
+            "realized": self.realized.copy(),
+            "unrealized": self.unrealized(),
+            "last_price": self.last_price.copy(),
+            "fill_count": self.fill_count.copy(),
+        }
+
+    def recent_fills(self) -> np.ndarray:
+        """The retained fills, oldest first, as a structured array."""
+        capacity = len(self._fills)
+        if self._total_fills <= capacity:
+            return self._fills[: self._total_fills].copy()
+        start = self._total_fills % capacity
+        return np.concatenate([self._fills[start:], self._fills[:start]])
@@ -0,0 +1,238 @@
+"""Backtests that resume from a checkpoint when new bars arrive.
+
+`incremental_backtest` runs the Backtest_Simulator strategy over the bars
+it has not seen yet and returns an updated checkpoint holding everything a
+later call needs to continue:
+
+- the state machine (position, previous_balance, bitcoin_balance, counters,
+  fees; see kernels.backtest_resume)
+- the streaming indicator states of every column the strategy's rules read
+- the last TAIL bars of those columns, for `prev(...)` in rules
+- the trades so far and the last timestamp processed
+
+Appending bars therefore costs O(new bars) and gives exactly the numbers a
+full `backtest()` over the whole history gives. Checkpoints are JSON files:
+
+    checkpoint = load_checkpoint("btc_15m.json")
+    result, checkpoint = incremental_backtest(
+        bars, 10000, 0.001, strategy, checkpoint
+    )
+    save_checkpoint("btc_15m.json", checkpoint)
+
+Only closed bars should be passed in: a bar already checkpointed is never
+revisited, even if a later fetch revises it.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import kernels
+import rules
+from result_store import canonical_json
+from streaming_indicators import (
+    StreamingDoubleEMA,
+    StreamingEMA,
+    StreamingEWM,
+    StreamingPPO,
+    StreamingRSI,
+)
+
+CHECKPOINT_VERSION = 2
+
+# Bars of rule columns kept for prev(); prev(x, n) must have n <= TAIL
+TAIL = 64
+
+# Indicator columns that can be resumed, with the streaming indicator
+# matching the Backtest_Simulator function that adds them
+STREAMING = {
+    "rsi": lambda: StreamingRSI(14),
+    "price_oscillator": lambda: StreamingPPO(),
+    "ema": lambda: StreamingEMA(14),
+    "double_ema": lambda: StreamingDoubleEMA(200),
+}
+_CLASSES = {
+    cls.__name__: cls
+    for cls in (
+        StreamingDoubleEMA,
+        StreamingEMA,
+        StreamingEWM,
+        StreamingPPO,
+        StreamingRSI,
+    )
+}
+
+
+def _slots(cls):
+    return [
+        slot
+        for klass in cls.__mro__
+        for slot in getattr(klass, "__slots__", ())
+    ]
+
+
+def _dump(indicator):
+    """JSON-ready state of a streaming indicator."""
+    state = {"type": type(indicator).__name__}
+    for slot in _slots(type(indicator)):
+        value = getattr(indicator, slot)
+        if not isinstance(value, (int, float)):
+            value = _dump(value)
+        state[slot] = value
+    return state
+
+
+def _load(state):
+    indicator = object.__new__(_CLASSES[state["type"]])
+    for slot in _slots(type(indicator)):
+        value = state[slot]
+        if isinstance(value, dict):
+            value = _load(value)
+        setattr(indicator, slot, value)
+    return indicator
+
+
+def new_checkpoint(initial_balance, fee, strategy):
+    """Checkpoint of a backtest that has not seen any bar yet."""
+    columns = sorted(rules.strategy_columns([strategy]))
+    unsupported = [column for column in columns if column not in STREAMING]
+    if unsupported:
+        raise ValueError(f"cannot resume indicators: {unsupported}")
+    return {
+        "version": CHECKPOINT_VERSION,
+        "initial_balance": initial_balance,
+        "fee": fee,
+        "strategy": strategy,
+        "bars": 0,
+        "last_timestamp": None,
+        "state": kernels.initial_state(float(initial_balance)).tolist(),
+        "indicators": {
+            column: _dump(STREAMING[column]()) for column in columns
+        },
+        "tail": {},
+        "start_dates": [],
+        "end_dates": [],
+        "balance_deltas": [],
+    }
+
+
+def incremental_backtest(
+    bars, initial_balance, fee, strategy, checkpoint=None
+):
+    """`Backtest_Simulator.backtest` over the bars newer than `checkpoint`.
+
+    `bars` may be only the new bars or the whole history; rows at or before
+    the checkpoint's last timestamp are skipped. Returns the backtest()
+    result tuple, cumulative since the first bar except for the equity
+    curve and in-market mask, which cover the bars processed by this call,
+    and the updated checkpoint (`checkpoint` itself is not modified).
+    """
+    if checkpoint is None:
+        checkpoint = new_checkpoint(initial_balance, fee, strategy)
+    elif (
+        checkpoint["version"] != CHECKPOINT_VERSION
+        or checkpoint["initial_balance"] != initial_balance
+        or checkpoint["fee"] != fee
+        or canonical_json(checkpoint["strategy"]) != canonical_json(strategy)
+    ):
+        raise ValueError("checkpoint belongs to a different backtest")
+    checkpoint = json.loads(json.dumps(checkpoint))
+
+    if checkpoint["last_timestamp"] is not None:
+        last = pd.Timestamp(checkpoint["last_timestamp"])
+        first_new = np.searchsorted(
+            bars["timestamp"].to_numpy(), last.to_datetime64(), side="right"
+        )
+        bars = bars.iloc[first_new:]
+    close = bars["close"].to_numpy(dtype=np.float64)
+
+    # Indicator values of the new bars, continuing the saved states
+    frame = {
+        name: bars[name].to_numpy(dtype=np.float64)
+        for name in rules.BASE_COLUMNS
+        if name in bars.columns
+    }
+    for column, state in checkpoint["indicators"].items():
+        indicator = _load(state)
+        frame[column] = np.array([indicator.update(x) for x in close])
+        checkpoint["indicators"][column] = _dump(indicator)
+    frame = pd.DataFrame(frame)
+    tail = pd.DataFrame(checkpoint["tail"], dtype=np.float64)
+    if len(tail):
+        frame = pd.concat([tail, frame], ignore_index=True)
+
+    entry_rule, exit_rule = rules.strategy_rules(strategy)
+    entry = entry_rule.mask(frame, strategy)[len(tail) :]
+    if exit_rule is None:
+        exit = np.zeros(len(close), dtype=np.bool_)
+    else:
+        exit = exit_rule.mask(frame, strategy)[len(tail) :]
+
+    state = np.array(checkpoint["state"])
+    # The very first bar only sets the starting equity, as in backtest()
+    start = 1 if checkpoint["bars"] == 0 else 0
+    stop_loss = strategy.get("stop_loss")
+    entries, exits, balance_deltas, equity_curve, in_market = (
+        kernels.backtest_resume(
+            close,
+            entry,
+            exit,
+            float(fee),
+            float(strategy["take_profit"]),
+            -np.inf if stop_loss is None else float(stop_loss),
+            state,
+            start,
+        )
+    )
+
+    timestamps = bars["timestamp"]
+    checkpoint["start_dates"] += [str(t) for t in timestamps.iloc[entries]]
+    checkpoint["end_dates"] += [str(t) for t in timestamps.iloc[exits]]
+    checkpoint["balance_deltas"] += balance_deltas.tolist()
+    checkpoint["state"] = state.tolist()
+    checkpoint["bars"] += len(close)
+    if len(close):
+        checkpoint["last_timestamp"] = str(timestamps.iloc[-1])
+    checkpoint["tail"] = {
+        name: values.iloc[-TAIL:].tolist() for name, values in frame.items()
+    }
+
+    final_balance = 0.0
+    if not state[kernels.BUSTED] and checkpoint["bars"] > 0:
+        final_balance = state[kernels.EQUITY]
+    percentage_return = (
+        (final_balance - initial_balance) / initial_balance * 100
+    )
+    result = (
+        final_balance,
+        percentage_return,
+        int(state[kernels.GAIN_COUNT]),
+        int(state[kernels.LOSS_COUNT]),
+        state[kernels.TOTAL_FEES],
+        (
+            [pd.Timestamp(t) for t in checkpoint["start_dates"]],
+            [pd.Timestamp(t) for t in checkpoint["end_dates"]],
+        ),
+        list(checkpoint["balance_deltas"]),
+        (equity_curve, in_market),
+    )
+    return result, checkpoint
+
+
+def load_checkpoint(path):
+    """The checkpoint saved at `path`, or None if there is none yet."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, checkpoint):
+    """Write atomically, so a crash never leaves a truncated checkpoint."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary, path)
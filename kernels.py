@@ -0,0 +1,262 @@
+import numpy as np
+
+# Numba is optional: when it is installed the kernels below are compiled to
+# machine code on first use and cached next to this file, so the compile cost
+# is paid once per machine. nogil lets the BacktestJobs thread pool run them
+# in parallel. Without Numba the same functions run as plain Python and give
+# identical results; their callers then pass the loop inputs as lists, which
+# plain Python indexes several times faster than arrays.
+try:
+    from numba import njit
+
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+# Slots of the state array backtest_resume carries from one call to the next
+PREVIOUS_BALANCE = 0  # balance the open position was entered with
+BALANCE = 1  # cash
+BITCOIN_BALANCE = 2
+IN_POSITION = 3
+BUSTED = 4
+GAIN_COUNT = 5
+LOSS_COUNT = 6
+TOTAL_FEES = 7
+EQUITY = 8  # marked value at the last bar processed
+STATE_SIZE = 9
+
+
+def loop_input(values):
+    """`values` as the compiled kernels or the plain Python loops take them."""
+    values = np.asarray(values)
+    return values if HAVE_NUMBA else values.tolist()
+
+
+def initial_state(initial_balance):
+    state = np.zeros(STATE_SIZE)
+    state[PREVIOUS_BALANCE] = initial_balance
+    state[BALANCE] = initial_balance
+    state[EQUITY] = initial_balance
+    return state
+
+
+@njit(cache=True, nogil=True)
+def backtest_resume(
+    close, entry, exit, fee, take_profit, stop_loss, state, start
+):
+    """Runs the state machine of `backtest_kernel` over bars `start` to the
+    end, continuing from `state` and updating it in place. Returns the entry
+    and exit bar indices, per-trade returns, the equity curve and the
+    in-market mask of these bars (bars before `start` hold the state's)."""
+    n = len(close)
+    previous_balance = float(state[PREVIOUS_BALANCE])
+    balance = float(state[BALANCE])
+    bitcoin_balance = float(state[BITCOIN_BALANCE])
+    in_position = state[IN_POSITION] != 0
+    busted = state[BUSTED] != 0
+    gain_count = float(state[GAIN_COUNT])
+    loss_count = float(state[LOSS_COUNT])
+    total_fees = float(state[TOTAL_FEES])
+    equity = float(state[EQUITY])
+    entries = np.empty(n, dtype=np.int64)
+    exits = np.empty(n, dtype=np.int64)
+    balance_deltas = np.empty(n)
+    n_entries = 0
+    n_exits = 0
+    equity_curve = np.full(n, equity)
+    in_market = np.full(n, in_position)
+
+    for i in range(start, n):
+        if busted or previous_balance <= 0:
+            equity_curve[i:] = equity
+            in_market[i:] = in_position
+            busted = True
+            break
+        updated_balance = bitcoin_balance * close[i]
+        percent_change = (updated_balance - previous_balance) / previous_balance
+        if entry[i] and not in_position:
+            total_fees += balance * fee
+            balance *= 1 - fee
+            bitcoin_balance = balance / close[i]
+            previous_balance = balance
+            balance = 0.0
+            in_position = True
+            entries[n_entries] = i
+            n_entries += 1
+        elif percent_change >= take_profit or (
+            in_position and (exit[i] or percent_change <= stop_loss)
+        ):
+            total_fees += updated_balance * fee
+            updated_balance *= 1 - fee
+            if updated_balance > previous_balance:
+                gain_count += 1
+            else:
+                loss_count += 1
+            balance_deltas[n_exits] = percent_change
+            balance = updated_balance
+            bitcoin_balance = 0.0
+            in_position = False
+            exits[n_exits] = i
+            n_exits += 1
+        equity = balance + bitcoin_balance * close[i]
+        equity_curve[i] = equity
+        in_market[i] = in_position
+
+    state[PREVIOUS_BALANCE] = previous_balance
+    state[BALANCE] = balance
+    state[BITCOIN_BALANCE] = bitcoin_balance
+    state[IN_POSITION] = 1.0 if in_position else 0.0
+    state[BUSTED] = 1.0 if busted else 0.0
+    state[GAIN_COUNT] = gain_count
+    state[LOSS_COUNT] = loss_count
+    state[TOTAL_FEES] = total_fees
+    state[EQUITY] = equity
+    return (
+        entries[:n_entries],
+        exits[:n_exits],
+        balance_deltas[:n_exits],
+        equity_curve,
+        in_market,
+    )
+
+
+def backtest_kernel(
+    close,
+    entry,
+    exit,
+    initial_balance,
+    fee,
+    take_profit,
+    stop_loss=-np.inf,
+):
+    """Bar-by-bar long-only state machine of `Backtest_Simulator.backtest`.
+
+    `entry` and `exit` are the precomputed rule signals per bar; positions
+    are closed on an exit signal, once the marked value is `take_profit`
+    above the balance they were opened with, or once it has fallen to
+    `stop_loss` (a negative fraction) below it. Returns the final balance,
+    gain/loss counts, total fees, entry and exit bar indices, per-trade
+    returns, the per-bar equity curve and the in-market mask.
+    """
+    state = initial_state(float(initial_balance))
+    # The first bar only sets the starting equity
+    entries, exits, balance_deltas, equity_curve, in_market = backtest_resume(
+        loop_input(close),
+        loop_input(entry),
+        loop_input(exit),
+        fee,
+        take_profit,
+        stop_loss,
+        state,
+        1,
+    )
+    # A busted account reports a zero final balance, like the original loop
+    final_balance = 0.0
+    if not state[BUSTED] and len(close) > 0:
+        final_balance = state[EQUITY]
+    return (
+        final_balance,
+        int(state[GAIN_COUNT]),
+        int(state[LOSS_COUNT]),
+        state[TOTAL_FEES],
+        entries,
+        exits,
+        balance_deltas,
+        equity_curve,
+        in_market,
+    )
+
+
+@njit(cache=True, nogil=True)
+def ewm_mean(values, alpha, min_periods):
+    """pandas `ewm(alpha=alpha, min_periods=min_periods, adjust=False).mean()`.
+
+    Leading NaNs are skipped and interior NaNs decay the previous average
+    (pandas' default `ignore_na=False`).
+    """
+    n = len(values)
+    out = np.full(n, np.nan)
+    weighted = np.nan
+    old_weight = 1.0
+    n_obs = 0
+    for i in range(n):
+        value = values[i]
+        observed = value == value  # not NaN
+        if n_obs == 0:
+            if observed:
+                weighted = value
+                n_obs = 1
+        else:
+            old_weight *= 1.0 - alpha
+            if observed:
+                n_obs += 1
+                weighted = (old_weight * weighted + alpha * value) / (
+                    old_weight + alpha
+                )
+                old_weight = 1.0
+        if n_obs >= min_periods and n_obs > 0:
+            out[i] = weighted
+    return out
+
+
+def ema(values, window):
+    """`ta.trend.EMAIndicator(values, window).ema_indicator()`"""
+    values = np.asarray(values, dtype=np.float64)
+    return ewm_mean(loop_input(values), 2.0 / (window + 1), window)
+
+
+def double_ema(values, window):
+    first = ema(values, window)
+    return 2 * first - ema(first, window)
+
+
+def rsi(close, window=14):
+    """`ta.momentum.RSIIndicator(close, window).rsi()`"""
+    close = np.asarray(close, dtype=np.float64)
+    diff = np.diff(close, prepend=np.nan)
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    average_up = ewm_mean(loop_input(up), 1.0 / window, window)
+    average_down = ewm_mean(loop_input(down), 1.0 / window, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            average_down == 0,
+            100.0,
+            100 - 100 / (1 + average_up / average_down),
+        )
+
+
+def ppo(close, window_slow=26, window_fast=12):
+    """`ta.momentum.PercentagePriceOscillator(close).ppo()`"""
+    slow = ema(close, window_slow)
+    return (ema(close, window_fast) - slow) / slow * 100
+
+
+@njit(cache=True, nogil=True)
+def supertrend_direction(close, upper_band, lower_band):
+    """Trend direction (1 up, -1 down) of pandas_ta's supertrend from its
+    raw bands (hl2 +- multiplier * ATR). Price closing beyond the previous
+    bar's band flips the direction; otherwise the band on the trend's side
+    only tightens."""
+    n = len(close)
+    upper = upper_band.copy()
+    lower = lower_band.copy()
+    direction = np.ones(n)
+    for i in range(1, n):
+        if close[i] > upper[i - 1]:
+            direction[i] = 1.0
+        elif close[i] < lower[i - 1]:
+            direction[i] = -1.0
+        else:
+            direction[i] = direction[i - 1]
+            if direction[i] > 0 and lower[i] < lower[i - 1]:
+                lower[i] = lower[i - 1]
+            if direction[i] < 0 and upper[i] > upper[i - 1]:
+                upper[i] = upper[i - 1]
+    return direction
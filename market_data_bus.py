@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import importlib.util
+import os
+import queue
+import sys
+import time
+from multiprocessing import Process, Queue, shared_memory
+
+import numpy as np
+
+from tick_capture import EVENT_DTYPE, dispatch, read_capture
+
+# Header layout (int64 slots) at the start of the shared memory block. The
+# single writer owns WRITE_SEQ and CLOSED, reader `r` owns CURSORS + r.
+WRITE_SEQ = 0  # number of events ever published
+CLOSED = 1  # set once the writer will publish no more events
+CAPACITY = 2
+N_READERS = 3
+RESERVED = 4  # events the writer has started writing, >= WRITE_SEQ
+CURSORS = 8
+MAX_READERS = 56
+HEADER_BYTES = (CURSORS + MAX_READERS) * 8
+
+
+class MarketDataBus:
+    """Single-writer, multi-reader ring buffer of events in shared memory.
+
+    The ingest process decodes the feed once and publishes EVENT_DTYPE
+    records; every strategy process attaches a BusReader and consumes them
+    at its own pace through its own cursor. Nothing is locked: the writer
+    announces the slots it is about to overwrite (RESERVED), stores the
+    records and only then advances the write sequence; each reader only ever
+    writes its own cursor and discards anything reserved while it copied.
+    This relies on stores becoming visible in program order, as on x86.
+
+    A reader that falls more than `capacity` events behind loses the
+    overwritten events (counted in `BusReader.dropped`) unless the writer
+    publishes with `block=True`, which waits for the slowest attached reader
+    instead, as a replay should. A reader whose process died must be
+    detached (`detach_reader`), or a blocking writer would wait for it
+    forever.
+    """
+
+    def __init__(self, capacity=1 << 20, n_readers=1, name=None):
+        if not 0 < n_readers <= MAX_READERS:
+            raise ValueError(f"n_readers must be in 1..{MAX_READERS}")
+        self.capacity = capacity
+        self.n_readers = n_readers
+        self.shm = shared_memory.SharedMemory(
+            name=name,
+            create=True,
+            size=HEADER_BYTES + capacity * EVENT_DTYPE.itemsize,
+        )
+        self.header = np.ndarray(
+            CURSORS + MAX_READERS, dtype=np.int64, buffer=self.shm.buf
+        )
+        self.header[:] = 0
+        self.header[CAPACITY] = capacity
+        self.header[N_READERS] = n_readers
+        self.attached = np.ones(n_readers, dtype=bool)  # readers a blocking publish waits for
+        self.ring = np.ndarray(
+            capacity, dtype=EVENT_DTYPE, buffer=self.shm.buf,
+            offset=HEADER_BYTES,
+        )
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, events, block=False, on_wait=None):
+        """Append events; with `block`, never overwrite events an attached
+        reader has not consumed. While blocked, `on_wait()` is called before
+        every short sleep, e.g. to detach readers whose process died."""
+        events = np.asarray(events, dtype=EVENT_DTYPE)
+        done = 0
+        while done < len(events):
+            sequence = int(self.header[WRITE_SEQ])
+            room = self.capacity
+            if block and self.attached.any():
+                cursors = self.header[CURSORS:CURSORS + self.n_readers][self.attached]
+                room -= sequence - int(cursors.min())
+                if room <= 0:
+                    if on_wait is not None:
+                        on_wait()
+                    # A real sleep: spinning would take the CPU from the
+                    # readers being waited for
+                    time.sleep(0.0005)
+                    continue
+            count = min(room, len(events) - done)
+            position = sequence % self.capacity
+            self.header[RESERVED] = sequence + count
+            # Copy in at most two pieces around the end of the ring
+            first = min(count, self.capacity - position)
+            self.ring[position:position + first] = events[done:done + first]
+            self.ring[:count - first] = events[done + first:done + count]
+            # Publish only after the records are in place
+            self.header[WRITE_SEQ] = sequence + count
+            done += count
+
+    def detach_reader(self, reader_id):
+        """Stop waiting for reader `reader_id`, e.g. because its process died."""
+        self.attached[reader_id] = False
+
+    def lag(self):
+        """Events published but not yet consumed, per reader."""
+        return self.header[WRITE_SEQ] - self.header[CURSORS:CURSORS + self.n_readers]
+
+    def close(self):
+        """Tell readers the feed has ended; they exit once drained."""
+        self.header[CLOSED] = 1
+
+    def unlink(self):
+        del self.header, self.ring
+        self.shm.close()
+        self.shm.unlink()
+
+
+class BusReader:
+    """One consumer's view of a MarketDataBus, attached by name."""
+
+    def __init__(self, name, reader_id):
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray(
+            CURSORS + MAX_READERS, dtype=np.int64, buffer=self.shm.buf
+        )
+        if not 0 <= reader_id < self.header[N_READERS]:
+            raise ValueError(f"reader_id {reader_id} was not allocated")
+        self.capacity = int(self.header[CAPACITY])
+        self.ring = np.ndarray(
+            self.capacity, dtype=EVENT_DTYPE, buffer=self.shm.buf,
+            offset=HEADER_BYTES,
+        )
+        self.slot = CURSORS + reader_id
+        self.dropped = 0
+
+    @property
+    def lag(self):
+        return int(self.header[WRITE_SEQ] - self.header[self.slot])
+
+    @property
+    def finished(self):
+        """The writer has closed the bus and every event was consumed."""
+        return bool(self.header[CLOSED]) and self.lag == 0
+
+    def poll(self, max_events=4096):
+        """Copy out up to `max_events` new events (possibly none)."""
+        cursor = int(self.header[self.slot])
+        sequence = int(self.header[WRITE_SEQ])
+        if sequence - cursor > self.capacity:
+            self.dropped += sequence - cursor - self.capacity
+            cursor = sequence - self.capacity
+        count = min(sequence - cursor, max_events)
+        position = cursor % self.capacity
+        first = min(count, self.capacity - position)
+        events = np.concatenate(
+            [
+                self.ring[position:position + first],
+                self.ring[:count - first],
+            ]
+        )
+        # Events the writer overwrote while they were being copied are
+        # discarded, the rest are guaranteed intact
+        overwritten = int(self.header[RESERVED]) - self.capacity - cursor
+        if overwritten > 0:
+            self.dropped += min(overwritten, count)
+            events = events[overwritten:]
+        self.header[self.slot] = cursor + count
+        return events
+
+    def detach(self):
+        del self.header, self.ring
+        self.shm.close()
+
+
+def load_strategy_module(path, module_name=None):
+    """Import a strategy file by path (some, like ema-algorithm.py, are not
+    valid module names). Each distinct `module_name` is a fresh copy."""
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)  # for fill_ledger, ticker_state, ...
+    if module_name is None:
+        module_name = os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_strategy_worker(bus_name, reader_id, strategy_path, results=None, quiet=True):
+    """Strategy process: consume the bus until it is closed and drained."""
+    module = load_strategy_module(strategy_path)
+    strategy = module.Strategy()
+    reader = BusReader(bus_name, reader_id)
+    events_seen = 0
+    start = time.process_time()
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+            while not reader.finished:
+                events = reader.poll()
+                if not len(events):
+                    time.sleep(0.0005)
+                    continue
+                dispatch(strategy, module.Ticker, module.Side, events)
+                events_seen += len(events)
+    if results is not None:
+        results.put(
+            {
+                "strategy": os.path.basename(strategy_path),
+                "reader": reader_id,
+                "events": events_seen,
+                "dropped": reader.dropped,
+                "cpu_seconds": time.process_time() - start,
+            }
+        )
+    reader.detach()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a tick capture once into several strategy processes."
+    )
+    parser.add_argument("capture", help="tick capture file (see tick_capture.py)")
+    parser.add_argument("strategies", nargs="+", help="strategy files")
+    parser.add_argument("--capacity", type=int, default=1 << 20)
+    parser.add_argument("--batch", type=int, default=4096)
+    args = parser.parse_args()
+
+    events = read_capture(args.capture)
+    bus = MarketDataBus(args.capacity, len(args.strategies))
+    results = Queue()
+    workers = [
+        Process(
+            target=run_strategy_worker,
+            args=(bus.name, reader_id, path, results),
+        )
+        for reader_id, path in enumerate(args.strategies)
+    ]
+
+    def report_exit(reader_id):
+        name = os.path.basename(args.strategies[reader_id])
+        print(f"{name}: worker exited with code {workers[reader_id].exitcode}")
+
+    def detach_dead():
+        for reader_id, worker in enumerate(workers):
+            if bus.attached[reader_id] and worker.exitcode is not None:
+                bus.detach_reader(reader_id)
+                report_exit(reader_id)
+
+    try:
+        for worker in workers:
+            worker.start()
+        last_report = time.monotonic()
+        for start in range(0, len(events), args.batch):
+            bus.publish(events[start:start + args.batch], block=True, on_wait=detach_dead)
+            if time.monotonic() - last_report >= 1.0:
+                last_report = time.monotonic()
+                lags = ", ".join(
+                    f"{os.path.basename(path)}={lag}"
+                    for path, lag in zip(args.strategies, bus.lag())
+                )
+                published = min(start + args.batch, len(events))
+                print(f"published {published}/{len(events)}  lag: {lags}")
+        bus.close()
+        # A worker puts its result before it exits cleanly; one that failed
+        # (exit code != 0) never will
+        waiting = set(range(len(workers)))
+        while waiting:
+            try:
+                result = results.get(timeout=0.5)
+            except queue.Empty:
+                for reader_id in sorted(waiting):
+                    if workers[reader_id].exitcode not in (None, 0):
+                        waiting.discard(reader_id)
+                        if bus.attached[reader_id]:
+                            report_exit(reader_id)
+                continue
+            waiting.discard(result["reader"])
+            print(
+                f"{result['strategy']}: {result['events']} events, "
+                f"{result['dropped']} dropped, {result['cpu_seconds']:.2f}s CPU"
+            )
+        for worker in workers:
+            worker.join()
+    finally:
+        bus.close()
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        bus.unlink()
+
+
+if __name__ == "__main__":
+    main()
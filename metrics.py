@@ -0,0 +1,82 @@
+import numpy as np
+
+# Crypto markets trade around the clock
+MINUTES_PER_YEAR = 365 * 24 * 60
+
+
+def periods_per_year(minutes):
+    return MINUTES_PER_YEAR / minutes
+
+
+# Every metric reduces along the last axis, so a single equity curve of shape
+# (n_bars,) gives scalars and a stack of sweep results of shape
+# (n_runs, n_bars) gives one value per run, without a loop over runs.
+
+
+def bar_returns(equity):
+    """Simple per-bar returns; bars after the equity hit zero return 0."""
+    equity = np.asarray(equity, dtype=np.float64)
+    previous = equity[..., :-1]
+    return np.divide(
+        np.diff(equity, axis=-1),
+        previous,
+        out=np.zeros_like(previous),
+        where=previous > 0,
+    )
+
+
+def sharpe_ratio(equity, periods, risk_free=0.0):
+    returns = bar_returns(equity) - risk_free / periods
+    std = returns.std(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = returns.mean(axis=-1) / std * np.sqrt(periods)
+    return np.where(std > 0, ratio, 0.0)
+
+
+def sortino_ratio(equity, periods, risk_free=0.0):
+    returns = bar_returns(equity) - risk_free / periods
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2, axis=-1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = returns.mean(axis=-1) / downside * np.sqrt(periods)
+    return np.where(downside > 0, ratio, 0.0)
+
+
+def max_drawdown(equity):
+    """Deepest peak-to-trough loss (a fraction) and the longest time spent
+    below a previous peak (in bars)."""
+    equity = np.asarray(equity, dtype=np.float64)
+    peaks = np.maximum.accumulate(equity, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = np.where(peaks > 0, 1.0 - equity / peaks, 0.0)
+    # Index of the most recent peak at every bar; the distance to it is the
+    # length of the drawdown in progress
+    bars = np.broadcast_to(np.arange(equity.shape[-1]), equity.shape)
+    last_peak = np.maximum.accumulate(
+        np.where(equity >= peaks, bars, 0), axis=-1
+    )
+    return drawdowns.max(axis=-1), (bars - last_peak).max(axis=-1)
+
+
+def exposure(in_market):
+    """Fraction of bars spent holding a position."""
+    return np.asarray(in_market, dtype=np.float64).mean(axis=-1)
+
+
+def turnover(in_market, periods):
+    """Annualized number of times the full balance is traded. The backtest
+    is always all in or all out, so every entry or exit trades it once."""
+    in_market = np.asarray(in_market, dtype=np.float64)
+    switches = np.abs(np.diff(in_market, axis=-1)).sum(axis=-1)
+    return switches / max(in_market.shape[-1] - 1, 1) * periods
+
+
+def performance_summary(equity, in_market, periods):
+    drawdown, drawdown_duration = max_drawdown(equity)
+    return {
+        "sharpe": sharpe_ratio(equity, periods),
+        "sortino": sortino_ratio(equity, periods),
+        "max_drawdown": drawdown,
+        "max_drawdown_duration": drawdown_duration,
+        "exposure": exposure(in_market),
+        "turnover": turnover(in_market, periods),
+    }
@@ -0,0 +1,300 @@
+"""Hyperband parameter search for the Backtest_Simulator strategy.
+
+Instead of backtesting every point of a sweep grid on the full history,
+candidates are scored on a short prefix of the bars and only the best
+1 / eta of them are promoted to a prefix eta times longer, up to the full
+history (successive halving). Hyperband runs several such brackets that
+trade the number of candidates against the length of the shortest prefix.
+With a surrogate, later brackets draw half of their candidates from the
+grid points a quadratic model of the scores seen so far ranks best.
+
+    python optimizer.py job.json [--objective sharpe] [--workers 8]
+
+The job spec is the one backtest.py reads; its `sweep` lists define the grid
+searched. One JSON line per symbol reports the best strategy, its
+full-history score and the cost in backtested bars next to the full grid's.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import sys
+
+OBJECTIVES = ("sharpe", "sortino", "return")
+
+# Set in each worker process by _init_worker, so the bars are pickled once
+# per worker instead of once per task
+_WORKER = {}
+
+
+def _init_worker(data, initial_balance, fee, objective, periods):
+    _WORKER.update(
+        data=data,
+        initial_balance=initial_balance,
+        fee=fee,
+        objective=objective,
+        periods=periods,
+    )
+
+
+def _score(task):
+    """Objective of one strategy backtested on the first `bars` bars."""
+    from Backtest_Simulator import backtest
+    from metrics import sharpe_ratio, sortino_ratio
+
+    strategy, bars = task
+    result = backtest(
+        {name: values[:bars] for name, values in _WORKER["data"].items()},
+        _WORKER["initial_balance"],
+        _WORKER["fee"],
+        strategy,
+    )
+    objective = _WORKER["objective"]
+    if objective == "return":
+        score = result[1]
+    else:
+        ratio = sharpe_ratio if objective == "sharpe" else sortino_ratio
+        score = ratio(result[7][0], _WORKER["periods"])
+    score = float(score)
+    # Busted or flat runs rank last instead of poisoning the sort
+    return score if math.isfinite(score) else -math.inf
+
+
+def grid_points(sweep):
+    """The sweep grid as a list of {name: value} dicts."""
+    from backtest import expand_sweep
+
+    return expand_sweep({}, sweep)
+
+
+def rung_sizes(n_bars, eta, s, min_bars):
+    """Prefix lengths of a bracket with `s` promotions, shortest first."""
+    return [
+        max(min(n_bars, min_bars), n_bars // eta ** (s - k))
+        for k in range(s + 1)
+    ]
+
+
+def _quadratic_features(points, names, scale):
+    import numpy as np
+
+    x = np.array(
+        [[point[name] for name in names] for point in points],
+        dtype=np.float64,
+    )
+    x = (x - scale[0]) / scale[1]
+    columns = [np.ones(len(x))] + [x[:, j] for j in range(x.shape[1])]
+    for j in range(x.shape[1]):
+        for k in range(j, x.shape[1]):
+            columns.append(x[:, j] * x[:, k])
+    return np.stack(columns, axis=1)
+
+
+def surrogate_ranking(observed, candidates, names, ridge=1e-3):
+    """Candidates ordered by the score a quadratic ridge regression on the
+    `observed` (point, score) pairs predicts, best first; None while there
+    are too few finite observations to fit it."""
+    import numpy as np
+
+    observed = [(p, s) for p, s in observed if math.isfinite(s)]
+    everything = [p for p, _ in observed] + candidates
+    values = np.array(
+        [[p[name] for name in names] for p in everything], dtype=np.float64
+    )
+    spread = values.max(axis=0) - values.min(axis=0)
+    scale = (values.min(axis=0), np.where(spread > 0, spread, 1.0))
+    x = _quadratic_features([p for p, _ in observed], names, scale)
+    if len(observed) < x.shape[1] + 2:
+        return None
+    y = np.array([s for _, s in observed])
+    coefficients = np.linalg.solve(
+        x.T @ x + ridge * np.eye(x.shape[1]), x.T @ y
+    )
+    predicted = _quadratic_features(candidates, names, scale) @ coefficients
+    return [candidates[i] for i in np.argsort(-predicted, kind="stable")]
+
+
+def successive_halving(evaluate, strategy, points, sizes, eta):
+    """Score `points` on every prefix of `sizes`, keeping the best 1 / eta
+    after each one. Returns the (point, score, bars) evaluations made."""
+    history = []
+    for k, bars in enumerate(sizes):
+        scores = evaluate(
+            [({**strategy, **point}, bars) for point in points]
+        )
+        history.extend((p, s, bars) for p, s in zip(points, scores))
+        if k == len(sizes) - 1:
+            break
+        keep = max(1, len(points) // eta)
+        order = sorted(range(len(points)), key=lambda i: -scores[i])
+        points = [points[i] for i in order[:keep]]
+    return history
+
+
+def hyperband(
+    evaluate,
+    strategy,
+    sweep,
+    n_bars,
+    eta=3,
+    min_bars=500,
+    surrogate=True,
+    seed=0,
+):
+    """Search the sweep grid; returns (best point, its full-history score,
+    every (point, score, bars) evaluation)."""
+    import random
+
+    remaining = grid_points(sweep)
+    if not remaining:
+        raise ValueError("the sweep grid is empty")
+    if n_bars < min_bars:
+        raise ValueError(
+            f"{n_bars} bars is less than min_bars ({min_bars}); load more "
+            "history or lower min_bars"
+        )
+    rng = random.Random(seed)
+    rng.shuffle(remaining)
+    names = [
+        name
+        for name in sweep
+        if all(isinstance(v, (int, float)) for v in sweep[name])
+    ]
+    s_max = max(0, int(math.log(max(1, n_bars // min_bars), eta)))
+    history = []
+    for s in range(s_max, -1, -1):
+        n = math.ceil((s_max + 1) / (s + 1) * eta**s)
+        n = min(n, len(remaining))
+        if n == 0:
+            break
+        ranking = None
+        if surrogate and names:
+            # Fit on the longest prefix with enough scores to fit; scores on
+            # different prefixes are not comparable
+            lengths = sorted({bars for _, _, bars in history}, reverse=True)
+            for length in lengths:
+                ranking = surrogate_ranking(
+                    [(p, sc) for p, sc, bars in history if bars == length],
+                    remaining,
+                    names,
+                )
+                if ranking is not None:
+                    break
+        if ranking is not None:
+            chosen = ranking[: n // 2]
+            taken = {id(p) for p in chosen}
+            rest = [p for p in remaining if id(p) not in taken]
+            chosen += rest[: n - len(chosen)]
+        else:
+            chosen = remaining[:n]
+        taken = {id(p) for p in chosen}
+        remaining = [p for p in remaining if id(p) not in taken]
+        sizes = rung_sizes(n_bars, eta, s, min_bars)
+        history += successive_halving(evaluate, strategy, chosen, sizes, eta)
+
+    full = [(p, sc) for p, sc, bars in history if bars == n_bars]
+    best, score = max(full, key=lambda item: item[1])
+    return best, score, history
+
+
+def optimize(
+    data,
+    strategy,
+    sweep,
+    initial_balance=10000,
+    fee=0.001,
+    periods=35040,
+    objective="sharpe",
+    workers=None,
+    **options,
+):
+    """Run `hyperband` on one symbol's bars (as `backtest.load_bars`
+    returns them) with a pool of `workers` processes (1 runs in this
+    process). Returns a result dict."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}")
+    workers = workers or os.cpu_count() or 1
+    setup = (data, initial_balance, fee, objective, periods)
+    pool = None
+    if workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=setup
+        )
+    else:
+        _init_worker(*setup)
+
+    def evaluate(tasks):
+        if pool is None:
+            return [_score(task) for task in tasks]
+        chunksize = max(1, len(tasks) // (4 * workers))
+        return list(pool.map(_score, tasks, chunksize=chunksize))
+
+    try:
+        best, score, history = hyperband(
+            evaluate, strategy, sweep, len(data["close"]), **options
+        )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    grid_size = len(grid_points(sweep))
+    return {
+        "strategy": {**strategy, **best},
+        "objective": objective,
+        "score": score,
+        "evaluations": len(history),
+        "bars_evaluated": sum(bars for _, _, bars in history),
+        "grid_bars": grid_size * len(data["close"]),
+        "grid_size": grid_size,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Hyperband search over a backtest.py job's sweep grid."
+    )
+    parser.add_argument("job", help='job spec file, "-" for stdin')
+    parser.add_argument("--objective", choices=OBJECTIVES, default="sharpe")
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument(
+        "--min-bars", type=int, default=500, help="shortest prefix scored"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-surrogate",
+        dest="surrogate",
+        action="store_false",
+        help="draw every bracket's candidates at random",
+    )
+    args = parser.parse_args(argv)
+
+    from backtest import load_bars, load_job
+    from metrics import periods_per_year
+    from resample import TIMEFRAME_MINUTES
+
+    job = load_job(args.job)
+    if not job["sweep"]:
+        parser.error("the job spec has no sweep to search")
+    for symbol in job["symbols"]:
+        result = optimize(
+            load_bars(job, symbol),
+            job["strategy"],
+            job["sweep"],
+            job["initial_balance"],
+            job["fee"],
+            periods_per_year(TIMEFRAME_MINUTES[job["timeframe"]]),
+            args.objective,
+            args.workers,
+            eta=args.eta,
+            min_bars=args.min_bars,
+            surrogate=args.surrogate,
+            seed=args.seed,
+        )
+        sys.stdout.write(json.dumps({"symbol": symbol, **result}) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+from enum import Enum
+from typing import Callable, Dict, Optional, Tuple
+
+
+class OrderState(Enum):
+    OPEN = 0
+    PARTIALLY_FILLED = 1
+    FILLED = 2
+    CANCELLED = 3
+
+
+TERMINAL_STATES = (OrderState.FILLED, OrderState.CANCELLED)
+
+
+class ManagedOrder:
+    """A single limit order tracked by the OrderManager."""
+
+    __slots__ = ("order_id", "ticker", "side", "quantity", "filled", "price", "ioc", "state")
+
+    def __init__(self, order_id: int, ticker, side, quantity: float, price: float, ioc: bool) -> None:
+        self.order_id = order_id
+        self.ticker = ticker
+        self.side = side
+        self.quantity = quantity
+        self.filled = 0.0
+        self.price = price
+        self.ioc = ioc
+        self.state = OrderState.OPEN
+
+    @property
+    def remaining(self) -> float:
+        return self.quantity - self.filled
+
+
+class OrderManager:
+    """Tracks live limit orders and only sends cancels/replaces when needed.
+
+    Orders are indexed by id (O(1) lookup) and by (ticker, side) for the one
+    working quote a strategy keeps per side. `quote` leaves the working order
+    alone while its price is within `price_tolerance` (relative) of the new
+    target and its size within `quantity_tolerance`; otherwise it cancels and
+    replaces it. Orders reaching a terminal state are evicted immediately, so
+    the id index only ever holds live orders.
+
+    The exchange functions are injected because every strategy file defines
+    its own `place_limit_order`/`cancel_order` stubs. With a `risk` engine
+    (risk_engine.RiskEngine) every order is checked, and resized or dropped,
+    before it is sent, and the engine follows orders, fills and cancels.
+    """
+
+    def __init__(
+        self,
+        place_limit_order: Callable,
+        cancel_order: Callable,
+        price_tolerance: float = 0.0005,
+        quantity_tolerance: float = 0.1,
+        risk=None,
+    ) -> None:
+        self._place_limit_order = place_limit_order
+        self._cancel_order = cancel_order
+        self.price_tolerance = price_tolerance
+        self.quantity_tolerance = quantity_tolerance
+        self.risk = risk
+        self.orders: Dict[int, ManagedOrder] = {}
+        self.working: Dict[Tuple, int] = {}  # (ticker, side) -> order id
+        self.orders_sent: int = 0
+        self.cancels_sent: int = 0
+        self.quotes_kept: int = 0
+
+    def get(self, order_id: int) -> Optional[ManagedOrder]:
+        return self.orders.get(order_id)
+
+    def working_order(self, ticker, side) -> Optional[ManagedOrder]:
+        order_id = self.working.get((ticker, side))
+        return self.orders.get(order_id) if order_id is not None else None
+
+    def place(self, side, ticker, quantity: float, price: float, ioc: bool = False) -> Optional[int]:
+        """Send a new limit order and start tracking it. Returns None on failure
+        or when the risk engine rejects it."""
+        if self.risk is not None:
+            quantity = self.risk.check(side, ticker, quantity, price)
+            if quantity <= 0:
+                return None
+        return self._send(side, ticker, quantity, price, ioc)
+
+    def _send(self, side, ticker, quantity: float, price: float, ioc: bool = False) -> Optional[int]:
+        # Registered before sending, so a fill reported during the call
+        # finds the order's notional to release
+        if self.risk is not None:
+            self.risk.on_order(side, ticker, quantity, price)
+        order_id = self._place_limit_order(side, ticker, quantity, price, ioc)
+        self.orders_sent += 1
+        if not order_id:
+            if self.risk is not None:
+                self.risk.on_cancel(side, ticker, quantity, price)
+            return None
+        self.orders[order_id] = ManagedOrder(order_id, ticker, side, quantity, price, ioc)
+        return order_id
+
+    def quote(self, side, ticker, quantity: float, price: float) -> Optional[int]:
+        """Keep one resting order per (ticker, side) at roughly `price`.
+
+        Amends in place (keeps the existing order) when the target moved less
+        than the tolerances, otherwise cancels and replaces. The risk engine
+        resizes the target first, counting the working order's notional as
+        free, so a capped quote is kept rather than replaced on every call.
+        """
+        order = self.working_order(ticker, side)
+        if self.risk is not None:
+            replaces = order.remaining * order.price if order is not None else 0.0
+            quantity = self.risk.check(side, ticker, quantity, price, replaces)
+            if quantity <= 0:
+                self.cancel_quote(ticker, side)
+                return None
+        if order is not None:
+            price_moved = abs(price - order.price) > self.price_tolerance * order.price
+            size_moved = abs(quantity - order.remaining) > self.quantity_tolerance * order.remaining
+            if not price_moved and not size_moved:
+                self.quotes_kept += 1
+                return order.order_id
+            if not self.cancel(order.order_id):
+                return order.order_id
+        order_id = self._send(side, ticker, quantity, price)
+        if order_id is not None:
+            self.working[(ticker, side)] = order_id
+        return order_id
+
+    def cancel_quote(self, ticker, side) -> None:
+        """Pull the working order for (ticker, side), if any."""
+        order_id = self.working.get((ticker, side))
+        if order_id is not None:
+            self.cancel(order_id)
+
+    def cancel(self, order_id: int) -> bool:
+        order = self.orders.get(order_id)
+        if order is None:
+            return False
+        self.cancels_sent += 1
+        if not self._cancel_order(order.ticker, order_id):
+            return False
+        # The competition API confirms cancels synchronously
+        self._finish(order, OrderState.CANCELLED)
+        return True
+
+    def on_fill(self, ticker, side, price: float, quantity: float) -> Optional[ManagedOrder]:
+        """Apply a fill from `on_account_update` to the matching order.
+
+        Account updates do not carry an order id, so the fill is attributed to
+        the working order on that side, falling back to the oldest live order
+        with the same ticker and side.
+        """
+        if self.risk is not None:
+            self.risk.on_fill(ticker, side, price, quantity)
+        order = self.working_order(ticker, side)
+        if order is None:
+            order = next(
+                (o for o in self.orders.values() if o.ticker == ticker and o.side == side),
+                None,
+            )
+        if order is None:
+            return None
+        order.filled += quantity
+        if order.remaining <= 1e-12:
+            self._finish(order, OrderState.FILLED)
+        else:
+            order.state = OrderState.PARTIALLY_FILLED
+        return order
+
+    def expire_ioc(self) -> None:
+        """Drop IOC orders: any unfilled remainder was cancelled by the exchange."""
+        for order in [o for o in self.orders.values() if o.ioc]:
+            self._finish(order, OrderState.CANCELLED)
+
+    def _finish(self, order: ManagedOrder, state: OrderState) -> None:
+        """Move an order to a terminal state and evict it."""
+        order.state = state
+        del self.orders[order.order_id]
+        if self.risk is not None and state == OrderState.CANCELLED:
+            self.risk.on_cancel(order.side, order.ticker, order.remaining, order.price)
+        key = (order.ticker, order.side)
+        if self.working.get(key) == order.order_id:
+            del self.working[key]
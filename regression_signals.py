@@ -0,0 +1,375 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+# Parameters of the two strategy files, as their __init__ sets them
+ROLLING_REGRESSION = {
+    "window_size": 20,
+    "entry_threshold": 0.002,
+    "exit_threshold": -0.002,
+    "normalize": True,  # slope / window mean
+    "rsi_gate": True,  # long needs RSI < 70, short needs RSI > 30
+    "rsi_period": 14,  # also the ATR period
+    "stop_loss_multiplier": 1.5,  # ATR-based exits, None to disable
+    "take_profit_multiplier": 2.0,
+    "shorts": True,
+    "cooldown": 2.0,  # seconds between orders
+    "max_orders_per_minute": 30,
+    "ticker_row": 0,  # Ticker.value of the traded ticker, its TickerState row
+    "ticker_rows": 3,  # len(Ticker)
+}
+BTC_ONLY_ROLLING_REGRESSION = {
+    "window_size": 10,
+    "entry_threshold": 0.0,
+    "exit_threshold": -0.001,
+    "normalize": False,
+    "rsi_gate": False,
+    "rsi_period": 14,
+    "stop_loss_multiplier": None,
+    "take_profit_multiplier": None,
+    "shorts": False,
+    "cooldown": 0.0,
+    "max_orders_per_minute": 30,
+    "ticker_row": 1,
+    "ticker_rows": 3,
+}
+
+# Order reasons
+ENTRY = 0
+SIGNAL_EXIT = 1  # slope crossed the opposite threshold
+STOP_EXIT = 2  # ATR stop-loss or take-profit
+
+ORDER_DTYPE = np.dtype([("index", np.int64), ("side", np.int8), ("reason", np.int8), ("price", np.float64)])
+
+
+# Rounding allowed per addition inside a window, relative to the largest
+# prefix sum or price involved. A window difference of a prefix sum is off
+# only by the roundings inside the window, each at most eps of that
+# magnitude; the factor 8 covers the few further operations behind each
+# value. Values closer than this to a threshold are recomputed the way
+# TickerState computes them.
+TOLERANCE = 8 * np.finfo(np.float64).eps
+
+
+def _slopes(prices, w, normalize, start, slope, scratch):
+    """Fill the slopes of positions `start:` of one run of prices.
+
+    Everything comes from two prefix sums. With q the prices minus the
+    first one, A the prefix sums of q and B the prefix sums of A, the
+    window [s, t] has sum(q) = A[t+1] - A[s] and centered x-weighted sum
+    h (A[t+1] + A[s]) - B[t+1] + B[s+1] with h = (w - 1) / 2, which is the
+    regression numerator without a convolution. Positions without `w`
+    prices are NaN. `scratch` holds arrays from `_scratch`, reused from
+    block to block.
+
+    Returns how far (see `TOLERANCE`) the slopes may be from `TickerState`.
+    """
+    n = len(prices)
+    first = min(max(start, w - 1), n)
+    slope[:first - start] = np.nan
+    if first == n:
+        return 0.0
+    a, b = scratch[0][:n + 1], scratch[1][:n + 1]
+    p0 = prices[0]
+    p_high, p_low = prices.max(), prices.min()
+    # Prefix sums with a leading 0, so window [s, t] sums to A[t+1] - A[s]
+    a[0] = b[0] = 0.0
+    np.subtract(prices, p0, out=a[1:])
+    np.cumsum(a[1:], out=a[1:])
+    np.cumsum(a[:n], out=b[1:])
+    ends, starts = a[first + 1:], a[first + 1 - w:n + 1 - w]
+    xx = w * (w * w - 1) / 12.0  # sum of squared centered x
+    numerator = slope[first - start:]
+    np.add(ends, starts, out=numerator)
+    numerator *= (w - 1) / 2.0
+    numerator -= b[first + 1:]
+    numerator += b[first + 2 - w:n + 2 - w]
+    # |A| and |B| are at most n and n^2 / 2 times the largest |q|
+    a_max = n * max(p_high - p0, p0 - p_low)
+    tol = TOLERANCE * w * (a_max * (n + 1) / 2 + w * (a_max + max(p_high, -p_low))) / xx
+    if not normalize:
+        numerator *= 1.0 / xx
+        return tol
+    # Window sums of the prices; times xx / w this is xx * mean
+    denominator = np.subtract(ends, starts, out=scratch[2][:n - first])
+    denominator += w * p0
+    denominator *= xx / w
+    with np.errstate(divide="ignore", invalid="ignore"):
+        numerator /= denominator
+    # Means of positive prices are at least the lowest price
+    return tol / (p_low if p_low > 0 else np.abs(denominator).min() / xx)
+
+
+def _scratch(size: int):
+    """Work arrays for `_slopes` on up to `size` prices. Allocating them
+    once matters: fresh arrays this large are mapped from the OS and page
+    faulted in on every block."""
+    return np.empty(size + 1), np.empty(size + 1), np.empty(size)
+
+
+def _atr(prices: np.ndarray, lo: int, hi: int, period: int):
+    """`TickerState.atr` at positions [lo, hi), NaN before `period` price
+    changes, and the sum of absolute changes its rounding scales with.
+
+    A window of the prefix sums G of the absolute price changes is the
+    gains plus the losses, period times the ATR.
+    """
+    base = max(lo - period, 0)
+    moved = np.zeros(hi - base)
+    np.abs(np.diff(prices[base:hi]), out=moved[1:])
+    np.cumsum(moved, out=moved)
+    atr = np.full(hi - lo, np.nan)
+    first = max(lo, period)
+    if first < hi:
+        out = atr[first - lo:]
+        np.subtract(moved[first - base:], moved[first - base - period:hi - base - period], out=out)
+        out /= period
+    return atr, moved[-1]
+
+
+def _rsi(prices: np.ndarray, index: np.ndarray, atr: np.ndarray, period: int) -> np.ndarray:
+    """RSI of the windows ending at `index`, from their ATR `atr`.
+
+    100 - 100 / (1 + gains / losses) is 100 gains / moved, with moved =
+    period * ATR the gains plus the losses and gains = (moved + net) / 2.
+    Where nothing moved TickerState returns 100; where the ATR is NaN so is
+    the RSI.
+    """
+    moved = atr * period
+    net = prices[index] - prices[np.maximum(index - period, 0)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 50.0 * (net + moved) / moved
+    return np.where(moved == 0, 100.0, rsi)
+
+
+def _exact_slopes(prices: np.ndarray, index: np.ndarray, w: int, normalize: bool, row: int = 0, rows: int = 1) -> np.ndarray:
+    """`TickerState.regression_slopes` of the windows ending at `index`, for
+    the ticker in row `row` of a state with `rows` rows.
+
+    TickerState multiplies all its rows by x at once, and BLAS rounds a
+    row's product differently depending on the number of rows and the
+    row's place among them, so each window goes through the same shape.
+    """
+    y = prices[index[:, None] - (w - 1) + np.arange(w)]
+    x = np.arange(w) - (w - 1) / 2.0
+    state = np.zeros((len(index), rows, w))
+    state[:, row] = y
+    slopes = (state @ x)[:, row] / (x @ x)
+    if normalize:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slopes = slopes / y.mean(axis=1)
+    return slopes
+
+
+def _exact_rsi(prices: np.ndarray, index: np.ndarray, period: int) -> np.ndarray:
+    """`TickerState.rsi` of the windows ending at `index`."""
+    deltas = np.diff(prices[index[:, None] - period + np.arange(period + 1)], axis=1)
+    avg_gain = np.where(deltas > 0, deltas, 0).mean(axis=1)
+    avg_loss = np.where(deltas < 0, -deltas, 0).mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    return np.where(avg_loss == 0, 100.0, rsi)
+
+
+def _crossings(values: np.ndarray, threshold: float, tol, exact, above: bool = True) -> np.ndarray:
+    """Sorted indices of `values` above (or below) `threshold`, as the live
+    strategy would decide it: values within `tol` (a scalar or one bound
+    per value) of the threshold are replaced by `exact(index)` and
+    compared again."""
+    index = np.flatnonzero(values > threshold - tol if above else values < threshold + tol)
+    if not len(index):
+        return index
+    candidates = values[index]
+    band = tol[index] if np.ndim(tol) else tol
+    unsure = np.flatnonzero(np.abs(candidates - threshold) <= band)
+    if len(unsure):
+        candidates[unsure] = values[index[unsure]] = exact(index[unsure])
+    return index[candidates > threshold if above else candidates < threshold]
+
+
+def rolling_slopes(prices: np.ndarray, w: int, normalize: bool = True) -> np.ndarray:
+    """`TickerState.regression_slopes` at every position, NaN until `w` prices."""
+    prices = np.asarray(prices, dtype=np.float64)
+    slope = np.empty(len(prices))
+    for _ in iter_slope_blocks(prices, slope, w, normalize):
+        pass
+    return slope
+
+
+def rolling_rsi_atr(prices: np.ndarray, period: int = 14):
+    """`TickerState.rsi` and `TickerState.atr` at every position."""
+    prices = np.asarray(prices, dtype=np.float64)
+    atr = _atr(prices, 0, len(prices), period)[0]
+    return _rsi(prices, np.arange(len(prices)), atr, period), atr
+
+
+def iter_slope_blocks(
+    prices: np.ndarray,
+    slope: np.ndarray,
+    w: int,
+    normalize: bool = True,
+    block: int = 1 << 15,
+):
+    """Fill `slope` for float64 `prices` block by block.
+
+    Yields (lo, hi, tol) once positions [lo, hi) are filled; `tol` bounds
+    that block's rounding error (see `_slopes`). Each block, plus the few
+    prices before it that its first windows need, stays in L2 cache
+    through every pass. That is several times faster than streaming whole
+    arrays through memory once per pass, and fastest at about 32k prices.
+    """
+    scratch = _scratch(min(len(prices), block + w - 1))
+    for lo in range(0, len(prices), block):
+        hi = min(len(prices), lo + block)
+        base = max(0, lo - (w - 1))
+        tol = _slopes(prices[base:hi], w, normalize, lo - base, slope[lo:hi], scratch)
+        yield lo, hi, tol
+
+
+def rolling_features(prices: np.ndarray, w: int, normalize: bool = True, period: int = 14):
+    """Slopes, RSI and ATR for every position.
+
+    Values agree with `TickerState` to rounding; `regression_signals`
+    recomputes the few that are close enough to a threshold to matter.
+    """
+    return (rolling_slopes(prices, w, normalize),) + rolling_rsi_atr(prices, period)
+
+
+def _first_hit(condition, start: int, stop: int, chunk: int = 256) -> int:
+    """First index in [start, stop) where `condition(lo, hi)` is True, else
+    `stop`. Scans growing chunks so a short holding period costs little."""
+    while start < stop:
+        end = min(stop, start + chunk)
+        hits = np.flatnonzero(condition(start, end))
+        if len(hits):
+            return start + int(hits[0])
+        start = end
+        chunk *= 2
+    return stop
+
+
+def regression_signals(
+    prices: np.ndarray,
+    timestamps: Optional[np.ndarray] = None,
+    params: Optional[Dict] = None,
+) -> Dict[str, np.ndarray]:
+    """Orders the rolling-regression strategies would send on `prices`.
+
+    `prices` are the prices pushed into the strategy's state in order (one
+    evaluation after each); `timestamps` in seconds enable the cooldown and
+    rate limit. Slopes are computed for every position block by block, RSI
+    and ATR only where a rule needs them, and the entry and exit rules
+    become sorted arrays of the positions where they fire; the few values
+    too close to a threshold for the fast sums to decide are recomputed
+    the way TickerState does. Only the position state machine is
+    sequential, and it jumps straight from one order to the next. Orders
+    are assumed filled at the evaluated price before the next evaluation.
+    `params` may set `ticker_row` to the Ticker.value traded, which decides
+    the last bits of TickerState's slopes (see `_exact_slopes`).
+    """
+    params = {**ROLLING_REGRESSION, **(params or {})}
+    prices = np.asarray(prices, dtype=np.float64)
+    n = len(prices)
+    w = params["window_size"]
+    period = params["rsi_period"]
+    slope = np.empty(n)
+    # Positions where each rule fires, collected block by block (slope and
+    # RSI are NaN until enough prices, which compares False)
+    long_entries, entries, long_exits, short_exits = [], [], [], []
+    for lo, hi, slope_tol in iter_slope_blocks(prices, slope, w, params["normalize"]):
+        block_slope = slope[lo:hi]
+
+        def exact_slopes(index):
+            return _exact_slopes(prices, index + lo, w, params["normalize"], params["ticker_row"], params["ticker_rows"])
+
+        rising = _crossings(block_slope, params["entry_threshold"], slope_tol, exact_slopes) + lo
+        falling = _crossings(block_slope, params["exit_threshold"], slope_tol, exact_slopes, above=False) + lo
+        long_entry = rising
+        short_entry = falling if params["shorts"] else falling[:0]
+        if params["rsi_gate"] and len(long_entry) + len(short_entry):
+            # The RSI is only needed where the slope rule fires, and comes
+            # from the block's ATR; it is off by at most 100 times the
+            # relative error of the ATR
+            block_atr, moved = _atr(prices, lo, hi, period)
+            rsi_tol = TOLERANCE * 100 * (moved + np.abs(prices[max(lo - period, 0):hi]).max())
+
+            def rsi_gate(index, threshold, above):
+                atr = block_atr[index - lo]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    tol = rsi_tol / atr
+                rsi = _rsi(prices, index, atr, period)
+                return index[_crossings(rsi, threshold, tol, lambda k: _exact_rsi(prices, index[k], period), above)]
+
+            long_entry = rsi_gate(long_entry, 70, False)
+            short_entry = rsi_gate(short_entry, 30, True)
+        entry = np.union1d(long_entry, short_entry) if len(short_entry) else long_entry
+        long_entries.append(long_entry)
+        entries.append(entry)
+        # A long exits when the slope falls, a short when it rises
+        long_exits.append(falling)
+        short_exits.append(rising)
+    long_entry_index = np.concatenate(long_entries) if long_entries else np.empty(0, np.int64)
+    entry_index = np.concatenate(entries) if entries else np.empty(0, np.int64)
+    long_exit_index = np.concatenate(long_exits) if long_exits else np.empty(0, np.int64)
+    short_exit_index = np.concatenate(short_exits) if short_exits else np.empty(0, np.int64)
+    atr_exits = params["stop_loss_multiplier"] is not None
+    if atr_exits:
+        stop_multiplier = params["stop_loss_multiplier"]
+        profit_multiplier = params["take_profit_multiplier"]
+
+    def next_index(candidates, start):
+        k = np.searchsorted(candidates, start)
+        return int(candidates[k]) if k < len(candidates) else n
+
+    orders = []
+    order_times = []
+    position = 0  # +1 long, -1 short
+    entry_price = 0.0
+    i = 0
+    while i < n:
+        # Earliest evaluation the cooldown and rate limit let through
+        if timestamps is not None and order_times:
+            allowed = order_times[-1] + params["cooldown"]
+            limit = params["max_orders_per_minute"]
+            if len(order_times) >= limit:
+                allowed = max(allowed, order_times[-limit] + 60)
+            i = max(i, int(np.searchsorted(timestamps, allowed, side="left")))
+            if i >= n:
+                break
+
+        if position == 0:
+            j = next_index(entry_index, i)
+            if j >= n:
+                break
+            k = np.searchsorted(long_entry_index, j)
+            position = 1 if k < len(long_entry_index) and long_entry_index[k] == j else -1
+            entry_price = prices[j]
+            orders.append((j, position, ENTRY, prices[j]))
+        else:
+            signal_exits = long_exit_index if position > 0 else short_exit_index
+            j = signal_j = next_index(signal_exits, i)
+            if atr_exits:
+                e, sign = entry_price, position
+
+                def stopped(lo, hi):
+                    change = (prices[lo:hi] - e) / e * sign
+                    atr = _atr(prices, lo, hi, period)[0]
+                    return (change <= -atr * stop_multiplier) | (change >= atr * profit_multiplier)
+
+                j = _first_hit(stopped, i, signal_j)
+            if j >= n:
+                break
+            reason = SIGNAL_EXIT
+            if atr_exits and (j < signal_j or stopped(j, j + 1)[0]):
+                reason = STOP_EXIT
+            orders.append((j, -position, reason, prices[j]))
+            position = 0
+        if timestamps is not None:
+            order_times.append(float(timestamps[j]))
+        i = j + 1
+
+    orders = np.array(orders, dtype=ORDER_DTYPE)
+    # Position held after each evaluation: constant between orders
+    levels = np.concatenate(([0], np.cumsum(orders["side"]))).astype(np.int8)
+    holding = np.repeat(levels, np.diff(np.concatenate(([0], orders["index"], [n]))))
+    return {"slope": slope, "orders": orders, "position": holding}
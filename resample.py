@@ -0,0 +1,143 @@
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+# pandas is imported where it is used, so headless runs on NumPy columns
+# (see backtest.py) start without it
+if TYPE_CHECKING:
+    import pandas as pd
+
+TIMEFRAME_MINUTES = {"5m": 5, "15m": 15, "1h": 60, "4h": 240, "1d": 1440}
+OHLCV_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+def _aggregate(timestamps, columns, minutes):
+    """Bucket starts and the OHLCV `columns` (any of them) of sorted
+    nanosecond `timestamps`, aggregated into `minutes`-wide, epoch-aligned
+    buckets.
+
+    Buckets are found from the integer timestamps in one pass and every
+    column is reduced with `ufunc.reduceat`, so there is no groupby.
+    """
+    width = minutes * 60 * 1_000_000_000
+    buckets = timestamps - timestamps % width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    reducers = {
+        "open": lambda values: values[starts],
+        "high": lambda values: np.maximum.reduceat(values, starts),
+        "low": lambda values: np.minimum.reduceat(values, starts),
+        "close": lambda values: values[ends],
+        "volume": lambda values: np.add.reduceat(values, starts),
+    }
+    return buckets[starts], {
+        column: reduce(np.asarray(columns[column]))
+        for column, reduce in reducers.items()
+        if column in columns
+    }
+
+
+def resample_ohlcv(bars: "pd.DataFrame", minutes: int) -> "pd.DataFrame":
+    """Aggregate sorted OHLCV bars into `minutes`-wide, epoch-aligned bars."""
+    import pandas as pd
+
+    if not len(bars):
+        return bars.loc[:, OHLCV_COLUMNS].copy()
+    timestamps = pd.DatetimeIndex(bars["timestamp"]).as_unit("ns").asi8
+    starts, columns = _aggregate(timestamps, bars, minutes)
+    return pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(starts, unit="ns").as_unit("ns"),
+            **columns,
+        }
+    )
+
+
+def resample_columns(bars: dict, minutes: int) -> dict:
+    """`resample_ohlcv` for bars held as a dict of NumPy arrays: datetime64[ns]
+    timestamps and any of the other OHLCV columns."""
+    if not len(bars["timestamp"]):
+        return {column: values[:0] for column, values in bars.items()}
+    starts, columns = _aggregate(
+        bars["timestamp"].view(np.int64), bars, minutes
+    )
+    return {"timestamp": starts.view("datetime64[ns]"), **columns}
+
+
+class BarResampler:
+    """Derives every coarser timeframe from one cached base resolution.
+
+    Base bars are appended as they arrive (a repeated timestamp replaces the
+    still-forming bar). Each derived timeframe is cached and, on append, only
+    its buckets from the first changed base bar onwards are re-aggregated.
+    """
+
+    def __init__(self, base_timeframe: str = "5m") -> None:
+        import pandas as pd
+
+        self.base_timeframe = base_timeframe
+        self.base = pd.DataFrame(
+            {
+                "timestamp": pd.DatetimeIndex([]).as_unit("ns"),
+                **{
+                    column: pd.Series([], dtype=np.float64)
+                    for column in OHLCV_COLUMNS[1:]
+                },
+            }
+        )
+        self.frames = {}  # timeframe -> resampled DataFrame
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def first_timestamp(self):
+        return self.base["timestamp"].iloc[0] if len(self.base) else None
+
+    def last_timestamp(self):
+        return self.base["timestamp"].iloc[-1] if len(self.base) else None
+
+    def append(self, bars: "pd.DataFrame") -> None:
+        """Add base bars and bring the cached timeframes up to date."""
+        import pandas as pd
+
+        if not len(bars):
+            return
+        bars = bars.loc[:, OHLCV_COLUMNS].copy()
+        bars["timestamp"] = pd.DatetimeIndex(bars["timestamp"]).as_unit("ns")
+        bars = bars.sort_values("timestamp").drop_duplicates(
+            "timestamp", keep="last"
+        )
+        first_new = bars["timestamp"].iloc[0]
+        keep = self.base["timestamp"] < first_new
+        self.base = pd.concat(
+            [self.base[keep], bars] if keep.any() else [bars],
+            ignore_index=True,
+        )
+        for timeframe, frame in self.frames.items():
+            self.frames[timeframe] = self._update(timeframe, frame, first_new)
+
+    def get(self, timeframe: str) -> "pd.DataFrame":
+        """Bars for `timeframe`, aggregated locally from the base bars."""
+        if timeframe == self.base_timeframe:
+            return self.base
+        if timeframe not in self.frames:
+            self.frames[timeframe] = resample_ohlcv(
+                self.base, TIMEFRAME_MINUTES[timeframe]
+            )
+        return self.frames[timeframe]
+
+    def _update(self, timeframe, frame, first_new) -> "pd.DataFrame":
+        import pandas as pd
+
+        # Only the bucket holding the first new base bar and everything after
+        # it can change; earlier aggregated bars are final
+        bucket = first_new.floor(f"{TIMEFRAME_MINUTES[timeframe]}min")
+        tail = resample_ohlcv(
+            self.base[self.base["timestamp"] >= bucket],
+            TIMEFRAME_MINUTES[timeframe],
+        )
+        return pd.concat(
+            [frame[frame["timestamp"] < bucket], tail], ignore_index=True
+        )
@@ -0,0 +1,284 @@
+"""SQLite store of backtest results, deduplicated by a canonical run key.
+
+A run is identified by the SHA-256 of its symbol, timeframe, bar range,
+a digest of the bar values, balance, fee and strategy dict, serialized
+canonically (sorted keys, every number as a float), so the same run always
+maps to the same row however its job spec was written, while revised bars
+over the same range do not. Metrics are real columns with indexes for the
+usual filters; strategy parameters are JSON and can be filtered with
+json_extract.
+
+    python result_store.py results.db --symbol BTC/USDT --min sharpe=1 \\
+        --param take_profit=0.015 --order-by sharpe --limit 20
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+
+# Bump when a change to the simulator makes stored results stale
+KEY_VERSION = 2
+
+METRICS = (
+    "final_balance",
+    "percentage_return",
+    "gains",
+    "losses",
+    "total_fees",
+    "average_trade_return",
+    "sharpe",
+    "sortino",
+    "max_drawdown",
+    "max_drawdown_duration",
+    "exposure",
+    "turnover",
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    bars INTEGER NOT NULL,
+    initial_balance REAL NOT NULL,
+    fee REAL NOT NULL,
+    strategy TEXT NOT NULL,
+    {", ".join(f"{name} REAL" for name in METRICS)}
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_market
+    ON runs (symbol, timeframe, start, end);
+CREATE INDEX IF NOT EXISTS runs_sharpe ON runs (symbol, timeframe, sharpe);
+CREATE INDEX IF NOT EXISTS runs_return
+    ON runs (symbol, timeframe, percentage_return);
+"""
+
+# SQLite's default limit on host parameters is 999
+_CHUNK = 500
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    # 30, 30.0 and np.float64(30) are the same parameter
+    return float(value)
+
+
+def canonical_json(value):
+    return json.dumps(
+        _normalize(value), sort_keys=True, separators=(",", ":")
+    )
+
+
+def run_key(
+    symbol,
+    timeframe,
+    start,
+    end,
+    bars,
+    digest,
+    initial_balance,
+    fee,
+    strategy,
+):
+    """Hex digest identifying one backtest run; `digest` is the bars'
+    (see backtest.bars_digest)."""
+    payload = canonical_json(
+        {
+            "version": KEY_VERSION,
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "start": str(start),
+            "end": str(end),
+            "bars": bars,
+            "digest": digest,
+            "initial_balance": initial_balance,
+            "fee": fee,
+            "strategy": strategy,
+        }
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultStore:
+    """Runs keyed by `run_key`. Records are the dicts backtest.run_job
+    yields: symbol, timeframe, strategy, start, end, bars, digest and the
+    metrics; the digest is only part of the key."""
+
+    COLUMNS = (
+        "key",
+        "symbol",
+        "timeframe",
+        "start",
+        "end",
+        "bars",
+        "initial_balance",
+        "fee",
+        "strategy",
+    ) + METRICS
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM runs")
+        return count[0]
+
+    def _record(self, row):
+        record = dict(zip(self.COLUMNS, row))
+        record["strategy"] = json.loads(record["strategy"])
+        for name in ("gains", "losses"):
+            if record[name] is not None:
+                record[name] = int(record[name])
+        return record
+
+    def get_many(self, keys):
+        """{key: record} for the keys already stored."""
+        keys = list(keys)
+        found = {}
+        columns = ", ".join(self.COLUMNS)
+        for i in range(0, len(keys), _CHUNK):
+            chunk = keys[i : i + _CHUNK]
+            rows = self.connection.execute(
+                f"SELECT {columns} FROM runs WHERE key IN "
+                f"({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for row in rows:
+                found[row[0]] = self._record(row)
+        return found
+
+    def put_many(self, items):
+        """Store (key, record, initial_balance, fee) tuples in one
+        transaction; a key already present is replaced."""
+        rows = [
+            (
+                key,
+                record["symbol"],
+                record["timeframe"],
+                str(record["start"]),
+                str(record["end"]),
+                record["bars"],
+                initial_balance,
+                fee,
+                canonical_json(record["strategy"]),
+                *(record.get(name) for name in METRICS),
+            )
+            for key, record, initial_balance, fee in items
+        ]
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO runs ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                rows,
+            )
+
+    def query(
+        self,
+        symbol=None,
+        timeframe=None,
+        minimum=None,
+        maximum=None,
+        params=None,
+        order_by="sharpe",
+        descending=True,
+        limit=100,
+    ):
+        """Stored records matching every filter, best `order_by` first.
+
+        `minimum` and `maximum` map metric names to bounds; `params` maps
+        strategy parameter names to exact values.
+        """
+        clauses, values = [], []
+        for column, value in (("symbol", symbol), ("timeframe", timeframe)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                values.append(value)
+        for bounds, operator in ((minimum, ">="), (maximum, "<=")):
+            for name, bound in (bounds or {}).items():
+                if name not in METRICS:
+                    raise ValueError(f"unknown metric: {name}")
+                clauses.append(f"{name} {operator} ?")
+                values.append(bound)
+        for name, value in (params or {}).items():
+            clauses.append("json_extract(strategy, ?) = ?")
+            values += [f'$."{name}"', _normalize(value)]
+        if order_by not in METRICS:
+            raise ValueError(f"unknown metric: {order_by}")
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(limit)
+        rows = self.connection.execute(sql, values)
+        return [self._record(row) for row in rows]
+
+
+def _assignments(items):
+    pairs = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        pairs[name] = json.loads(value)
+    return pairs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Query stored backtest results."
+    )
+    parser.add_argument("store", help="SQLite result store")
+    parser.add_argument("--symbol")
+    parser.add_argument("--timeframe")
+    parser.add_argument(
+        "--min", action="append", default=[], help="metric=value"
+    )
+    parser.add_argument(
+        "--max", action="append", default=[], help="metric=value"
+    )
+    parser.add_argument(
+        "--param", action="append", default=[], help="parameter=value"
+    )
+    parser.add_argument("--order-by", default="sharpe", choices=METRICS)
+    parser.add_argument("--ascending", action="store_true")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with ResultStore(args.store) as store:
+        records = store.query(
+            args.symbol,
+            args.timeframe,
+            _assignments(args.min),
+            _assignments(args.max),
+            _assignments(args.param),
+            args.order_by,
+            not args.ascending,
+            args.limit,
+        )
+    for record in records:
+        record.pop("key")
+        sys.stdout.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import math
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+class RiskEngine:
+    """Pre-trade exposure checks against per-ticker and total notional caps.
+
+    Arrays are indexed by `Ticker.value`, and `Side.value` is 0 for BUY and 1
+    for SELL, as in FillLedger. For every ticker the engine keeps the signed
+    position, the quantity and notional of open orders on each side and the
+    mark price, and derives the worst-case exposure if every open order
+    filled:
+
+        long  = position * mark + open buy notional
+        short = -position * mark + open sell notional
+        exposure = max(long, short, 0)
+
+    The total is kept as a running sum, so every event and every `check` is
+    a handful of float operations (about a microsecond) however many orders
+    are open. The counters are plain lists because scalar access to them is
+    several times faster than to NumPy arrays.
+
+    `check` runs before an order is sent and returns the quantity that fits
+    under the caps: the full quantity, a smaller one, or 0.0 to reject.
+    Orders that only reduce exposure always pass. Open orders are registered
+    with `on_order` and released by `on_fill` or `on_cancel`; market orders
+    are registered too, at the mark price, until their fill arrives.
+    """
+
+    def __init__(
+        self,
+        ticker_limits: Sequence[float],
+        total_limit: float = math.inf,
+        max_order_notional: float = math.inf,
+        min_notional: float = 1.0,
+    ) -> None:
+        n_tickers = len(ticker_limits)
+        self.ticker_limits = [float(limit) for limit in ticker_limits]
+        self.total_limit = float(total_limit)
+        self.max_order_notional = max_order_notional
+        self.min_notional = min_notional  # resized orders below this are rejected
+        self.position = [0.0] * n_tickers  # signed quantity, short < 0
+        self.mark_price = [0.0] * n_tickers
+        self.open_quantity = [[0.0, 0.0] for _ in range(n_tickers)]  # [buy, sell]
+        self.open_notional = [[0.0, 0.0] for _ in range(n_tickers)]
+        self.exposure = [0.0] * n_tickers
+        self.total_exposure = 0.0
+        self.checked: int = 0
+        self.resized: int = 0
+        self.rejected: int = 0
+
+    def set_limits(self, ticker_limits: Optional[Sequence[float]] = None, total_limit: Optional[float] = None) -> None:
+        """Change the caps, e.g. when capital changes. Open orders are kept."""
+        if ticker_limits is not None:
+            self.ticker_limits = [float(limit) for limit in ticker_limits]
+        if total_limit is not None:
+            self.total_limit = float(total_limit)
+
+    def check(self, side, ticker, quantity: float, price: float, replaces: float = 0.0) -> float:
+        """Quantity of a new order that keeps both caps, 0.0 if none does.
+
+        `replaces` is the notional of an open order on the same side that
+        will be cancelled for this one; its headroom counts as free.
+        """
+        self.checked += 1
+        i = ticker.value
+        s = side.value
+        exposed = self.position[i] * self.mark_price[i]
+        open_notional = self.open_notional[i]
+        if s == 0:
+            same = exposed + open_notional[0] - replaces
+            other = -exposed + open_notional[1]
+        else:
+            same = -exposed + open_notional[1] - replaces
+            other = exposed + open_notional[0]
+        # Worst case on this side may rise to the larger of what is already
+        # exposed on the other side and the room under both caps
+        cap = min(self.ticker_limits[i], self.total_limit - self.total_exposure + self.exposure[i])
+        allowed = min(max(other, cap) - same, self.max_order_notional)
+        notional = quantity * price
+        if notional <= allowed:
+            return quantity
+        if allowed < self.min_notional or price <= 0:
+            self.rejected += 1
+            return 0.0
+        self.resized += 1
+        return allowed / price
+
+    def on_order(self, side, ticker, quantity: float, price: Optional[float] = None) -> None:
+        """Register an order that was sent; market orders pass no price."""
+        i = ticker.value
+        s = side.value
+        if price is None:
+            price = self.mark_price[i]
+        self.open_quantity[i][s] += quantity
+        self.open_notional[i][s] += quantity * price
+        self._refresh(i)
+
+    def on_cancel(self, side, ticker, quantity: float, price: float) -> None:
+        """Release the unfilled `quantity` of a cancelled or expired order."""
+        i = ticker.value
+        s = side.value
+        self._release(i, s, quantity, quantity * price)
+        self._refresh(i)
+
+    def on_fill(self, ticker, side, price: float, quantity: float) -> None:
+        """Move filled quantity from open orders into the position."""
+        i = ticker.value
+        s = side.value
+        open_quantity = self.open_quantity[i][s]
+        if open_quantity > 0:
+            # Fills carry no order id: release the open notional pro rata
+            filled = min(quantity, open_quantity)
+            self._release(i, s, filled, self.open_notional[i][s] * filled / open_quantity)
+        self.position[i] += quantity if s == 0 else -quantity
+        if self.mark_price[i] == 0.0:
+            self.mark_price[i] = price
+        self._refresh(i)
+
+    def mark(self, ticker, price: float) -> None:
+        """Update the price the position is valued at."""
+        i = ticker.value
+        self.mark_price[i] = price
+        self._refresh(i)
+
+    def headroom(self, side, ticker, price: float) -> float:
+        """Largest quantity `check` would currently pass at `price`."""
+        checked, resized, rejected = self.checked, self.resized, self.rejected
+        quantity = self.check(side, ticker, math.inf, price)
+        self.checked, self.resized, self.rejected = checked, resized, rejected
+        return quantity
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copies of all per-ticker columns, ready for a DataFrame."""
+        return {
+            "position": np.array(self.position),
+            "mark_price": np.array(self.mark_price),
+            "open_buy": np.array([notional[0] for notional in self.open_notional]),
+            "open_sell": np.array([notional[1] for notional in self.open_notional]),
+            "exposure": np.array(self.exposure),
+            "limit": np.array(self.ticker_limits),
+        }
+
+    def _release(self, i: int, s: int, quantity: float, notional: float) -> None:
+        remaining = self.open_quantity[i][s] - quantity
+        if remaining <= 1e-12:
+            self.open_quantity[i][s] = 0.0
+            self.open_notional[i][s] = 0.0
+        else:
+            self.open_quantity[i][s] = remaining
+            self.open_notional[i][s] = max(self.open_notional[i][s] - notional, 0.0)
+
+    def _refresh(self, i: int) -> None:
+        """Recompute one ticker's exposure and adjust the running total."""
+        exposed = self.position[i] * self.mark_price[i]
+        open_notional = self.open_notional[i]
+        exposure = max(exposed + open_notional[0], -exposed + open_notional[1], 0.0)
+        self.total_exposure += exposure - self.exposure[i]
+        self.exposure[i] = exposure
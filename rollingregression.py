@@ -1,9 +1,13 @@
 from enum import Enum
 import time
-from collections import defaultdict
-from typing import Dict, List, Optional
+from typing import List, Optional, Tuple
 import numpy as np
-from sklearn.linear_model import LinearRegression
+
+from conflation import Conflator
+from fill_ledger import FillLedger
+from risk_engine import RiskEngine
+from ticker_state import TickerState
+from warm_start import TickerStateWarmStart
 
 
 class Side(Enum):
@@ -32,19 +36,21 @@ def cancel_order(ticker: Ticker, order_id: int) -> bool:
     return True
 
 
-class Strategy:
+class Strategy(TickerStateWarmStart):
     """Enhanced trading strategy with dynamic risk management, rate limit management, and additional indicators."""
 
     def __init__(self) -> None:
         """Initialize the strategy."""
         # Initialize variables
         self.capital: float = 100000.0  # Starting capital
-        self.position: Optional[str] = None  # 'long', 'short', or None
-        self.position_size: float = 0.0  # Quantity of BTC held
-        self.entry_price: Optional[float] = None  # Price at which the position was entered
-        self.price_history: List[float] = []  # BTC price history
+        self.ledger = FillLedger(len(Ticker))  # Net position (short < 0), average entry price and PnL per ticker
         self.window_size: int = 20  # Window size for regression
+        self.tickers: Tuple[Ticker, ...] = tuple(Ticker)  # Tickers to trade
+        self.state = TickerState(len(Ticker), self.window_size * 2)  # Price history, one row per Ticker.value
         self.max_position_fraction: float = 0.1  # Max fraction of capital to use per trade
+        # Caps each ticker at one trade's worth of the starting capital, counting
+        # market orders whose fills have not arrived yet, and the book at 1x
+        self.risk = RiskEngine([self.capital * self.max_position_fraction] * len(Ticker), total_limit=self.capital)
         self.entry_threshold: float = 0.002  # Entry threshold for regression slope
         self.exit_threshold: float = -0.002  # Exit threshold for regression slope
         self.stop_loss_multiplier: float = 1.5  # Multiplier for ATR-based stop-loss
@@ -52,55 +58,55 @@ class Strategy:
         self.order_timestamps: List[float] = []  # For rate limiting
         self.max_orders_per_minute: int = 30  # Rate limit
         self.cooldown_period: float = 2.0  # Cooldown period in seconds between orders
-        self.best_bid: Optional[float] = None
-        self.best_ask: Optional[float] = None
+        self.best_bid = np.full(len(Ticker), np.nan)
+        self.best_ask = np.full(len(Ticker), np.nan)
+        # Book updates are conflated per ticker: seconds between evaluations,
+        # 0 evaluates every update, None waits for the next trade
+        self.conflation_interval: Optional[float] = 0.05
+        # The module's clock, which replays (tournament.py) replace
+        self.conflator = Conflator(self.execute_trade, interval=self.conflation_interval, clock=time.monotonic)
 
     def on_trade_update(self, ticker: Ticker, side: Side, price: float, quantity: float) -> None:
         """Called whenever two orders match."""
-        # Only consider BTC
-        if ticker != Ticker.BTC:
+        if ticker not in self.tickers:
             return
 
         print(f"Python Trade update: {ticker.name} {side.name} {price} {quantity}")
 
         # Update price history
-        self.price_history.append(price)
-        if len(self.price_history) > self.window_size * 2:
-            self.price_history = self.price_history[-self.window_size * 2:]
+        self.state.push(ticker.value, price)
 
-        # Attempt to execute trades
-        self.execute_trade()
+        # Attempt to execute trades; this also covers pending book updates
+        self.conflator.update(ticker, immediate=True)
 
     def on_orderbook_update(self, ticker: Ticker, side: Side, price: float, quantity: float) -> None:
         """Update price history based on orderbook updates."""
-        # Only consider BTC
-        if ticker != Ticker.BTC:
+        if ticker not in self.tickers:
             return
 
-        # Update the best bid and ask prices
+        # Update the best bid and ask prices (NaN = no level)
+        i = ticker.value
         if side == Side.BUY:
             if quantity == 0:
-                if self.best_bid == price:
-                    self.best_bid = None
+                if self.best_bid[i] == price:
+                    self.best_bid[i] = np.nan
             else:
-                if self.best_bid is None or price > self.best_bid:
-                    self.best_bid = price
+                if np.isnan(self.best_bid[i]) or price > self.best_bid[i]:
+                    self.best_bid[i] = price
         elif side == Side.SELL:
             if quantity == 0:
-                if self.best_ask == price:
-                    self.best_ask = None
+                if self.best_ask[i] == price:
+                    self.best_ask[i] = np.nan
             else:
-                if self.best_ask is None or price < self.best_ask:
-                    self.best_ask = price
+                if np.isnan(self.best_ask[i]) or price < self.best_ask[i]:
+                    self.best_ask[i] = price
 
-        if self.best_bid is not None and self.best_ask is not None:
-            mid_price = (self.best_bid + self.best_ask) / 2
-            self.price_history.append(mid_price)
-            if len(self.price_history) > self.window_size * 2:
-                self.price_history = self.price_history[-self.window_size * 2:]
+        if not np.isnan(self.best_bid[i]) and not np.isnan(self.best_ask[i]):
+            mid_price = (self.best_bid[i] + self.best_ask[i]) / 2
+            self.state.push(i, mid_price)
 
-            # Attempt to execute trades
-            self.execute_trade()
+            # Attempt to execute trades, at most once per conflation slice
+            self.conflator.update(ticker)
 
     def on_account_update(
         self,
@@ -112,51 +118,29 @@ class Strategy:
     ) -> None:
         """Called whenever one of your orders is filled."""
 
-        if ticker != Ticker.BTC:
+        if ticker not in self.tickers:
             return
 
         print(f"Python Account update: {ticker.name} {side.name} {price} {quantity} {capital_remaining}")
 
         # Update capital and position
         self.capital = capital_remaining
-        if side == Side.BUY:
-            if self.position == 'short':
-                self.position_size -= quantity
-                if self.position_size <= 0:
-                    self.position = None
-                    self.entry_price = None
-            else:
-                self.position_size += quantity
-                self.position = 'long'
-                self.entry_price = price
-        elif side == Side.SELL:
-            if self.position == 'long':
-                self.position_size -= quantity
-                if self.position_size <= 0:
-                    self.position = None
-                    self.entry_price = None
-            else:
-                self.position_size += quantity
-                self.position = 'short'
-                self.entry_price = price
+        self.ledger.on_fill(ticker, side, price, quantity)
+        self.risk.on_fill(ticker, side, price, quantity)
 
-    def execute_trade(self) -> None:
+    def execute_trade(self, ticker: Ticker) -> None:
         """Execute trades based on rolling regression slope, RSI, and ATR."""
-        if len(self.price_history) < self.window_size:
+        i = ticker.value
+        if self.state.count[i] < self.window_size:
             return  # Not enough data
 
-        # Calculate regression slope
-        prices = self.price_history[-self.window_size:]
-        x = np.arange(len(prices)).reshape(-1, 1)
-        y = np.array(prices).reshape(-1, 1)
-        model = LinearRegression()
-        model.fit(x, y)
-        slope = model.coef_[0][0] / y.mean()
-
-        # Calculate RSI and ATR
-        rsi = self.calculate_rsi(self.price_history)
-        atr = self.calculate_atr(self.price_history)
-        current_price = prices[-1]
+        # Normalized regression slope, RSI and ATR for every ticker in one
+        # vector pass over the state rows
+        slope = self.state.regression_slopes(self.window_size)[i]
+        rsi = self.state.rsi(14)[i]
+        atr = self.state.atr(14)[i]
+        current_price = self.state.last[i]
+        self.risk.mark(ticker, current_price)
 
         # Print the regression slope for debugging
         print(f"Regression slope: {slope}, RSI: {rsi}, ATR: {atr}")
@@ -165,80 +149,51 @@ class Strategy:
         stop_loss = atr * self.stop_loss_multiplier
         take_profit = atr * self.take_profit_multiplier
 
+        position = float(self.ledger.position[i])
+        entry_price = float(self.ledger.avg_cost[i])
+
         # Check for stop-loss or take-profit
-        if self.position and self.entry_price:
-            price_change = (current_price - self.entry_price) / self.entry_price
-            if self.position == 'long':
+        if position != 0 and entry_price:
+            price_change = (current_price - entry_price) / entry_price
+            if position > 0:
                 if price_change <= -stop_loss or price_change >= take_profit:
                     # Exit long position
-                    quantity = self.position_size
-                    if self.place_market_order_with_rate_limit(Side.SELL, Ticker.BTC, quantity):
-                        print(f"Exiting long position: Sold {quantity} BTC at {current_price} due to stop-loss/take-profit")
+                    quantity = position
+                    if self.place_market_order_with_rate_limit(Side.SELL, ticker, quantity):
+                        print(f"Exiting long position: Sold {quantity} {ticker.name} at {current_price} due to stop-loss/take-profit")
                     return
-            elif self.position == 'short':
+            else:
                 if price_change >= stop_loss or price_change <= -take_profit:
                     # Exit short position
-                    quantity = abs(self.position_size)
-                    if self.place_market_order_with_rate_limit(Side.BUY, Ticker.BTC, quantity):
-                        print(f"Exiting short position: Bought {quantity} BTC at {current_price} due to stop-loss/take-profit")
+                    quantity = -position
+                    if self.place_market_order_with_rate_limit(Side.BUY, ticker, quantity):
+                        print(f"Exiting short position: Bought {quantity} {ticker.name} at {current_price} due to stop-loss/take-profit")
                     return
 
         # Decide whether to enter or exit position
-        if self.position is None:
+        if position == 0:
             if slope > self.entry_threshold and rsi < 70:
                 # Upward trend detected; enter long position
                 investment = self.capital * self.max_position_fraction
-                quantity = investment / current_price
-                if self.place_market_order_with_rate_limit(Side.BUY, Ticker.BTC, quantity):
-                    print(f"Entering long position: Bought {quantity} BTC at {current_price}")
+                quantity = self.risk.check(Side.BUY, ticker, investment / current_price, current_price)
+                if quantity > 0 and self.place_market_order_with_rate_limit(Side.BUY, ticker, quantity):
+                    print(f"Entering long position: Bought {quantity} {ticker.name} at {current_price}")
             elif slope < self.exit_threshold and rsi > 30:
                 # Downward trend detected; enter short position
                 investment = self.capital * self.max_position_fraction
-                quantity = investment / current_price
-                if self.place_market_order_with_rate_limit(Side.SELL, Ticker.BTC, quantity):
-                    print(f"Entering short position: Sold {quantity} BTC at {current_price}")
-        elif self.position == 'long' and slope < self.exit_threshold:
+                quantity = self.risk.check(Side.SELL, ticker, investment / current_price, current_price)
+                if quantity > 0 and self.place_market_order_with_rate_limit(Side.SELL, ticker, quantity):
+                    print(f"Entering short position: Sold {quantity} {ticker.name} at {current_price}")
+        elif position > 0 and slope < self.exit_threshold:
             # Downward trend detected; exit long position
-            quantity = self.position_size
-            if self.place_market_order_with_rate_limit(Side.SELL, Ticker.BTC, quantity):
-                print(f"Exiting long position: Sold {quantity} BTC at {current_price}")
-        elif self.position == 'short' and slope > self.entry_threshold:
+            quantity = position
+            if self.place_market_order_with_rate_limit(Side.SELL, ticker, quantity):
+                print(f"Exiting long position: Sold {quantity} {ticker.name} at {current_price}")
+        elif position < 0 and slope > self.entry_threshold:
             # Upward trend detected; exit short position
-            quantity = abs(self.position_size)
-            if self.place_market_order_with_rate_limit(Side.BUY, Ticker.BTC, quantity):
-                print(f"Exiting short position: Bought {quantity} BTC at {current_price}")
-
-    def calculate_rsi(self, prices: List[float], period: int = 14) -> float:
-        """Calculate the RSI indicator."""
-        if len(prices) < period + 1:
-            return 50  # Neutral value when data is insufficient
-
-        deltas = np.diff(prices)
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        avg_gain = np.mean(gains[-period:])
-        avg_loss = np.mean(losses[-period:])
-
-        if avg_loss == 0:
-            return 100
-        if avg_gain == 0:
-            return 0
-
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
-
-    def calculate_atr(self, prices: List[float], period: int = 14) -> float:
-        """Calculate the ATR (Average True Range) indicator."""
-        if len(prices) < period + 1:
-            return 0  # Not enough data for ATR calculation
-
-        tr_list = []
-        for i in range(1, len(prices)):
-            tr = abs(prices[i] - prices[i - 1])
-            tr_list.append(tr)
-        atr = np.mean(tr_list[-period:])
-        return atr
+            quantity = -position
+            if self.place_market_order_with_rate_limit(Side.BUY, ticker, quantity):
+                print(f"Exiting short position: Bought {quantity} {ticker.name} at {current_price}")
 
     def place_market_order_with_rate_limit(self, side: Side, ticker: Ticker, quantity: float) -> bool:
         """Place a market order accounting for the rate limit."""
@@ -255,11 +210,16 @@ class Strategy:
             print("Rate limit exceeded: Cannot place market order at this time.")
             return False
 
+        # Pending until its fill arrives; registered first in case the fill
+        # is reported during the call
+        price = self.risk.mark_price[ticker.value]
+        self.risk.on_order(side, ticker, quantity, price)
         success = place_market_order(side, ticker, quantity)
         if success:
             self.order_timestamps.append(current_time)
             print(f"Placed MARKET order: {side.name} {ticker.name} {quantity}")
             return True
         else:
+            self.risk.on_cancel(side, ticker, quantity, price)
             print(f"Failed to place MARKET order: {side.name} {ticker.name} {quantity}")
             return False
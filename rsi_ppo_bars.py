@@ -0,0 +1,123 @@
+from enum import Enum
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from bar_builder import Bar, BarBuilder
+from fill_ledger import FillLedger
+from streaming_indicators import StreamingPPO, StreamingRSI
+
+
+class Side(Enum):
+    BUY = 0
+    SELL = 1
+
+
+class Ticker(Enum):
+    ETH = 0
+    BTC = 1
+    LTC = 2
+
+
+def place_market_order(side: Side, ticker: Ticker, quantity: float) -> bool:
+    """Place a market order - DO NOT MODIFY"""
+    return True
+
+
+def place_limit_order(side: Side, ticker: Ticker, quantity: float, price: float, ioc: bool = False) -> int:
+    """Place a limit order - DO NOT MODIFY"""
+    return 0
+
+
+def cancel_order(ticker: Ticker, order_id: int) -> bool:
+    """Cancel a limit order - DO NOT MODIFY"""
+    return True
+
+
+class Strategy:
+    """The Backtest_Simulator RSI/PPO strategy run live on bars built from trades."""
+
+    def __init__(self) -> None:
+        """Initialize the strategy."""
+        self.capital: float = 100000.0  # Starting capital
+        self.ledger = FillLedger(len(Ticker))  # Net position and average entry price per ticker
+        self.bar_mode: str = "time"  # "time", "tick" or "volume" bars
+        self.bar_size: float = 15 * 60  # Seconds, trades or quantity per bar
+        self.rsi_window: int = 14
+        self.rsi_entry: float = 30  # Same defaults as Backtest_Simulator.py
+        self.price_oscillator_entry: float = -0.45
+        self.take_profit: float = 0.015
+        self.max_position_fraction: float = 1 / len(Ticker)  # Capital per ticker
+        # One bar builder and one set of streaming indicators per ticker,
+        # indexed by Ticker.value; each completed bar costs O(1)
+        self.bars: List[BarBuilder] = [BarBuilder(self.bar_mode, self.bar_size) for _ in Ticker]
+        self.rsi: List[StreamingRSI] = [StreamingRSI(self.rsi_window) for _ in Ticker]
+        self.ppo: List[StreamingPPO] = [StreamingPPO() for _ in Ticker]
+        self.pending_timeout: float = 10.0  # Seconds to wait for a market order's fill
+        self.pending: List[Optional[float]] = [None for _ in Ticker]  # Send time of a market order whose fill is not seen yet
+
+    def warm_start(self, ticker: Ticker, prices: np.ndarray, volumes: Optional[np.ndarray] = None) -> None:
+        """Feed the closes of recorded bars of this strategy's bar size
+        (oldest first) through the indicators, so the first live bar is
+        already evaluated with full RSI and PPO history."""
+        i = ticker.value
+        self.rsi[i].load(prices)
+        self.ppo[i].load(prices)
+
+    def on_trade_update(self, ticker: Ticker, side: Side, price: float, quantity: float) -> None:
+        """Called whenever two orders match."""
+        bar = self.bars[ticker.value].update(price, quantity, time.time())
+        if bar is not None:
+            self.on_bar(ticker, bar)
+
+    def on_orderbook_update(self, ticker: Ticker, side: Side, price: float, quantity: float) -> None:
+        """Bars are built from trades only."""
+        # Close time bars that ended during a quiet period
+        for member in Ticker:
+            bar = self.bars[member.value].flush(time.time())
+            if bar is not None:
+                self.on_bar(member, bar)
+
+    def on_account_update(
+        self,
+        ticker: Ticker,
+        side: Side,
+        price: float,
+        quantity: float,
+        capital_remaining: float,
+    ) -> None:
+        """Called whenever one of your orders is filled."""
+        self.capital = capital_remaining
+        self.ledger.on_fill(ticker, side, price, quantity)
+        self.pending[ticker.value] = None
+
+    def on_bar(self, ticker: Ticker, bar: Bar) -> None:
+        """Same rule as `backtest()`: enter long when RSI and PPO are both
+        low, exit once the close is `take_profit` above the entry."""
+        i = ticker.value
+        rsi = self.rsi[i].update(bar.close)
+        ppo = self.ppo[i].update(bar.close)
+        sent = self.pending[i]
+        if sent is not None:
+            if time.time() - sent < self.pending_timeout:
+                return
+            # No fill by now: the order was rejected or its fill was missed,
+            # so evaluate again from what the ledger holds
+            self.pending[i] = None
+
+        position = float(self.ledger.position[i])
+        if position <= 0:
+            if rsi <= self.rsi_entry and ppo <= self.price_oscillator_entry:
+                quantity = self.capital * self.max_position_fraction / bar.close
+                self.send(Side.BUY, ticker, quantity)
+        elif bar.close / self.ledger.avg_cost[i] - 1 >= self.take_profit:
+            self.send(Side.SELL, ticker, position)
+
+    def send(self, side: Side, ticker: Ticker, quantity: float) -> bool:
+        if place_market_order(side, ticker, quantity):
+            self.pending[ticker.value] = time.time()
+            print(f"Placed MARKET order: {side.name} {ticker.name} {quantity}")
+            return True
+        print(f"Failed to place MARKET order: {side.name} {ticker.name} {quantity}")
+        return False
@@ -0,0 +1,260 @@
+"""Entry and exit rules written as expressions over indicator columns.
+
+A strategy dict may carry `entry_rule` and `exit_rule` strings such as
+
+    "rsi <= rsi_entry and price_oscillator <= price_oscillator_entry"
+    "stochastic_rsi <= 20 or double_ema < close"
+    "supertrend_len12_mult3 == 1 and prev(supertrend_len12_mult3) == -1"
+
+Names are bar columns (open, high, low, close, volume), indicator columns
+or, failing both, parameters of the strategy dict, so sweeps still work on
+the thresholds. Expressions are parsed once with `ast` into a tree of NumPy
+operations that evaluates every bar at once; only `and`, `or`, `not`,
+comparisons, arithmetic, numbers and the functions `abs` and
+`prev(x, n=1)` (x, n bars earlier) are accepted. Indicator columns a rule
+needs are computed only if the bars do not have them yet.
+"""
+
+import ast
+import functools
+import operator
+import re
+
+import numpy as np
+
+BASE_COLUMNS = frozenset(("open", "high", "low", "close", "volume"))
+
+# Indicator column -> (Backtest_Simulator function adding it, keyword
+# arguments, columns it reads). supertrend_len<length>_mult<multiplier>
+# columns are resolved from their name.
+INDICATORS = {
+    "rsi": ("calculate_rsi", {}, ("close",)),
+    "stochastic_rsi": ("calculate_stochastic_rsi", {}, ("close",)),
+    "price_oscillator": ("calculate_price_oscillator", {}, ("close",)),
+    "ema": ("calculate_ema", {}, ("close",)),
+    "double_ema": ("calculate_double_ema", {"period": 200}, ("close",)),
+}
+SUPERTREND = re.compile(r"supertrend_len(\d+)_mult(\d+(?:\.\d+)?)")
+
+# The condition backtest() used before rules existed
+DEFAULT_ENTRY_RULE = (
+    "rsi <= rsi_entry and price_oscillator <= price_oscillator_entry"
+)
+
+
+class RuleError(ValueError):
+    pass
+
+
+def indicator(name):
+    """(function name, keyword arguments, input columns) computing the
+    column `name`, or None if it is not an indicator."""
+    if name in INDICATORS:
+        return INDICATORS[name]
+    match = SUPERTREND.fullmatch(name)
+    if match:
+        return (
+            "calculate_supertrend",
+            {"length": int(match[1]), "multiplier": float(match[2])},
+            ("high", "low", "close"),
+        )
+    return None
+
+
+def is_column(name):
+    return name in BASE_COLUMNS or indicator(name) is not None
+
+
+def ensure_columns(data, names):
+    """`data` (a DataFrame or a dict of NumPy columns) with every indicator
+    in `names` (and the indicators those need) computed. Returns `data`
+    itself when nothing is missing, otherwise a copy, so bars shared between
+    runs are never modified."""
+    import Backtest_Simulator as simulator
+
+    missing = []
+
+    def visit(name):
+        if name in data or name in missing:
+            return
+        spec = indicator(name)
+        if spec is None:
+            raise RuleError(f"unknown column: {name}")
+        for dependency in spec[2]:
+            visit(dependency)
+        missing.append(name)
+
+    for name in sorted(names):
+        visit(name)
+    if not missing:
+        return data
+    data = data.copy()
+    for name in missing:
+        function, kwargs, _ = indicator(name)
+        data = getattr(simulator, function)(data, **kwargs)
+    return data
+
+
+def _prev(values, n=1):
+    n = int(n)
+    values = np.asarray(values)
+    if values.dtype == np.bool_:
+        out = np.zeros_like(values)
+    else:
+        out = np.full(values.shape, np.nan)
+    if n < len(values):
+        out[n:] = values[: len(values) - n]
+    return out
+
+
+FUNCTIONS = {"abs": np.abs, "prev": _prev}
+
+_BOOLEAN = {ast.And: np.logical_and, ast.Or: np.logical_or}
+_UNARY = {
+    ast.Not: np.logical_not,
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+}
+_BINARY = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+}
+_COMPARE = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+
+def _build(node, names):
+    """Turn one AST node into a function of the name lookup, recording the
+    names it reads."""
+    if isinstance(node, ast.BoolOp):
+        parts = [_build(value, names) for value in node.values]
+        combine = _BOOLEAN[type(node.op)]
+        return lambda lookup: functools.reduce(
+            combine, (part(lookup) for part in parts)
+        )
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        operand = _build(node.operand, names)
+        apply = _UNARY[type(node.op)]
+        return lambda lookup: apply(operand(lookup))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        left, right = _build(node.left, names), _build(node.right, names)
+        apply = _BINARY[type(node.op)]
+        return lambda lookup: apply(left(lookup), right(lookup))
+    if isinstance(node, ast.Compare) and all(
+        type(op) in _COMPARE for op in node.ops
+    ):
+        # a < b < c is (a < b) and (b < c); comparisons with NaN are False
+        operands = [_build(node.left, names)] + [
+            _build(value, names) for value in node.comparators
+        ]
+        ops = [_COMPARE[type(op)] for op in node.ops]
+
+        def compare(lookup):
+            values = [operand(lookup) for operand in operands]
+            result = ops[0](values[0], values[1])
+            for k in range(1, len(ops)):
+                result = result & ops[k](values[k], values[k + 1])
+            return result
+
+        return compare
+    if isinstance(node, ast.Name):
+        names.add(node.id)
+        return lambda lookup: lookup(node.id)
+    if isinstance(node, ast.Constant) and isinstance(
+        node.value, (bool, int, float)
+    ):
+        value = node.value
+        return lambda lookup: value
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+    ):
+        function = FUNCTIONS[node.func.id]
+        arguments = [_build(argument, names) for argument in node.args]
+        return lambda lookup: function(*(a(lookup) for a in arguments))
+    raise RuleError(f"unsupported expression: {ast.unparse(node)}")
+
+
+class Rule:
+    """A compiled rule; `mask(data, strategy)` evaluates it on every bar."""
+
+    def __init__(self, expression):
+        self.expression = expression
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as error:
+            raise RuleError(f"invalid rule {expression!r}: {error}") from None
+        names = set()
+        self._evaluate = _build(tree.body, names)
+        self.names = frozenset(names)
+        # Indicator and bar columns; everything else must be a parameter
+        self.columns = frozenset(name for name in names if is_column(name))
+
+    def __repr__(self):
+        return f"Rule({self.expression!r})"
+
+    def mask(self, data, strategy):
+        """Boolean array with one entry per bar of `data` (a DataFrame or a
+        dict of NumPy columns). `data` must already hold the rule's columns
+        (see `ensure_columns`)."""
+
+        def lookup(name):
+            if name in data:
+                return np.asarray(data[name], dtype=np.float64)
+            if name in strategy and not isinstance(strategy[name], str):
+                return strategy[name]
+            raise RuleError(
+                f"{name!r} in {self.expression!r} is neither a column nor "
+                "a strategy parameter"
+            )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = np.asarray(self._evaluate(lookup))
+        if result.dtype != np.bool_:
+            raise RuleError(f"rule {self.expression!r} is not a condition")
+        return np.broadcast_to(result, (len(data["close"]),)).copy()
+
+
+@functools.lru_cache(maxsize=None)
+def compile_rule(expression):
+    return Rule(expression)
+
+
+def strategy_rules(strategy):
+    """(entry rule, exit rule or None) of a strategy dict."""
+    entry = compile_rule(strategy.get("entry_rule") or DEFAULT_ENTRY_RULE)
+    exit_rule = strategy.get("exit_rule")
+    return entry, compile_rule(exit_rule) if exit_rule else None
+
+
+def _rule_columns(strategies):
+    columns = set()
+    for strategy in strategies:
+        for rule in strategy_rules(strategy):
+            if rule is not None:
+                columns |= rule.columns
+    return columns
+
+
+def strategy_columns(strategies):
+    """Indicator columns the rules of any of `strategies` read."""
+    return _rule_columns(strategies) - BASE_COLUMNS
+
+
+def bar_columns(strategies):
+    """Bar columns the rules of any of `strategies` read, directly or
+    through their indicators."""
+    columns = set()
+    for name in _rule_columns(strategies):
+        columns |= {name} if name in BASE_COLUMNS else set(indicator(name)[2])
+    return columns
@@ -0,0 +1,149 @@
+import math
+
+
+class StreamingEWM:
+    """One-value-at-a-time `ewm(alpha=alpha, min_periods=min_periods,
+    adjust=False).mean()`, the recursion behind ta's EMA, RSI and PPO.
+
+    Same NaN handling as `kernels.ewm_mean`: leading NaNs are skipped and
+    interior NaNs decay the previous average.
+    """
+
+    __slots__ = ("alpha", "min_periods", "value", "old_weight", "count")
+
+    def __init__(self, alpha: float, min_periods: int = 0) -> None:
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.value = math.nan
+        self.old_weight = 1.0
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        observed = not math.isnan(x)
+        if self.count == 0:
+            if observed:
+                self.value = x
+                self.count = 1
+        else:
+            self.old_weight *= 1.0 - self.alpha
+            if observed:
+                self.count += 1
+                self.value = (self.old_weight * self.value + self.alpha * x) / (self.old_weight + self.alpha)
+                self.old_weight = 1.0
+        return self.current
+
+    def load(self, values) -> float:
+        """`update` with every value of an array in turn, in one pass of
+        `kernels.ewm_mean` (compiled when Numba is installed)."""
+        import numpy as np
+
+        import kernels
+
+        values = np.asarray(values, dtype=np.float64)
+        observed = ~np.isnan(values)
+        if not len(values) or not observed[-1] or (self.count and self.old_weight != 1.0):
+            # The kernel starts from a fresh average or one just updated
+            for x in values.tolist():
+                self.update(x)
+            return self.current
+        if self.count:
+            values = np.concatenate(([self.value], values))
+        self.value = float(kernels.ewm_mean(kernels.loop_input(values), self.alpha, 1)[-1])
+        self.count += int(observed.sum())
+        self.old_weight = 1.0
+        return self.current
+
+    @property
+    def current(self) -> float:
+        return self.value if self.count >= max(self.min_periods, 1) else math.nan
+
+
+class StreamingEMA(StreamingEWM):
+    """`ta.trend.EMAIndicator(close, window).ema_indicator()`, one close at a time."""
+
+    __slots__ = ()
+
+    def __init__(self, window: int = 14) -> None:
+        super().__init__(2.0 / (window + 1), window)
+
+
+class StreamingDoubleEMA:
+    """`kernels.double_ema(close, window)` (2 EMA - EMA of EMA), one close at a time."""
+
+    __slots__ = ("first", "second")
+
+    def __init__(self, window: int = 14) -> None:
+        self.first = StreamingEMA(window)
+        self.second = StreamingEMA(window)
+
+    def update(self, close: float) -> float:
+        first = self.first.update(close)
+        return 2 * first - self.second.update(first)
+
+
+class StreamingRSI:
+    """`ta.momentum.RSIIndicator(close, window).rsi()`, one close at a time.
+
+    Like ta, the first close counts as a zero gain and a zero loss.
+    """
+
+    __slots__ = ("previous", "average_gain", "average_loss")
+
+    def __init__(self, window: int = 14) -> None:
+        self.previous = math.nan
+        self.average_gain = StreamingEWM(1.0 / window, window)
+        self.average_loss = StreamingEWM(1.0 / window, window)
+
+    def update(self, close: float) -> float:
+        change = close - self.previous
+        self.previous = close
+        self.average_gain.update(change if change > 0 else 0.0)
+        self.average_loss.update(-change if change < 0 else 0.0)
+        return self.current
+
+    def load(self, closes) -> float:
+        """`update` with every close of an array in turn, vectorized."""
+        import numpy as np
+
+        closes = np.asarray(closes, dtype=np.float64)
+        if not len(closes):
+            return self.current
+        changes = np.diff(closes, prepend=self.previous)
+        self.average_gain.load(np.where(changes > 0, changes, 0.0))
+        self.average_loss.load(np.where(changes < 0, -changes, 0.0))
+        self.previous = float(closes[-1])
+        return self.current
+
+    @property
+    def current(self) -> float:
+        gain = self.average_gain.current
+        loss = self.average_loss.current
+        if loss == 0:
+            return 100.0
+        return 100 - 100 / (1 + gain / loss)
+
+
+class StreamingPPO:
+    """`ta.momentum.PercentagePriceOscillator(close).ppo()`, one close at a time."""
+
+    __slots__ = ("fast", "slow")
+
+    def __init__(self, window_slow: int = 26, window_fast: int = 12) -> None:
+        self.fast = StreamingEMA(window_fast)
+        self.slow = StreamingEMA(window_slow)
+
+    def update(self, close: float) -> float:
+        self.fast.update(close)
+        self.slow.update(close)
+        return self.current
+
+    def load(self, closes) -> float:
+        """`update` with every close of an array in turn, vectorized."""
+        self.fast.load(closes)
+        self.slow.load(closes)
+        return self.current
+
+    @property
+    def current(self) -> float:
+        slow = self.slow.current
+        return (self.fast.current - slow) / slow * 100
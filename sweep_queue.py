@@ -0,0 +1,383 @@
+"""Distribute backtest sweeps over several hosts through a shared directory.
+
+The coordinator splits a backtest.py job spec into chunks of strategies,
+one symbol and timeframe each, skipping runs the result store already
+holds. Workers on any host that mounts the queue directory claim chunks,
+backtest them and write their result lines back; the coordinator streams
+those into the result store.
+
+    python sweep_queue.py coordinator job.json /shared/queue --store runs.db \\
+        [--timeframes 5m 15m 1h 4h] [--chunk 50]
+    python sweep_queue.py worker /shared/queue    # on every host, any number
+
+Every state change is an atomic rename within the queue directory:
+
+    pending/<chunk>.json                    waiting for a worker
+    claimed/<chunk>@<worker>.json           being run; the worker touches it
+                                            every --heartbeat seconds
+    results/<chunk>.jsonl                   finished, not yet in the store
+    failed/<chunk>.json                     failed --attempts times
+
+A claim whose heartbeat is older than --timeout (the worker died or lost
+the mount) is renamed back to pending. A chunk that raises is re-queued
+with its error until it runs out of attempts. Planning empties the queue
+and chunk ids start with a token of the run, <run>-<n>, so files a
+previous run's workers still write are recognised and ignored.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+STATES = ("pending", "claimed", "results", "failed")
+
+
+def _path(queue, state, name=""):
+    return os.path.join(queue, state, name)
+
+
+def _write_atomic(path, text):
+    """Write to a temporary file next to `path`, then rename it into place,
+    so readers never see a partial file."""
+    temporary = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def _chunk_id(name):
+    return name.split("@", 1)[0].split(".", 1)[0]
+
+
+def plan(queue, job, timeframes, chunk_size, store=None):
+    """Create (or empty) the queue directory and enqueue every run the store
+    lacks. Returns the ids of the enqueued chunks."""
+    from backtest import expand_sweep, load_bars, run_keys
+
+    for state in STATES:
+        os.makedirs(_path(queue, state), exist_ok=True)
+        for name in os.listdir(_path(queue, state)):
+            try:
+                os.remove(_path(queue, state, name))
+            except FileNotFoundError:
+                pass
+    run = os.urandom(4).hex()
+    _write_atomic(
+        os.path.join(queue, "job.json"), json.dumps({"run": run, "job": job})
+    )
+    closed = os.path.join(queue, "closed")
+    if os.path.exists(closed):
+        os.remove(closed)
+
+    strategies = expand_sweep(job["strategy"], job["sweep"])
+    chunk_ids = []
+    for timeframe in timeframes:
+        for symbol in job["symbols"]:
+            todo = strategies
+            if store is not None:
+                timeframe_job = {**job, "timeframe": timeframe}
+                data = load_bars(timeframe_job, symbol)
+                _, _, _, keys = run_keys(
+                    timeframe_job, symbol, data, strategies
+                )
+                stored = store.get_many(keys)
+                todo = [s for s, k in zip(strategies, keys) if k not in stored]
+            for i in range(0, len(todo), chunk_size):
+                chunk_id = f"{run}-{len(chunk_ids):06d}"
+                chunk = {
+                    "id": chunk_id,
+                    "symbol": symbol,
+                    "timeframe": timeframe,
+                    "strategies": todo[i : i + chunk_size],
+                    "attempts": 0,
+                    "errors": [],
+                }
+                _write_atomic(
+                    _path(queue, "pending", f"{chunk_id}.json"),
+                    json.dumps(chunk),
+                )
+                chunk_ids.append(chunk_id)
+    return chunk_ids
+
+
+def requeue_stale(queue, timeout):
+    """Move claims whose heartbeat stopped back to pending; returns them."""
+    requeued = []
+    now = time.time()
+    for name in os.listdir(_path(queue, "claimed")):
+        path = _path(queue, "claimed", name)
+        try:
+            if now - os.stat(path).st_mtime < timeout:
+                continue
+            pending = _path(queue, "pending", f"{_chunk_id(name)}.json")
+            os.rename(path, pending)
+        except FileNotFoundError:
+            continue  # finished or requeued in the meantime
+        requeued.append(_chunk_id(name))
+    return requeued
+
+
+def ingest(queue, job, store, chunk_ids):
+    """Add finished chunks' results to the store; returns their ids.
+    Results of chunks not in `chunk_ids` (an earlier run's) are dropped."""
+    from result_store import run_key
+
+    done = []
+    for name in sorted(os.listdir(_path(queue, "results"))):
+        if not name.endswith(".jsonl"):
+            continue
+        path = _path(queue, "results", name)
+        if _chunk_id(name) not in chunk_ids:
+            os.remove(path)
+            continue
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if store is not None:
+            store.put_many(
+                (
+                    run_key(
+                        record["symbol"],
+                        record["timeframe"],
+                        record["start"],
+                        record["end"],
+                        record["bars"],
+                        record["digest"],
+                        job["initial_balance"],
+                        job["fee"],
+                        record["strategy"],
+                    ),
+                    record,
+                    job["initial_balance"],
+                    job["fee"],
+                )
+                for record in records
+            )
+        os.remove(path)
+        done.append(_chunk_id(name))
+    return done
+
+
+def coordinate(queue, job, timeframes, chunk_size, store, timeout, poll=1.0):
+    """Plan the sweep, then requeue dead claims and ingest results until
+    every chunk has finished or failed. Returns the failed chunks."""
+    chunk_ids = set(plan(queue, job, timeframes, chunk_size, store))
+    total = len(chunk_ids)
+    finished, failed = set(), {}
+    print(f"{total} chunks queued in {queue}", file=sys.stderr)
+    try:
+        while not chunk_ids <= finished | set(failed):
+            time.sleep(poll)
+            finished.update(ingest(queue, job, store, chunk_ids))
+            for chunk_id in requeue_stale(queue, timeout):
+                print(f"chunk {chunk_id}: requeued", file=sys.stderr)
+            for name in os.listdir(_path(queue, "failed")):
+                chunk_id = _chunk_id(name)
+                if (
+                    name.endswith(".json")
+                    and chunk_id in chunk_ids
+                    and chunk_id not in failed
+                ):
+                    with open(_path(queue, "failed", name)) as f:
+                        failed[chunk_id] = json.load(f)["errors"]
+            print(
+                f"{len(finished)}/{total} chunks done, {len(failed)} failed",
+                file=sys.stderr,
+            )
+    finally:
+        # Lets idle workers exit
+        _write_atomic(os.path.join(queue, "closed"), "")
+    return failed
+
+
+def _heartbeat(path, interval, stop):
+    while not stop.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return  # requeued by the coordinator
+
+
+def claim(queue, worker):
+    """Rename the first pending chunk into claimed/; returns its claimed
+    path, or None when nothing is pending."""
+    for name in sorted(os.listdir(_path(queue, "pending"))):
+        if not name.endswith(".json"):
+            continue
+        path = _path(queue, "claimed", f"{_chunk_id(name)}@{worker}.json")
+        try:
+            os.rename(_path(queue, "pending", name), path)
+            # Renaming keeps the old mtime; start the heartbeat clock now
+            os.utime(path)
+        except FileNotFoundError:
+            continue  # another worker won it, or it looked stale
+        return path
+    return None
+
+
+def _read_job(queue):
+    with open(os.path.join(queue, "job.json")) as f:
+        return json.load(f)
+
+
+def work(queue, worker=None, heartbeat=10.0, attempts=3, poll=1.0):
+    """Run chunks until the coordinator closes the queue; returns the
+    number of chunks this worker finished."""
+    from backtest import load_bars, run_job
+
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    # Workers may start before the coordinator has planned the queue
+    while not os.path.exists(os.path.join(queue, "job.json")):
+        time.sleep(poll)
+    planned = _read_job(queue)
+    bars = {}
+
+    def load(job, symbol):
+        # Chunks of the same market reuse the bars
+        key = (job["timeframe"], symbol)
+        if key not in bars:
+            bars[key] = load_bars(job, symbol)
+        return bars[key]
+
+    finished = 0
+    while True:
+        path = claim(queue, worker)
+        if path is None:
+            if os.path.exists(os.path.join(queue, "closed")):
+                return finished
+            time.sleep(poll)
+            continue
+        with open(path) as f:
+            chunk = json.load(f)
+        run = chunk["id"].split("-", 1)[0]
+        if run != planned["run"]:
+            # The queue was planned again since this worker started
+            planned = _read_job(queue)
+            bars.clear()
+            if run != planned["run"]:
+                # Left over from an earlier run
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+        job = planned["job"]
+        stop = threading.Event()
+        beat = threading.Thread(
+            target=_heartbeat, args=(path, heartbeat, stop), daemon=True
+        )
+        beat.start()
+        try:
+            chunk_job = {
+                **job,
+                "symbols": [chunk["symbol"]],
+                "timeframe": chunk["timeframe"],
+            }
+            records = list(
+                run_job(chunk_job, strategies=chunk["strategies"], load=load)
+            )
+        except KeyboardInterrupt:
+            stop.set()
+            os.rename(path, _path(queue, "pending", f"{chunk['id']}.json"))
+            raise
+        except Exception as error:
+            stop.set()
+            chunk["attempts"] += 1
+            chunk["errors"].append(f"{worker}: {error!r}")
+            state = "failed" if chunk["attempts"] >= attempts else "pending"
+            _write_atomic(
+                _path(queue, state, f"{chunk['id']}.json"), json.dumps(chunk)
+            )
+            print(f"chunk {chunk['id']}: {error!r}", file=sys.stderr)
+        else:
+            stop.set()
+            _write_atomic(
+                _path(queue, "results", f"{chunk['id']}.jsonl"),
+                "".join(json.dumps(record) + "\n" for record in records),
+            )
+            finished += 1
+        finally:
+            beat.join()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # requeued while it ran; the rerun's results are the same
+
+
+def main(argv=None):
+    from resample import TIMEFRAME_MINUTES
+
+    TIMEFRAMES = list(TIMEFRAME_MINUTES)
+    parser = argparse.ArgumentParser(
+        description="Run backtest sweeps on several hosts via a shared queue."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser(
+        "coordinator", help="queue a job and collect its results"
+    )
+    coordinator.add_argument("job", help='job spec file, "-" for stdin')
+    coordinator.add_argument("queue", help="shared queue directory")
+    coordinator.add_argument("--store", help="SQLite result store")
+    coordinator.add_argument(
+        "--timeframes",
+        nargs="+",
+        choices=TIMEFRAMES,
+        help="defaults to the job's timeframe",
+    )
+    coordinator.add_argument(
+        "--chunk", type=int, default=50, help="strategies per chunk"
+    )
+    coordinator.add_argument(
+        "--timeout",
+        type=float,
+        default=120.0,
+        help="seconds without a heartbeat before a claim is requeued",
+    )
+
+    worker = commands.add_parser("worker", help="run queued chunks")
+    worker.add_argument("queue", help="shared queue directory")
+    worker.add_argument("--id", help="defaults to <hostname>-<pid>")
+    worker.add_argument("--heartbeat", type=float, default=10.0)
+    worker.add_argument(
+        "--attempts",
+        type=int,
+        default=3,
+        help="failures before a chunk is given up",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        finished = work(args.queue, args.id, args.heartbeat, args.attempts)
+        print(f"{finished} chunks finished", file=sys.stderr)
+        return
+
+    from backtest import load_job
+    from result_store import ResultStore
+
+    job = load_job(args.job)
+    store = ResultStore(args.store) if args.store else None
+    try:
+        failed = coordinate(
+            args.queue,
+            job,
+            args.timeframes or [job["timeframe"]],
+            args.chunk,
+            store,
+            args.timeout,
+        )
+    finally:
+        if store is not None:
+            store.close()
+    for chunk_id, errors in sorted(failed.items()):
+        print(f"chunk {chunk_id} failed: {errors[-1]}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
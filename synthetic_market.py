@@ -0,0 +1,310 @@
+"""Seeded synthetic market data for stress tests and benchmarks.
+
+SyntheticMarket simulates correlated ETH/BTC/LTC mid-prices as geometric
+Brownian motion whose volatility, drift, trade rate and spread switch
+between market-wide regimes (a Markov chain), and derives from them an L2
+book of `DEPTH` levels per side and trades at the touch. Events come out as
+tick_capture arrays, so they can be written as captures, replayed through
+tournament.py or market_data_bus.py, or fed straight to a strategy:
+
+    market = SyntheticMarket(seed=7)
+    dispatch(strategy, Ticker, Side, market.events(100_000))
+
+or from the command line:
+
+    python synthetic_market.py stress.bin --seconds 3600 --seed 7
+
+Everything is generated with array operations, and every column is
+gathered directly in the final event order, without sorting. The first
+events are a snapshot of the whole book; then per time step and ticker,
+the book is sent as removals of the levels that left, additions of the
+levels that appeared and a size update at both touches, followed by the
+step's trades (side = aggressor; buys print at the ask, sells at the
+bid). The same seed and the same sequence of `events` calls give the same
+events.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from tick_capture import (
+    EVENT_DTYPE,
+    ORDERBOOK,
+    TRADE,
+    CaptureWriter,
+)
+
+# Per ticker, in Ticker.value order: ETH, BTC, LTC
+START_PRICES = (3000.0, 60000.0, 80.0)
+TICK_SIZES = (0.1, 1.0, 0.01)
+VOLATILITIES = (0.8, 0.6, 0.9)  # annualized, in the "normal" regime
+TRADES_PER_SECOND = (4.0, 8.0, 2.0)  # in the "normal" regime
+CORRELATION = (
+    (1.0, 0.8, 0.65),
+    (0.8, 1.0, 0.7),
+    (0.65, 0.7, 1.0),
+)
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+# Regime -> (volatility multiplier, annual drift, trade rate multiplier,
+# spread in ticks, mean duration in seconds). Regimes switch for all
+# tickers at once, to the next regime drawn from TRANSITIONS.
+REGIMES = {
+    "calm": (0.5, 0.0, 0.5, 1, 1800.0),
+    "normal": (1.0, 0.0, 1.0, 2, 3600.0),
+    "stressed": (3.0, -2.0, 4.0, 6, 300.0),
+}
+TRANSITIONS = (
+    (0.0, 0.9, 0.1),
+    (0.6, 0.0, 0.4),
+    (0.2, 0.8, 0.0),
+)
+
+DEPTH = 10  # book levels per side
+STEP = 0.1  # seconds per simulation step
+
+
+def _expand(counts):
+    """Row index and rank within the row of every item, when row `r` has
+    `counts[r]` items, in row order."""
+    counts = counts.ravel()
+    starts = np.cumsum(counts) - counts
+    total = int(starts[-1] + counts[-1]) if len(counts) else 0
+    rows = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    return rows, np.arange(total, dtype=np.int32) - starts.astype(np.int32)[rows]
+
+
+class SyntheticMarket:
+    """Generator of book and trade events; keeps its state between calls,
+    so a long run can be produced and written in chunks."""
+
+    def __init__(
+        self,
+        seed=0,
+        step=STEP,
+        depth=DEPTH,
+        start_prices=START_PRICES,
+        tick_sizes=TICK_SIZES,
+        volatilities=VOLATILITIES,
+        trades_per_second=TRADES_PER_SECOND,
+        correlation=CORRELATION,
+        regimes=REGIMES,
+        transitions=TRANSITIONS,
+        start_time=0,
+    ):
+        self.rng = np.random.default_rng(seed)
+        self.step = step
+        self.depth = depth
+        self.tick_sizes = np.asarray(tick_sizes, dtype=np.float64)
+        self.volatilities = np.asarray(volatilities, dtype=np.float64)
+        self.trades_per_second = np.asarray(trades_per_second, dtype=np.float64)
+        self.cholesky = np.linalg.cholesky(np.asarray(correlation))
+        self.regime_names = list(regimes)
+        parameters = np.array(list(regimes.values()), dtype=np.float64)
+        (
+            self.vol_multipliers,
+            self.drifts,
+            self.rate_multipliers,
+            self.spreads,
+            durations,
+        ) = parameters.T
+        self.spreads = np.maximum(self.spreads, 1).astype(np.int64)
+        # Steps spent in a regime are geometric with the mean duration
+        self.leave_probabilities = np.minimum(step / durations, 1.0)
+        self.transitions = np.asarray(transitions, dtype=np.float64)
+        self.n_tickers = len(start_prices)
+
+        self.log_mid = np.log(np.asarray(start_prices, dtype=np.float64))
+        self.regime = self.regime_names.index("normal") if "normal" in regimes else 0
+        self.regime_left = self._duration(self.regime)
+        self.timestamp = int(start_time)
+        bid, ask = self._touch(self.log_mid[None], self.spreads[[self.regime]])
+        self.bid, self.ask = bid[0], ask[0]  # touch of the last step, in ticks
+        self.regimes = np.empty(0, dtype=np.int64)  # regime of each step of the last call
+        self.mids = np.empty((0, self.n_tickers))  # mid-prices of the last call
+        self.started = False
+
+    def snapshot(self):
+        """Every level of the current book as additions, at the current
+        time; the first `events` call starts with it."""
+        n = self.n_tickers
+        depth = np.arange(self.depth)
+        bids = self.bid[:, None] - depth
+        asks = self.ask[:, None] + depth
+        levels = np.concatenate([bids, asks], axis=1)  # (n, 2 * depth)
+        out = np.empty(levels.size, dtype=EVENT_DTYPE)
+        out["timestamp"] = self.timestamp + np.arange(levels.size)
+        out["kind"] = ORDERBOOK
+        out["ticker"] = np.repeat(np.arange(n), 2 * self.depth)
+        out["side"] = np.tile(np.repeat([0, 1], self.depth), n)
+        out["price"] = (levels * self.tick_sizes[:, None]).ravel()
+        out["quantity"] = self.rng.standard_exponential(levels.size) + 1e-4
+        return out
+
+    def _duration(self, regime):
+        return int(self.rng.geometric(self.leave_probabilities[regime]))
+
+    def _regime_path(self, n_steps):
+        """Regime of each of the next `n_steps`, one draw per switch."""
+        regimes = []
+        filled = 0
+        while filled < n_steps:
+            length = min(self.regime_left, n_steps - filled)
+            regimes.append(np.full(length, self.regime))
+            filled += length
+            self.regime_left -= length
+            if self.regime_left == 0:
+                self.regime = int(self.rng.choice(len(self.transitions), p=self.transitions[self.regime]))
+                self.regime_left = self._duration(self.regime)
+        return np.concatenate(regimes)
+
+    def _touch(self, log_mid, spreads):
+        """Best bid and ask, in ticks, around each mid-price."""
+        mid_ticks = np.exp(log_mid) / self.tick_sizes
+        bid = np.floor(mid_ticks - spreads[:, None] / 2).astype(np.int64)
+        return bid, bid + spreads[:, None]
+
+    def events(self, n_steps):
+        """Events of the next `n_steps` steps as an EVENT_DTYPE array."""
+        if not self.started:
+            self.started = True
+            first = self.snapshot()
+            self.timestamp += len(first)
+            return np.concatenate([first, self.events(n_steps)])
+        if n_steps <= 0:
+            return np.empty(0, dtype=EVENT_DTYPE)
+        rng = self.rng
+        n = self.n_tickers
+        regimes = self._regime_path(n_steps)
+
+        # Correlated GBM in log space
+        dt = self.step / SECONDS_PER_YEAR
+        sigma = self.volatilities[None, :] * self.vol_multipliers[regimes][:, None]
+        drift = (self.drifts[regimes][:, None] - sigma**2 / 2) * dt
+        shocks = rng.standard_normal((n_steps, n)) @ self.cholesky.T
+        log_mid = self.log_mid + np.cumsum(drift + sigma * np.sqrt(dt) * shocks, axis=0)
+        self.log_mid = log_mid[-1].copy()
+
+        # Touch of every step, and the previous step's touch
+        bid, ask = self._touch(log_mid, self.spreads[regimes])
+        previous_bid = np.vstack([self.bid[None], bid[:-1]])
+        previous_ask = np.vstack([self.ask[None], ask[:-1]])
+        self.bid, self.ask = bid[-1].copy(), ask[-1].copy()
+
+        # A side moving m ticks swaps min(m, depth) levels. Moving towards
+        # the spread drops the far levels and adds near ones; moving away
+        # drops the near ones and adds far ones.
+        depth = self.depth
+        bid_moves = bid - previous_bid
+        ask_moves = ask - previous_ask
+        bid_swaps = np.minimum(np.abs(bid_moves), depth)
+        ask_swaps = np.minimum(np.abs(ask_moves), depth)
+        bid_up = bid_moves > 0
+        ask_down = ask_moves < 0
+        trade_rates = self.trades_per_second[None, :] * self.rate_multipliers[regimes][:, None] * self.step
+        buys = rng.poisson(trade_rates / 2)
+        sells = rng.poisson(trade_rates / 2)
+
+        # Every (step, ticker) is a block of eight sections, each a run of
+        # levels `start + direction * rank` in ticks: bid removals, ask
+        # removals, bid additions, ask additions, bid touch, ask touch, buy
+        # trades (at the ask), sell trades (at the bid)
+        zero = np.zeros_like(bid)
+        one = np.ones_like(bid)
+        counts = np.stack([bid_swaps, ask_swaps, bid_swaps, ask_swaps, one, one, buys, sells], axis=-1)
+        starts = np.stack(
+            [
+                np.where(bid_up, previous_bid - depth + 1, previous_bid),
+                np.where(ask_down, previous_ask + depth - 1, previous_ask),
+                np.where(bid_up, bid, bid - depth + 1),
+                np.where(ask_down, ask, ask + depth - 1),
+                bid,
+                ask,
+                ask,
+                bid,
+            ],
+            axis=-1,
+        )
+        directions = np.stack(
+            [
+                np.where(bid_up, 1, -1),
+                np.where(ask_down, -1, 1),
+                np.where(bid_up, -1, 1),
+                np.where(ask_down, 1, -1),
+                zero,
+                zero,
+                zero,
+                zero,
+            ],
+            axis=-1,
+        )
+        # Per-section tables; sizes are exponential (at least 1e-4), removals
+        # 0, trades a tenth of a book level
+        shape = counts.shape
+        kinds = np.broadcast_to(np.array([ORDERBOOK] * 6 + [TRADE] * 2, dtype=np.uint8), shape)
+        sides = np.broadcast_to(np.array([0, 1, 0, 1, 0, 1, 0, 1], dtype=np.uint8), shape)
+        scales = np.broadcast_to(np.array([0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 0.1, 0.1]), shape)
+        tickers = np.broadcast_to(np.arange(n, dtype=np.uint8)[:, None], shape)
+        tick_sizes = np.broadcast_to(self.tick_sizes[:, None], shape)
+        # Events of a step share its timestamp, nanosecond apart: event k of
+        # the call gets (step time - index of the step's first event) + k
+        step_ns = int(round(self.step * 1e9))
+        step_sizes = counts.sum(axis=(1, 2))
+        step_offsets = self.timestamp + np.arange(n_steps) * step_ns - (np.cumsum(step_sizes) - step_sizes)
+        offsets = np.broadcast_to(step_offsets[:, None, None], shape)
+
+        # Every column is a gather from the section tables, in the final
+        # event order
+        section, rank = _expand(counts)
+        total = len(section)
+        out = np.empty(total, dtype=EVENT_DTYPE)
+        out["kind"] = kinds.ravel()[section]
+        out["ticker"] = tickers.ravel()[section]
+        out["side"] = sides.ravel()[section]
+        levels = starts.ravel()[section] + directions.ravel()[section] * rank
+        out["price"] = levels * tick_sizes.ravel()[section]
+        out["quantity"] = (rng.standard_exponential(total) + 1e-4) * scales.ravel()[section]
+        out["timestamp"] = offsets.ravel()[section] + np.arange(total)
+        self.timestamp += n_steps * step_ns
+
+        self.regimes = regimes
+        self.mids = np.exp(log_mid)
+        return out
+
+
+def write_synthetic(path, seconds, seed=0, chunk_steps=4096, **kwargs):
+    """Write `seconds` of synthetic market data to a tick capture at `path`.
+    Returns the number of events written.
+
+    Chunks of a few thousand steps keep the temporaries in cache, which is
+    faster than generating everything in one call.
+    """
+    market = SyntheticMarket(seed=seed, **kwargs)
+    n_steps = int(round(seconds / market.step))
+    with CaptureWriter(path) as writer:
+        for start in range(0, n_steps, chunk_steps):
+            writer.append(market.events(min(chunk_steps, n_steps - start)))
+        return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write seeded synthetic ETH/BTC/LTC market data as a tick capture."
+    )
+    parser.add_argument("capture", help="output tick capture file")
+    parser.add_argument("--seconds", type=float, default=3600.0, help="simulated time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--step", type=float, default=STEP, help="seconds per step")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="book levels per side")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    count = write_synthetic(args.capture, args.seconds, seed=args.seed, step=args.step, depth=args.depth)
+    elapsed = time.perf_counter() - started
+    print(f"{count} events in {elapsed:.2f}s ({count / elapsed / 1e6:.1f}M events/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import btc_only_rollingregression
+import rollingregression
+from regression_signals import BTC_ONLY_ROLLING_REGRESSION, ROLLING_REGRESSION, regression_signals
+
+
+class Clock:
+    now = 0.0
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+
+def live_orders(module, prices, timestamps, ticker, overrides, monkeypatch):
+    """(index, side) of every market order `module.Strategy` sends when
+    each price arrives as a trade at its timestamp, filled immediately."""
+    clock = Clock()
+    monkeypatch.setattr(module, "time", clock)
+    strategy = module.Strategy()
+    for name, value in overrides.items():
+        setattr(strategy, name, value)
+    orders = []
+    current = {}
+
+    def place_market_order(side, order_ticker, quantity):
+        orders.append((current["index"], 1 if side == module.Side.BUY else -1))
+        strategy.on_account_update(order_ticker, side, current["price"], quantity, strategy.capital)
+        return True
+
+    monkeypatch.setattr(module, "place_market_order", place_market_order)
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: None)
+    for index, (price, timestamp) in enumerate(zip(prices.tolist(), timestamps.tolist())):
+        current["index"], current["price"] = index, price
+        clock.now = timestamp
+        strategy.on_trade_update(ticker, module.Side.BUY, price, 1.0)
+    return orders
+
+
+def random_walk(n, seed, volatility=5e-4):
+    """Prices on a cent grid with timestamps in seconds. At low volatility
+    most changes round to nothing, so many windows are flat and their
+    slopes are exactly 0 for TickerState but not for prefix sums."""
+    rng = np.random.default_rng(seed)
+    prices = np.round(60000 * np.cumprod(1 + rng.normal(0, volatility, n)), 2) + 0.07
+    return prices, np.cumsum(rng.exponential(0.5, n))
+
+
+@pytest.mark.parametrize(
+    "volatility, overrides",
+    [
+        (5e-4, {"entry_threshold": 0.0002, "exit_threshold": -0.0002}),
+        (2e-8, {"entry_threshold": 0.0, "exit_threshold": 0.0}),
+        (
+            5e-4,
+            {
+                "entry_threshold": 0.0001,
+                "exit_threshold": -0.0003,
+                "cooldown_period": 0.2,
+                "stop_loss_multiplier": 0.0005,
+                "take_profit_multiplier": 0.001,
+            },
+        ),
+    ],
+)
+def test_matches_rollingregression_strategy(volatility, overrides, monkeypatch):
+    prices, timestamps = random_walk(5000, 5, volatility)
+    params = {**ROLLING_REGRESSION, **overrides}
+    params["cooldown"] = params.pop("cooldown_period", ROLLING_REGRESSION["cooldown"])
+    module = rollingregression
+    expected = live_orders(module, prices, timestamps, module.Ticker.ETH, overrides, monkeypatch)
+    orders = regression_signals(prices, timestamps, params)["orders"]
+    assert expected
+    assert list(zip(orders["index"].tolist(), orders["side"].tolist())) == expected
+
+
+def test_matches_btc_only_strategy(monkeypatch):
+    prices, timestamps = random_walk(5000, 6, 5e-8)
+    module = btc_only_rollingregression
+    expected = live_orders(module, prices, timestamps, module.Ticker.BTC, {}, monkeypatch)
+    orders = regression_signals(prices, timestamps, BTC_ONLY_ROLLING_REGRESSION)["orders"]
+    assert expected
+    assert list(zip(orders["index"].tolist(), orders["side"].tolist())) == expected
@@ -0,0 +1,105 @@
+import numpy as np
+
+# Event kinds
+ORDERBOOK = 0
+TRADE = 1
+
+# One market data event as it reaches on_orderbook_update/on_trade_update.
+# `ticker` and `side` hold the Ticker/Side enum values. Fixed-width and
+# aligned (32 bytes), so events can be copied between files, shared memory
+# and arrays without any encoding step.
+EVENT_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),  # nanoseconds since the epoch
+        ("price", "<f8"),
+        ("quantity", "<f8"),
+        ("kind", "u1"),
+        ("ticker", "u1"),
+        ("side", "u1"),
+    ],
+    align=True,
+)
+
+MAGIC = b"NUTICK01"
+
+
+def make_events(timestamp, kind, ticker, side, price, quantity):
+    """Build an event array from equally long columns."""
+    events = np.empty(len(price), dtype=EVENT_DTYPE)
+    events["timestamp"] = timestamp
+    events["kind"] = kind
+    events["ticker"] = ticker
+    events["side"] = side
+    events["price"] = price
+    events["quantity"] = quantity
+    return events
+
+
+def write_capture(path, events):
+    with CaptureWriter(path) as writer:
+        writer.append(events)
+
+
+def read_capture(path):
+    """Memory-map a capture file; nothing is read until it is accessed."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a tick capture")
+    return np.memmap(path, dtype=EVENT_DTYPE, mode="r", offset=len(MAGIC))
+
+
+class CaptureWriter:
+    """Appends event arrays to a capture file as they are produced."""
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.count = 0
+
+    def append(self, events):
+        events = np.ascontiguousarray(events, dtype=EVENT_DTYPE)
+        self.file.write(events.tobytes())
+        self.count += len(events)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def dispatch(strategy, ticker_enum, side_enum, events):
+    """Feed events to a strategy's callbacks.
+
+    The strategy files disagree on the argument order of the callbacks
+    (price, quantity vs quantity, price), so they are passed by keyword.
+    `ticker_enum`/`side_enum` are the strategy module's own enums.
+    """
+    tickers = {member.value: member for member in ticker_enum}
+    sides = {member.value: member for member in side_enum}
+    on_orderbook_update = strategy.on_orderbook_update
+    on_trade_update = strategy.on_trade_update
+    for kind, ticker, side, price, quantity in zip(
+        events["kind"].tolist(),
+        events["ticker"].tolist(),
+        events["side"].tolist(),
+        events["price"].tolist(),
+        events["quantity"].tolist(),
+    ):
+        if kind == TRADE:
+            on_trade_update(
+                ticker=tickers[ticker],
+                side=sides[side],
+                price=price,
+                quantity=quantity,
+            )
+        else:
+            on_orderbook_update(
+                ticker=tickers[ticker],
+                side=sides[side],
+                price=price,
+                quantity=quantity,
+            )
@@ -0,0 +1,122 @@
+from typing import Optional
+
+import numpy as np
+
+
+class TickerState:
+    """Rolling per-ticker price/volume windows laid out as contiguous arrays.
+
+    Row `i` belongs to the ticker with `Ticker.value == i`. Each row is a
+    ring buffer written twice (at `head` and `head + capacity`), so the most
+    recent `w` points of any ticker are always one contiguous slice and the
+    windows of all tickers can be gathered into an (n_tickers, w) array. The
+    indicator methods therefore return one value per ticker from a single
+    vector operation, costing about the same as computing one ticker.
+    """
+
+    def __init__(self, n_tickers: int = 3, capacity: int = 64) -> None:
+        self.capacity = capacity
+        self.prices = np.zeros((n_tickers, 2 * capacity))
+        self.volumes = np.zeros((n_tickers, 2 * capacity))
+        self.head = np.zeros(n_tickers, dtype=np.int64)
+        self.count = np.zeros(n_tickers, dtype=np.int64)
+        self.last = np.full(n_tickers, np.nan)
+        self._rows = np.arange(n_tickers)[:, None]
+
+    def push(self, i: int, price: float, volume: float = 0.0) -> None:
+        """Append one observation for ticker row `i` in O(1)."""
+        head = self.head[i]
+        self.prices[i, head] = self.prices[i, head + self.capacity] = price
+        self.volumes[i, head] = self.volumes[i, head + self.capacity] = volume
+        self.head[i] = (head + 1) % self.capacity
+        if self.count[i] < self.capacity:
+            self.count[i] += 1
+        self.last[i] = price
+
+    def load(self, i: int, prices: np.ndarray, volumes: Optional[np.ndarray] = None) -> None:
+        """Append many observations for ticker row `i` at once, oldest first.
+
+        Same end state as calling `push` for each point, but only the last
+        `capacity` points are written, with two slice assignments.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        m = len(prices)
+        if m == 0:
+            return
+        volumes = np.zeros(m) if volumes is None else np.asarray(volumes, dtype=np.float64)
+        k = min(m, self.capacity)
+        slots = (self.head[i] + m - k + np.arange(k)) % self.capacity
+        self.prices[i, slots] = self.prices[i, slots + self.capacity] = prices[-k:]
+        self.volumes[i, slots] = self.volumes[i, slots + self.capacity] = volumes[-k:]
+        self.head[i] = (self.head[i] + m) % self.capacity
+        self.count[i] = min(self.count[i] + m, self.capacity)
+        self.last[i] = prices[-1]
+
+    def ready(self, w: int) -> np.ndarray:
+        """Mask of tickers with at least `w` observations."""
+        return self.count >= w
+
+    def window(self, i: int, w: int) -> np.ndarray:
+        """The last `w` prices of ticker row `i`, oldest first (a view)."""
+        end = self.head[i] + self.capacity
+        return self.prices[i, end - min(w, self.count[i]):end]
+
+    def windows(self, w: int, volumes: bool = False) -> np.ndarray:
+        """(n_tickers, w) array of every ticker's last `w` points.
+
+        Tickers with fewer than `w` points contain stale slots; mask them
+        with `ready(w)`.
+        """
+        columns = self.head[:, None] + self.capacity - w + np.arange(w)
+        source = self.volumes if volumes else self.prices
+        return source[self._rows, columns]
+
+    def mean(self, w: int) -> np.ndarray:
+        return self.windows(w).mean(axis=1)
+
+    def std(self, w: int) -> np.ndarray:
+        return self.windows(w).std(axis=1)
+
+    def vwap(self, w: int) -> np.ndarray:
+        prices = self.windows(w)
+        volumes = self.windows(w, volumes=True)
+        # NaN for a ticker without volume in the window
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (prices * volumes).sum(axis=1) / volumes.sum(axis=1)
+
+    def regression_slopes(self, w: int, normalize: bool = True) -> np.ndarray:
+        """Least-squares slope of the last `w` prices per ticker.
+
+        Closed form over x = 0..w-1; with `normalize`, divided by the window
+        mean like the strategies' `coef / y.mean()`.
+        """
+        y = self.windows(w)
+        x = np.arange(w) - (w - 1) / 2.0
+        slopes = y @ x / (x @ x)
+        if normalize:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                slopes = slopes / y.mean(axis=1)
+        return slopes
+
+    def rsi(self, period: int = 14) -> np.ndarray:
+        """Simple-average RSI over the last `period` price changes."""
+        deltas = np.diff(self.windows(period + 1), axis=1)
+        avg_gain = np.where(deltas > 0, deltas, 0).mean(axis=1)
+        avg_loss = np.where(deltas < 0, -deltas, 0).mean(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+        return np.where(avg_loss == 0, 100.0, rsi)
+
+    def atr(self, period: int = 14) -> np.ndarray:
+        """Mean absolute price change over the last `period` changes."""
+        return np.abs(np.diff(self.windows(period + 1), axis=1)).mean(axis=1)
+
+    def log_returns(self, w: int) -> np.ndarray:
+        """(n_tickers, w - 1) log returns, for cross-ticker signals."""
+        # Zero prices (empty slots) give -inf / NaN instead of warnings
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.diff(np.log(self.windows(w)), axis=1)
+
+    def correlation(self, w: int) -> np.ndarray:
+        """Cross-ticker correlation matrix of log returns over `w` points."""
+        return np.corrcoef(self.log_returns(w))
@@ -0,0 +1,298 @@
+import argparse
+import ast
+import contextlib
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from market_data_bus import load_strategy_module
+from tick_capture import TRADE, read_capture
+
+FEE_RATE = 0.004  # exchange fee, 40 bps
+CALLBACKS = ("on_orderbook_update", "on_trade_update", "on_account_update")
+_instance_ids = itertools.count()
+
+
+class ReplayClock:
+    """Stands in for the `time` module of a strategy during a replay, so
+    cooldowns and rate limits follow the capture's timestamps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        pass
+
+
+class SimulatedAccount:
+    """The exchange as seen by one strategy instance.
+
+    Its methods replace the module-level `place_market_order`,
+    `place_limit_order` and `cancel_order` of that instance's copy of the
+    strategy module. Market and IOC orders fill against the current top of
+    book; resting limit orders fill when a later trade prints through their
+    price, up to the traded quantity. Fills are queued and delivered to
+    `on_account_update` after the callback that caused them returns, like
+    an exchange reply would be. There are no margin checks.
+    """
+
+    def __init__(self, market, capital=100000.0, fee_rate=FEE_RATE):
+        self.market = market
+        self.initial_capital = capital
+        self.capital = capital
+        self.fee_rate = fee_rate
+        self.position = np.zeros(market.n_tickers)
+        self.fees = 0.0
+        self.fills = 0
+        self.orders_sent = 0
+        self.cancels = 0
+        self.resting = {}  # order id -> [ticker value, side value, price, remaining]
+        self.pending_fills = []  # (ticker value, side value, price, quantity)
+        self._order_ids = itertools.count(1)
+
+    def place_market_order(self, side, ticker, quantity):
+        self.orders_sent += 1
+        price = self.market.execution_price(ticker.value, side.value)
+        if np.isnan(price) or quantity <= 0:
+            return False
+        self._fill(ticker.value, side.value, price, quantity)
+        return True
+
+    def place_limit_order(self, side, ticker, quantity, price, ioc=False):
+        self.orders_sent += 1
+        if quantity <= 0:
+            return 0
+        order_id = next(self._order_ids)
+        best = self.market.execution_price(ticker.value, side.value)
+        crosses = not np.isnan(best) and (best <= price if side.value == 0 else best >= price)
+        if crosses:
+            self._fill(ticker.value, side.value, best, quantity)
+        elif not ioc:
+            self.resting[order_id] = [ticker.value, side.value, price, quantity]
+        return order_id
+
+    def cancel_order(self, ticker, order_id):
+        self.cancels += 1
+        return self.resting.pop(order_id, None) is not None
+
+    def on_trade(self, ticker, price, quantity):
+        """Fill resting orders the trade printed through."""
+        for order_id, order in list(self.resting.items()):
+            if order[0] != ticker or quantity <= 0:
+                continue
+            if (order[1] == 0 and price <= order[2]) or (order[1] == 1 and price >= order[2]):
+                filled = min(order[3], quantity)
+                quantity -= filled
+                order[3] -= filled
+                self._fill(ticker, order[1], order[2], filled)
+                if order[3] <= 1e-12:
+                    del self.resting[order_id]
+
+    def _fill(self, ticker, side, price, quantity):
+        notional = price * quantity
+        fee = notional * self.fee_rate
+        if side == 0:
+            self.position[ticker] += quantity
+            self.capital -= notional + fee
+        else:
+            self.position[ticker] -= quantity
+            self.capital += notional - fee
+        self.fees += fee
+        self.fills += 1
+        self.pending_fills.append((ticker, side, price, quantity))
+
+    def equity(self):
+        marks = np.nan_to_num(self.market.last_price)
+        return self.capital + float(self.position @ marks)
+
+
+class MarketState:
+    """Order book levels and last trade price per ticker, rebuilt once from
+    the capture and shared by every simulated account."""
+
+    def __init__(self, n_tickers=3):
+        self.n_tickers = n_tickers
+        self.levels = [({}, {}) for _ in range(n_tickers)]  # (bids, asks)
+        self.last_price = np.full(n_tickers, np.nan)
+
+    def apply(self, kind, ticker, side, price, quantity):
+        if kind == TRADE:
+            self.last_price[ticker] = price
+            return
+        book = self.levels[ticker][side]
+        if quantity == 0:
+            book.pop(price, None)
+        else:
+            book[price] = quantity
+
+    def execution_price(self, ticker, side):
+        """Best ask for a buy, best bid for a sell, else the last trade."""
+        bids, asks = self.levels[ticker]
+        if side == 0 and asks:
+            return min(asks)
+        if side == 1 and bids:
+            return max(bids)
+        return self.last_price[ticker]
+
+
+class Contestant:
+    """One strategy instance with its own module copy, account and timings."""
+
+    def __init__(self, label, path, overrides, market, clock_source):
+        self.label = label
+        module = load_strategy_module(
+            path, f"tournament_{next(_instance_ids)}_{os.path.basename(path).replace('-', '_')[:-3]}"
+        )
+        self.account = SimulatedAccount(market)
+        module.place_market_order = self.account.place_market_order
+        module.place_limit_order = self.account.place_limit_order
+        module.cancel_order = self.account.cancel_order
+        if getattr(module, "time", None) is time:
+            module.time = clock_source
+        self.tickers = {member.value: member for member in module.Ticker}
+        self.sides = {member.value: member for member in module.Side}
+        self.strategy = _instantiate(module.Strategy, overrides)
+        self.cpu_ns = dict.fromkeys(CALLBACKS, 0)
+        self.calls = dict.fromkeys(CALLBACKS, 0)
+
+    def call(self, callback, **kwargs):
+        start = time.thread_time_ns()
+        getattr(self.strategy, callback)(**kwargs)
+        self.cpu_ns[callback] += time.thread_time_ns() - start
+        self.calls[callback] += 1
+        self.deliver_fills()
+
+    def deliver_fills(self):
+        while self.account.pending_fills:
+            ticker, side, price, quantity = self.account.pending_fills.pop(0)
+            self.call(
+                "on_account_update",
+                ticker=self.tickers[ticker],
+                side=self.sides[side],
+                price=price,
+                quantity=quantity,
+                capital_remaining=self.account.capital,
+            )
+
+
+def _instantiate(strategy_class, overrides):
+    """Build a strategy with some of its __init__ attributes replaced.
+
+    Overrides are applied as __init__ assigns them, so buffers sized from a
+    parameter (e.g. TickerState(..., self.bb_window)) are built with the
+    overridden value.
+    """
+    if not overrides:
+        return strategy_class()
+
+    class Variant(strategy_class):
+        def __setattr__(self, name, value):
+            super().__setattr__(name, overrides.get(name, value))
+
+    strategy = Variant()
+    del Variant.__setattr__  # no hook left on the hot path
+    # A misspelled parameter would otherwise be silently ignored
+    unknown = sorted(set(overrides) - set(vars(strategy)))
+    if unknown:
+        raise ValueError(
+            f"{strategy_class.__module__}.{strategy_class.__name__} has no "
+            f"attributes {unknown}"
+        )
+    return strategy
+
+
+def parse_entry(entry):
+    """'bollingerbandsrsi.py:bb_window=20,bb_std_dev=2.5' -> (path, overrides)"""
+    path, _, params = entry.partition(":")
+    overrides = {}
+    for item in filter(None, params.split(",")):
+        name, _, value = item.partition("=")
+        overrides[name.strip()] = ast.literal_eval(value.strip())
+    return path, overrides
+
+
+def run_tournament(events, entries, verbose=False):
+    """Replay `events` once, feeding every (path, overrides) entry."""
+    market = MarketState()
+    clock = ReplayClock()
+    contestants = []
+    for path, overrides in entries:
+        label = os.path.basename(path)
+        if overrides:
+            label += " " + ",".join(f"{k}={v}" for k, v in overrides.items())
+        contestants.append(Contestant(label, path, overrides, market, clock))
+
+    with open(os.devnull, "w") as devnull:
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull):
+            for timestamp, kind, ticker, side, price, quantity in zip(
+                events["timestamp"].tolist(),
+                events["kind"].tolist(),
+                events["ticker"].tolist(),
+                events["side"].tolist(),
+                events["price"].tolist(),
+                events["quantity"].tolist(),
+            ):
+                clock.now = timestamp / 1e9
+                market.apply(kind, ticker, side, price, quantity)
+                callback = "on_trade_update" if kind == TRADE else "on_orderbook_update"
+                for contestant in contestants:
+                    if kind == TRADE:
+                        contestant.account.on_trade(ticker, price, quantity)
+                    contestant.call(
+                        callback,
+                        ticker=contestant.tickers[ticker],
+                        side=contestant.sides[side],
+                        price=price,
+                        quantity=quantity,
+                    )
+
+    rows = []
+    for contestant in contestants:
+        account = contestant.account
+        row = {
+            "strategy": contestant.label,
+            "pnl": account.equity() - account.initial_capital,
+            "fees": account.fees,
+            "fills": account.fills,
+            "orders": account.orders_sent,
+            "cancels": account.cancels,
+        }
+        for callback in CALLBACKS:
+            calls = contestant.calls[callback]
+            row[f"{callback} us"] = contestant.cpu_ns[callback] / calls / 1e3 if calls else 0.0
+        row["cpu s"] = sum(contestant.cpu_ns.values()) / 1e9
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("strategy")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a tick capture once through several strategies, "
+        "each with its own simulated account."
+    )
+    parser.add_argument("capture", help="tick capture file (see tick_capture.py)")
+    parser.add_argument(
+        "strategies",
+        nargs="+",
+        help="strategy files, optionally with overrides: file.py:param=value,...",
+    )
+    parser.add_argument("--verbose", action="store_true", help="keep strategy output")
+    args = parser.parse_args()
+
+    events = read_capture(args.capture)
+    results = run_tournament(events, [parse_entry(entry) for entry in args.strategies], args.verbose)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(results.round(2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Warm-start live strategies from recorded history.
+
+Every strategy with rolling state has a `warm_start(ticker, prices,
+volumes=None)` method that loads recorded points (oldest first) in one step;
+strategies whose only state is a TickerState inherit it from
+`TickerStateWarmStart`.
+This module gathers those points from a tick capture (tick_capture.py) or
+from cached bars and feeds every ticker:
+
+    strategy = Strategy()
+    warm_start(strategy, Ticker, events=read_capture("today.bin"))
+    # or, for bar strategies: bars={Ticker.BTC: btc_15m, ...}
+"""
+
+import numpy as np
+
+from tick_capture import TRADE
+
+# Points loaded per ticker; more than any strategy window
+DEFAULT_POINTS = 1000
+
+
+def recent_trades(events, ticker, n=DEFAULT_POINTS):
+    """Prices and quantities of the last `n` trades of ticker row `ticker`
+    in a capture, oldest first.
+
+    Scans backwards from the end in growing blocks, so a large memory-mapped
+    capture is only read as far back as needed.
+    """
+    found = []
+    needed = n
+    end = len(events)
+    block = max(4 * n, 4096)
+    while end > 0 and needed > 0:
+        start = max(0, end - block)
+        chunk = events[start:end]
+        hits = np.flatnonzero(
+            (chunk["kind"] == TRADE) & (chunk["ticker"] == ticker)
+        )[-needed:]
+        found.append(chunk[hits])
+        needed -= len(hits)
+        end = start
+        block *= 2
+    trades = np.concatenate(found[::-1]) if found else events[:0]
+    return (
+        np.asarray(trades["price"], dtype=np.float64),
+        np.asarray(trades["quantity"], dtype=np.float64),
+    )
+
+
+class TickerStateWarmStart:
+    """`warm_start` for strategies whose rolling state is the TickerState
+    `self.state`, trading the tickers in `self.tickers`."""
+
+    def warm_start(self, ticker, prices, volumes=None) -> None:
+        """Load recorded prices (oldest first) into the price history, so the
+        strategy can trade on the first live tick instead of waiting for a
+        full window of new points."""
+        if ticker in self.tickers:
+            self.state.load(ticker.value, prices)
+
+
+def warm_start(strategy, tickers, events=None, bars=None, n=DEFAULT_POINTS):
+    """Call `strategy.warm_start` for every member of `tickers` (the
+    strategy module's Ticker enum).
+
+    `events` is a tick capture; the last `n` trades of each ticker are
+    loaded. `bars` maps Ticker members to bar DataFrames (or close arrays);
+    their last `n` closes and volumes are loaded. Tickers without data are
+    skipped.
+    """
+    if (events is None) == (bars is None):
+        raise ValueError("pass either events or bars")
+    for ticker in tickers:
+        if events is not None:
+            prices, volumes = recent_trades(events, ticker.value, n)
+        elif ticker in bars:
+            frame = bars[ticker]
+            if hasattr(frame, "columns"):
+                prices = frame["close"].to_numpy(dtype=np.float64)[-n:]
+                volumes = frame["volume"].to_numpy(dtype=np.float64)[-n:]
+            else:
+                prices = np.asarray(frame, dtype=np.float64)[-n:]
+                volumes = None
+        else:
+            continue
+        if len(prices):
+            strategy.warm_start(ticker, prices, volumes)